@@ -0,0 +1,33 @@
+"""Solve time and quality of Router.solve as nearest_neighbors arc pruning varies
+
+Usage:
+    python -m benchmarks.arc_pruning --sizes 250 500 1000 --neighbors 5 10 20 40
+"""
+import argparse
+
+from benchmarks.common import compare_values
+
+DEFAULT_SIZES = [250, 500, 1000]
+DEFAULT_NEIGHBORS = [10, 20, 40, 80]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--neighbors", type=int, nargs="+", default=DEFAULT_NEIGHBORS)
+    parser.add_argument("--time-limit", type=float, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    compare_values(
+        "nearest_neighbors",
+        [None] + args.neighbors,
+        args.sizes,
+        args.time_limit,
+        reference="unpruned",
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Runner shared by the benchmarks comparing values of one Router option on generated instances"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from benchmarks.instances import generate_instance
+from src.tasks.routing import Router, SolutionNotFound
+from src.tasks.search import search_params
+
+
+def run_case(
+    n_locations: int,
+    option: str,
+    value: Any,
+    time_limit: float,
+    seed: int = 0,
+    layout: str = "clustered",
+) -> Dict[str, Any]:
+    """Build time, time to first solution, solve time and objective at the time limit with one Router option set
+
+    Time to first solution is measured by a separate search stopping at its first solution
+
+    Args:
+        n_locations (int): number of locations, with one vehicle per 25
+        option (str): keyword argument of Router
+        value (Any): value of the option
+        time_limit (float): seconds each search may run for
+        seed (int): random seed of the instance
+        layout (str): see generate_instance
+
+    Returns:
+        Dict[str, Any]: timings in seconds and objective, None if no solution was found
+    """
+    instance = generate_instance(
+        n_locations, max(2, n_locations // 25), layout=layout, seed=seed
+    )
+
+    def solve(solution_limit: Optional[int] = None) -> Router:
+        router = Router(
+            search_params("fast", time_limit=time_limit, solution_limit=solution_limit),
+            **{option: value},
+        )
+        try:
+            router.solve(**instance)
+        except SolutionNotFound:
+            router.solution = None
+        return router
+
+    first = solve(solution_limit=1)
+    router = solve()
+    return dict(
+        value=value,
+        build_seconds=router.timings["check_inputs"] + router.timings["build"],
+        first_solution_seconds=first.timings["solve"]
+        if first.solution is not None
+        else None,
+        solve_seconds=router.timings["solve"],
+        objective=router.solution.ObjectiveValue()
+        if router.solution is not None
+        else None,
+    )
+
+
+def compare_values(
+    option: str,
+    values: List[Any],
+    sizes: List[int],
+    time_limit: float,
+    reference: str,
+    seed: int = 0,
+    layout: str = "clustered",
+) -> List[List[Dict[str, Any]]]:
+    """Run every value of a Router option at each size, printing each objective against that of the first value
+
+    Args:
+        option (str): keyword argument of Router
+        values (List[Any]): values of the option, the first is the reference the others are compared with
+        sizes (List[int]): number of locations of each instance
+        time_limit (float): seconds each search may run for
+        reference (str): name the first value is printed as
+        seed (int): random seed of the instances
+        layout (str): see generate_instance
+
+    Returns:
+        List[List[Dict[str, Any]]]: results of each value at each size, see run_case
+    """
+    all_results = []
+    for n_locations in sizes:
+        results = []
+        for value in values:
+            # fresh process per case so one solve doesn't warm up the next
+            with ProcessPoolExecutor(
+                max_workers=1, mp_context=multiprocessing.get_context("spawn")
+            ) as executor:
+                result = executor.submit(
+                    run_case, n_locations, option, value, time_limit, seed, layout
+                ).result()
+            results.append(result)
+
+        baseline = results[0]["objective"]
+        for i, result in enumerate(results):
+            gap = (
+                f"{result['objective'] / baseline - 1:+.1%}"
+                if result["objective"] is not None and baseline
+                else "-"
+            )
+            name = reference if i == 0 else str(result["value"])
+            print(
+                f"n={n_locations:<5} {option}={name:<12}"
+                f" build={result['build_seconds']:.3f}s"
+                f" first={_fmt(result['first_solution_seconds'])}s"
+                f" solve={result['solve_seconds']:.3f}s"
+                f" objective={result['objective']} vs {reference}={gap}"
+            )
+        all_results.append(results)
+    return all_results
+
+
+def _fmt(seconds: Optional[float]) -> str:
+    return "-" if seconds is None else f"{seconds:.3f}"
@@ -0,0 +1,74 @@
+"""Seeded pickup/delivery instance generator shared by the benchmarks"""
+from typing import Any, Dict
+
+import numpy as np
+
+# locations are scattered over a square this many seconds of travel across
+AREA = 3600
+# standard deviation (seconds) of locations around their cluster centre
+CLUSTER_SPREAD = 150
+
+
+def generate_instance(
+    n_locations: int,
+    n_vehicles: int,
+    layout: str = "uniform",
+    capacities: bool = True,
+    site_eta: bool = True,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """Random pickup/delivery instance, the same seed always gives the same instance
+
+    Each vehicle starts from its own depot at the first n_vehicles locations,
+    every other location belongs to exactly one pickup/delivery pair.
+
+    Args:
+        n_locations (int): number of locations including depots
+        n_vehicles (int): fleet size
+        layout (str): uniform scatters locations over the whole area, clustered groups them around a few centres
+        capacities (bool): give each delivery a weight and each vehicle a capacity
+        site_eta (bool): give each non depot location a time spent on site
+        seed (int): random seed
+
+    Returns:
+        Dict[str, Any]: keyword arguments of Router.solve
+    """
+    if n_locations < n_vehicles + 2:
+        raise Exception("Need at least one pickup/delivery pair besides the depots")
+
+    rng = np.random.default_rng(seed)
+    if layout == "uniform":
+        coords = rng.uniform(0, AREA, size=(n_locations, 2))
+    elif layout == "clustered":
+        centres = rng.uniform(0, AREA, size=(max(2, n_locations // 50), 2))
+        coords = centres[rng.integers(0, len(centres), size=n_locations)]
+        coords = np.clip(coords + rng.normal(0, CLUSTER_SPREAD, coords.shape), 0, AREA)
+    else:
+        raise Exception(f"Unknown layout {layout}, expected uniform or clustered")
+
+    time_matrix = np.rint(
+        np.linalg.norm(coords[:, np.newaxis] - coords[np.newaxis, :], axis=-1)
+    ).astype(int)
+
+    # an odd location out is still visited but belongs to no pair
+    nodes = rng.permutation(np.arange(n_vehicles, n_locations))
+    nodes = nodes[: len(nodes) - len(nodes) % 2]
+    delivery_pairs = [(int(p), int(d)) for p, d in nodes.reshape(-1, 2)]
+
+    instance = dict(
+        time_matrix=time_matrix.tolist(),
+        driver_indicies=list(range(n_vehicles)),
+        delivery_pairs=delivery_pairs,
+        # long enough that any instance is feasible
+        max_time=AREA * n_locations,
+    )
+    if capacities:
+        instance["delivery_weights"] = rng.integers(
+            1, 10, size=len(delivery_pairs)
+        ).tolist()
+        instance["vehicle_capacities"] = rng.integers(10, 30, size=n_vehicles).tolist()
+    if site_eta:
+        eta = rng.integers(60, 600, size=n_locations)
+        eta[:n_vehicles] = 0
+        instance["site_eta"] = eta.tolist()
+    return instance
@@ -0,0 +1,33 @@
+"""Solve time and quality of Router.solve for each precedence policy against the pair constraints
+
+Usage:
+    python -m benchmarks.precedence --sizes 50 100 200 --time-limit 10
+"""
+import argparse
+
+from benchmarks.common import compare_values
+from src.tasks.routing import PRECEDENCE_POLICIES
+
+DEFAULT_SIZES = [50, 100, 200]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--policies", nargs="+", default=list(PRECEDENCE_POLICIES))
+    parser.add_argument("--time-limit", type=float, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    compare_values(
+        "precedence",
+        [None] + args.policies,
+        args.sizes,
+        args.time_limit,
+        reference="constraints",
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Encoding time of time matrix and schedule responses through the response_model vs fast_json
+
+Usage:
+    python -m benchmarks.serialization --sizes 100 500 1000
+"""
+import argparse
+import asyncio
+import time
+from typing import Any, Callable, List
+
+import numpy as np
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from src.api import fast_json
+from src.models.schedule import Schedule
+from src.models.time_matrix import TimeMatrix
+from src.tasks.schedule import build_schedules
+
+DEFAULT_SIZES = [100, 500, 1000]
+
+
+def response_model_encode(response_model: Any, content: Any) -> bytes:
+    """Validate and encode content as FastAPI does for handlers declaring a response_model"""
+    field = create_response_field(name="Response", type_=response_model)
+    serialized = asyncio.run(
+        serialize_response(field=field, response_content=content, is_coroutine=True)
+    )
+    return JSONResponse(serialized).body
+
+
+def best_of(repeat: int, encode: Callable[[], bytes]) -> float:
+    """Fastest of repeat runs in seconds"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        encode()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def schedules_of(n_locations: int, seed: int) -> List[Schedule]:
+    """Schedules of random routes visiting every location, one driver per 25 locations"""
+    rng = np.random.default_rng(seed)
+    n_drivers = max(1, n_locations // 25)
+    stops = np.array_split(
+        rng.permutation(np.arange(n_drivers, n_locations)), n_drivers
+    )
+    routes = [[driver, *route.tolist(), driver] for driver, route in enumerate(stops)]
+    times = [
+        np.cumsum(rng.integers(0, 600, size=len(route))).tolist() for route in routes
+    ]
+    return build_schedules(routes, times)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    encoder = "orjson" if fast_json.orjson is not None else "json"
+    for n_locations in args.sizes:
+        rng = np.random.default_rng(args.seed)
+        matrix = rng.integers(0, 7200, size=(n_locations, n_locations), dtype=np.int32)
+        locations = [f"location {i}" for i in range(n_locations)]
+        # as returned by the handler, the response_model path needs python lists
+        content = dict(
+            locations=locations, driver_indicies=[0], matrix=matrix, triangle=None
+        )
+        model = TimeMatrix(
+            locations=locations, driver_indicies=[0], matrix=matrix.tolist()
+        )
+        schedules = schedules_of(n_locations, args.seed)
+
+        cases = [
+            (
+                "time_matrix",
+                "response_model",
+                lambda: response_model_encode(TimeMatrix, model),
+            ),
+            ("time_matrix", encoder, lambda: fast_json.dumps(content)),
+            (
+                "schedules",
+                "response_model",
+                lambda: response_model_encode(List[Schedule], schedules),
+            ),
+            ("schedules", encoder, lambda: fast_json.dumps(schedules)),
+        ]
+        for payload, path, encode in cases:
+            print(
+                f"n={n_locations:<5} {payload:<12} {path:<15}"
+                f" encode={best_of(args.repeat, encode) * 1000:.1f}ms"
+                f" bytes={len(encode())}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""Reproducible Router.solve benchmarks over generated instances, compared against a stored baseline
+
+Usage:
+    python -m benchmarks.solver --output results.json --baseline benchmarks/baseline.json
+    python -m benchmarks.solver --sizes 10 50 100 --save-baseline benchmarks/baseline.json
+"""
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import ortools
+from ortools.constraint_solver import pywrapcp, routing_enums_pb2
+
+from benchmarks.instances import generate_instance
+from src.tasks.routing import Router, SolutionNotFound
+
+DEFAULT_SIZES = [10, 50, 100, 250, 500, 1000]
+# relative increase over the baseline counted as a regression
+TIME_TOLERANCE = 0.5
+OBJECTIVE_TOLERANCE = 0.05
+MEMORY_TOLERANCE = 0.2
+# time differences below this many seconds are noise
+MIN_TIME_DIFF = 0.01
+
+
+class CountingMatrix:
+    """Time matrix counting the rows read, the python time callback reads one row per invocation"""
+
+    def __init__(self, matrix: List[List[int]]) -> None:
+        self.matrix = matrix
+        self.calls = 0
+
+    def __len__(self) -> int:
+        return len(self.matrix)
+
+    def __getitem__(self, i: int) -> List[int]:
+        self.calls += 1
+        return self.matrix[i]
+
+
+class CountingRouter(Router):
+    """Router whose CountingMatrix only counts the rows read once the time callback is registered, not those read checking the inputs"""
+
+    def _add_time_dimension(self, time_matrix: CountingMatrix, *args, **kwargs):
+        time_matrix.calls = 0
+        return super()._add_time_dimension(time_matrix, *args, **kwargs)
+
+
+def suite_cases(sizes: List[int], seed: int = 0) -> List[Dict[str, Any]]:
+    """Uniform instances with small fleets, capacities and site eta, and clustered instances with larger uncapacitated fleets"""
+    cases = []
+    for n_locations in sizes:
+        for layout, n_vehicles, capacities in (
+            ("uniform", max(1, n_locations // 25), True),
+            ("clustered", max(2, n_locations // 10), False),
+        ):
+            cases.append(
+                dict(
+                    name=f"{layout}-n{n_locations}-v{n_vehicles}"
+                    + ("-cap" if capacities else ""),
+                    n_locations=n_locations,
+                    n_vehicles=n_vehicles,
+                    layout=layout,
+                    capacities=capacities,
+                    site_eta=True,
+                    seed=seed,
+                )
+            )
+    return cases
+
+
+def run_case(case: Dict[str, Any], time_limit: int, callback: bool) -> Dict[str, Any]:
+    """Solve one case, run in a fresh process so peak RSS belongs to this case alone
+
+    Time to first solution is measured by a separate search stopping at its first solution
+    """
+    instance = generate_instance(**{k: v for k, v in case.items() if k != "name"})
+
+    def solve(solution_limit: Optional[int] = None) -> Router:
+        params = pywrapcp.DefaultRoutingSearchParameters()
+        params.first_solution_strategy = (
+            routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
+        )
+        params.time_limit.seconds = time_limit
+        if solution_limit:
+            params.solution_limit = solution_limit
+        router_class = (
+            CountingRouter
+            if isinstance(instance["time_matrix"], CountingMatrix)
+            else Router
+        )
+        router = router_class(params, transit_matrix=not callback)
+        try:
+            router.solve(**instance)
+        except SolutionNotFound:
+            router.solution = None
+        return router
+
+    first = solve(solution_limit=1)
+    if callback:
+        instance["time_matrix"] = CountingMatrix(instance["time_matrix"])
+    router = solve()
+
+    # kilobytes on linux, bytes on macos
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss /= 1024**2 if sys.platform == "darwin" else 1024
+    return dict(
+        name=case["name"],
+        build_seconds=router.timings["check_inputs"] + router.timings["build"],
+        first_solution_seconds=first.timings["solve"]
+        if first.solution is not None
+        else None,
+        solve_seconds=router.timings["solve"],
+        objective=router.solution.ObjectiveValue()
+        if router.solution is not None
+        else None,
+        peak_rss_mb=round(peak_rss, 1),
+        # no python callback is invoked on the transit matrix path
+        callback_calls=instance["time_matrix"].calls if callback else None,
+    )
+
+
+def run_suite(
+    cases: List[Dict[str, Any]], time_limit: int, callback: bool = False
+) -> List[Dict[str, Any]]:
+    results = []
+    for case in cases:
+        with ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            result = executor.submit(run_case, case, time_limit, callback).result()
+        print(
+            f"{result['name']:>28} build={result['build_seconds']:.3f}s"
+            f" first={_fmt(result['first_solution_seconds'])}s"
+            f" objective={result['objective']} rss={result['peak_rss_mb']}MB"
+            f" callbacks={_count(result['callback_calls'])}"
+        )
+        results.append(result)
+    return results
+
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]]) -> List[str]:
+    """Regressions of results against the baseline, cases missing from either are skipped"""
+    baseline_by_name = {result["name"]: result for result in baseline}
+    regressions = []
+    for result in results:
+        base = baseline_by_name.get(result["name"])
+        if base is None:
+            continue
+
+        def check(key: str, tolerance: float, min_diff: float = 0) -> None:
+            new, old = result[key], base[key]
+            if old is None:
+                return
+            if new is None:
+                regressions.append(f"{result['name']}: {key} missing, was {old}")
+            elif new - old > max(old * tolerance, min_diff):
+                regressions.append(f"{result['name']}: {key} {old} -> {new}")
+
+        check("build_seconds", TIME_TOLERANCE, MIN_TIME_DIFF)
+        check("first_solution_seconds", TIME_TOLERANCE, MIN_TIME_DIFF)
+        check("objective", OBJECTIVE_TOLERANCE)
+        check("peak_rss_mb", MEMORY_TOLERANCE)
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--time-limit", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--callback",
+        action="store_true",
+        help="solve with the python time callback and count its invocations",
+    )
+    parser.add_argument("--output", help="write results to this json file")
+    parser.add_argument("--baseline", help="compare against this json file")
+    parser.add_argument("--save-baseline", help="write results as a new baseline")
+    args = parser.parse_args()
+
+    results = run_suite(
+        suite_cases(args.sizes, args.seed), args.time_limit, args.callback
+    )
+    report = dict(
+        meta=dict(
+            time_limit=args.time_limit,
+            seed=args.seed,
+            callback=args.callback,
+            python=platform.python_version(),
+            ortools=ortools.__version__,
+            machine=platform.machine(),
+            created=time.strftime("%Y-%m-%dT%H:%M:%S"),
+        ),
+        results=results,
+    )
+    for path in filter(None, [args.output, args.save_baseline]):
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["meta"]["time_limit"] != args.time_limit:
+            print("warning: baseline was recorded with a different time limit")
+        regressions = compare(results, baseline["results"])
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("no regressions against baseline")
+
+
+def _fmt(seconds: Optional[float]) -> str:
+    return "-" if seconds is None else f"{seconds:.3f}"
+
+
+def _count(calls: Optional[int]) -> str:
+    return "n/a" if calls is None else str(calls)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""Compare the python time callback against the natively registered transit matrix
+
+Usage:
+    python -m benchmarks.transit_matrix --sizes 50 200 500 --time-limit 30
+"""
+import argparse
+
+from benchmarks.common import compare_values
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 200, 500])
+    parser.add_argument("--time-limit", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    compare_values(
+        "transit_matrix",
+        [False, True],
+        args.sizes,
+        args.time_limit,
+        reference="callback",
+        seed=args.seed,
+        layout="uniform",
+    )
+
+
+if __name__ == "__main__":
+    main()
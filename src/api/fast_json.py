@@ -0,0 +1,48 @@
+import json
+from datetime import date, time
+from typing import Any
+
+import numpy as np
+from pydantic import BaseModel
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    # optional, installed with the fast-json extra, encoded with the json module instead
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    """JSON of trusted server built content, numpy arrays and pydantic models included
+
+    Models are encoded as they are rather than being validated again against a response_model.
+    Uses orjson, which writes numpy arrays straight from their buffers, when it is installed.
+    """
+    if orjson is not None:
+        return orjson.dumps(
+            content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY
+        )
+    return json.dumps(content, default=_default, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(Response):
+    """Response encoded with dumps, returned by handlers to skip the response_model"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def _default(value: Any) -> Any:
+    """Values neither encoder handles natively"""
+    if isinstance(value, BaseModel):
+        return value.dict()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
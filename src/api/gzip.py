@@ -0,0 +1,74 @@
+import zlib
+from typing import Callable
+
+from fastapi import HTTPException
+from fastapi.routing import APIRoute
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.status import (
+    HTTP_400_BAD_REQUEST,
+    HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+)
+
+from src.core.config import GZIP_MAX_SIZE
+
+
+def decompress(body: bytes, max_size: int) -> bytes:
+    """Decompress gzip data without inflating more than max_size bytes
+
+    Args:
+        body (bytes): one or more concatenated gzip members
+        max_size (int): largest decompressed size accepted
+
+    Returns:
+        bytes: decompressed data, raises HTTPException 413 if larger than max_size
+    """
+    chunks = []
+    size = 0
+    while body:
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        # one byte past the limit shows it was exceeded
+        chunk = decompressor.decompress(body, max_size - size + 1)
+        size += len(chunk)
+        if size > max_size:
+            raise HTTPException(
+                status_code=HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Decompressed body is larger than {max_size} bytes",
+            )
+        if not decompressor.eof:
+            raise EOFError("Compressed file ended before the end-of-stream marker")
+        chunks.append(chunk)
+        body = decompressor.unused_data
+    return b"".join(chunks)
+
+
+class GzipRequest(Request):
+    """Request whose body is decompressed when sent with Content-Encoding: gzip"""
+
+    async def body(self) -> bytes:
+        if not hasattr(self, "_body"):
+            body = await super().body()
+            if "gzip" in self.headers.getlist("Content-Encoding"):
+                try:
+                    body = decompress(body, GZIP_MAX_SIZE)
+                except (EOFError, zlib.error) as e:
+                    raise HTTPException(
+                        status_code=HTTP_400_BAD_REQUEST,
+                        detail=f"Invalid gzip body: {e}",
+                    )
+            self._body = body
+        return self._body
+
+
+class GzipRoute(APIRoute):
+    """Route accepting gzip compressed request bodies"""
+
+    def get_route_handler(self) -> Callable:
+        original_route_handler = super().get_route_handler()
+
+        async def gzip_route_handler(request: Request) -> Response:
+            return await original_route_handler(
+                GzipRequest(request.scope, request.receive)
+            )
+
+        return gzip_route_handler
@@ -0,0 +1,168 @@
+import logging
+from typing import List, Optional, Tuple
+import httpx
+from fastapi import APIRouter, Body, Depends, HTTPException, Path
+from starlette.status import (
+    HTTP_200_OK,
+    HTTP_404_NOT_FOUND,
+    HTTP_409_CONFLICT,
+    HTTP_422_UNPROCESSABLE_ENTITY,
+    HTTP_502_BAD_GATEWAY,
+    HTTP_503_SERVICE_UNAVAILABLE,
+)
+
+from src.api.gzip import GzipRoute
+from src.api.routes.time_route import http_client
+from src.core.config import MATRIX_STORE_PATH
+from src.models.matrix_info import MatrixInfo
+from src.tasks.matrix_codec import resolve_time_matrix
+from src.tasks.matrix_store import MATRIX_ID, MatrixStore, MatrixVersionConflict
+from src.tasks.time_matrix import extend_time_matrix
+
+
+logger = logging.getLogger(__name__)
+
+
+router = APIRouter(prefix="/matrices", route_class=GzipRoute)
+
+
+MATRIX_STORE = MatrixStore(MATRIX_STORE_PATH)
+
+
+def matrix_store() -> MatrixStore:
+    return MATRIX_STORE
+
+
+@router.put(
+    "/{matrix_id}",
+    response_model=MatrixInfo,
+    name="matrices:put",
+    status_code=HTTP_200_OK,
+)
+def put_matrix(
+    location_ids: List[str],
+    matrix_id: str = Path(..., regex=MATRIX_ID.pattern),
+    time_matrix: Optional[List[List[int]]] = None,
+    time_matrix_base64: Optional[str] = Body(None),
+    matrix_store: MatrixStore = Depends(matrix_store),
+) -> MatrixInfo:
+    """Store a master time matrix that schedule requests can reference by matrix_id and location ids
+
+    Args:
+        matrix_id (str): up to 64 letters, digits, _ or -, replaces any matrix with the same id
+        location_ids (List[str]): id of the location of each row and column
+        time_matrix (Optional[List[List[int]]]): matrix representation of the distances between each location
+        time_matrix_base64 (Optional[str]): time_matrix as base64 of a .npy file or raw int32 buffer, see schedule:create
+
+    Request bodies may be gzip compressed with Content-Encoding: gzip
+
+    Returns:
+        MatrixInfo: the stored matrix
+    """
+    try:
+        stored = matrix_store.put(
+            matrix_id,
+            location_ids,
+            resolve_time_matrix(time_matrix, time_matrix_base64),
+        )
+    except Exception as e:
+        logger.error(str(e))
+        raise HTTPException(status_code=422, detail=str(e))
+    logger.info(f"stored matrix {matrix_id} of {len(location_ids)} locations")
+    return MatrixInfo(id=matrix_id, locations=len(stored.location_ids))
+
+
+@router.get(
+    "/{matrix_id}",
+    response_model=MatrixInfo,
+    name="matrices:get",
+    status_code=HTTP_200_OK,
+)
+def get_matrix(
+    matrix_id: str = Path(..., regex=MATRIX_ID.pattern),
+    matrix_store: MatrixStore = Depends(matrix_store),
+) -> MatrixInfo:
+    """Size of a stored master time matrix"""
+    stored = matrix_store.get(matrix_id)
+    if stored is None:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Matrix not found")
+    return MatrixInfo(id=matrix_id, locations=len(stored.location_ids))
+
+
+@router.post(
+    "/{matrix_id}/extend",
+    response_model=MatrixInfo,
+    name="matrices:extend",
+    status_code=HTTP_200_OK,
+)
+async def extend_matrix(
+    location_ids: List[str],
+    matrix_id: str = Path(..., regex=MATRIX_ID.pattern),
+    addresses: Optional[List[str]] = Body(None),
+    coordinates: Optional[List[Tuple[float, float]]] = None,
+    matrix_store: MatrixStore = Depends(matrix_store),
+    client: httpx.AsyncClient = Depends(http_client),
+) -> MatrixInfo:
+    """Add locations to a stored master time matrix, only the times to and from the new locations are requested
+
+    Args:
+        matrix_id (str): id of the stored matrix
+        location_ids (List[str]): ids of the new locations
+        addresses (Optional[List[str]]): addresses of the stored then new locations
+        coordinates (Optional[List[Tuple[float, float]]]): (lat, long) of the stored then new locations, used instead of addresses
+
+    Exactly one of addresses or coordinates is required, location ids are not sent to the Distance Matrix API
+
+    Returns:
+        MatrixInfo: the extended matrix
+    """
+    stored = matrix_store.get(matrix_id)
+    if stored is None:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Matrix not found")
+    existing = [id_ for id_ in location_ids if id_ in stored.positions]
+    if existing or len(set(location_ids)) != len(location_ids):
+        raise HTTPException(
+            status_code=HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Location ids must be new and unique, got {existing or location_ids}",
+        )
+    if (addresses is None) == (coordinates is None):
+        raise HTTPException(
+            status_code=HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Give exactly one of addresses or coordinates",
+        )
+    locations = addresses if coordinates is None else coordinates
+    n_old = len(stored.location_ids)
+    if len(locations) != n_old + len(location_ids):
+        raise HTTPException(
+            status_code=HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Require addresses or coordinates for the stored and new locations",
+        )
+
+    try:
+        matrix = await extend_time_matrix(
+            stored.matrix,
+            locations[:n_old],
+            locations[n_old:],
+            driver_indicies=[],
+            client=client,
+            coordinates=coordinates is not None,
+        )
+    except Exception as e:
+        logger.error(str(e))
+        raise HTTPException(status_code=HTTP_502_BAD_GATEWAY, detail=str(e))
+
+    try:
+        stored = matrix_store.put(
+            matrix_id, stored.location_ids + location_ids, matrix, stored.version
+        )
+    except MatrixVersionConflict as e:
+        logger.error(str(e))
+        raise HTTPException(status_code=HTTP_409_CONFLICT, detail=str(e))
+    except OSError as e:
+        logger.error(str(e))
+        raise HTTPException(
+            status_code=HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Matrix could not be stored, retry later",
+        )
+    logger.info(f"extended matrix {matrix_id} with {len(location_ids)} locations")
+    return MatrixInfo(id=matrix_id, locations=len(stored.location_ids))
@@ -0,0 +1,21 @@
+from fastapi import APIRouter
+from starlette.responses import PlainTextResponse
+from starlette.status import HTTP_200_OK
+
+from src.core.metrics import render_metrics
+
+
+router = APIRouter(prefix="/metrics")
+
+
+@router.get(
+    "",
+    response_class=PlainTextResponse,
+    name="metrics:get",
+    status_code=HTTP_200_OK,
+)
+def get_metrics() -> PlainTextResponse:
+    """Phase latencies and solve outcomes in the Prometheus text format"""
+    return PlainTextResponse(
+        render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
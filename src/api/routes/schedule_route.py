@@ -1,20 +1,91 @@
+import asyncio
+import json
 import logging
-from typing import List, Optional, Tuple
-from fastapi import APIRouter, HTTPException, Depends
-from starlette.status import HTTP_200_OK
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple, Union
+from fastapi import APIRouter, Body, HTTPException, Depends, Header, Query, Response
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.status import (
+    HTTP_200_OK,
+    HTTP_202_ACCEPTED,
+    HTTP_404_NOT_FOUND,
+    HTTP_422_UNPROCESSABLE_ENTITY,
+    HTTP_429_TOO_MANY_REQUESTS,
+)
 
+from src.api.fast_json import FastJSONResponse
+from src.api.gzip import GzipRoute
+from src.api.routes.matrix_route import MATRIX_STORE, matrix_store
+from src.core.config import (
+    BATCH_CONCURRENCY,
+    FAST_JSON,
+    SOLVER_WORKERS,
+    SOLVER_QUEUE_SIZE,
+    JOB_RETENTION,
+    SOLUTION_CACHE_SIZE,
+    SOLUTION_CACHE_TTL,
+    SOLUTION_CACHE_PATH,
+)
+from src.core.metrics import PHASE_SECONDS, size_bucket
+from src.models.batch import BatchInstance
+from src.models.capacity import CapacityDimension
+from src.models.columnar_schedule import ScheduleFormat
+from src.models.job import Job
+from src.models.partial_schedule import PartialSchedules
+from src.models.precedence import PrecedencePolicy
 from src.models.schedule import Schedule
-from src.tasks.routing import Router
+from src.models.schedule_request import ScheduleRequest
+from src.models.search import Metaheuristic, SearchPreset
+from src.tasks.batch import solve_batch
+from src.tasks.cache import IdempotencyKeyReused, SolutionCache, solution_key
+from src.tasks.decompose import solve_decomposed
+from src.tasks.jobs import JobQueue, submit_request
+from src.tasks.matrix_codec import matrix_order
+from src.tasks.matrix_store import MatrixStore
+from src.tasks.pool import (
+    PackedRoutes,
+    SolverPool,
+    SolverPoolFull,
+    pack_inputs,
+    unpack_routes,
+)
+from src.tasks.portfolio import solve_portfolio
+from src.tasks.schedule import (
+    build_columns,
+    build_schedules,
+    dropped_pairs,
+    routes_from_schedules,
+)
+from src.tasks.search import search_params
+from src.tasks.stream import stream_solutions
 
 
 logger = logging.getLogger(__name__)
 
 
-router = APIRouter(prefix="/schedule")
+router = APIRouter(prefix="/schedule", route_class=GzipRoute)
+
+
+SOLVER_POOL = SolverPool(max_workers=SOLVER_WORKERS, max_queue=SOLVER_QUEUE_SIZE)
+JOB_QUEUE = JobQueue(SOLVER_POOL, max_finished=JOB_RETENTION, matrix_store=MATRIX_STORE)
+SOLUTION_CACHE = SolutionCache(
+    max_entries=SOLUTION_CACHE_SIZE, ttl=SOLUTION_CACHE_TTL, path=SOLUTION_CACHE_PATH
+)
+
+
+def solver_pool() -> SolverPool:
+    return SOLVER_POOL
 
 
-def routing_model() -> Router:
-    return Router()
+def job_queue() -> JobQueue:
+    return JOB_QUEUE
+
+
+def solution_cache() -> SolutionCache:
+    return SOLUTION_CACHE
 
 
 @router.post(
@@ -23,23 +94,53 @@ def routing_model() -> Router:
     name="schedule:create",
     status_code=HTTP_200_OK,
 )
-def create_schedule(
-    time_matrix: List[List[int]],
+async def create_schedule(
+    request: Request,
+    response: Response,
     driver_indicies: List[int],
     delivery_pairs: List[Tuple[int, int]],
+    time_matrix: Optional[List[List[int]]] = None,
+    time_matrix_base64: Optional[str] = Body(None),
+    time_matrix_triangle: Optional[List[int]] = None,
+    matrix_id: Optional[str] = Body(None),
+    location_ids: Optional[List[str]] = None,
     delivery_weights: Optional[List[int]] = None,
     vehicle_capacities: Optional[List[int]] = None,
     site_eta: Optional[List[int]] = None,
     time_worked: Optional[List[int]] = None,
     max_time: int = 28800,
     location_names: Optional[List[str]] = None,
-    routing_model: Router = Depends(routing_model),
+    capacity_dimensions: Optional[Dict[str, CapacityDimension]] = None,
+    previous_schedule: Optional[List[Schedule]] = None,
+    drop_penalties: Optional[List[int]] = None,
+    portfolio: bool = False,
+    first_feasible: bool = False,
+    decompose: bool = False,
+    clusters: Optional[int] = Query(None, gt=0),
+    boundary_repair: bool = True,
+    preset: SearchPreset = SearchPreset.balanced,
+    time_limit: Optional[float] = Query(None, gt=0),
+    solution_limit: Optional[int] = Query(None, gt=0),
+    metaheuristic: Optional[Metaheuristic] = None,
+    lns_time_limit: Optional[float] = Query(None, gt=0),
+    improvement_window: Optional[float] = Query(None, gt=0),
+    nearest_neighbors: Optional[int] = Query(None, gt=0),
+    precedence: Optional[PrecedencePolicy] = None,
+    schedule_format: ScheduleFormat = Query(ScheduleFormat.legs, alias="format"),
+    idempotency_key: Optional[str] = Header(None),
+    solver_pool: SolverPool = Depends(solver_pool),
+    solution_cache: SolutionCache = Depends(solution_cache),
+    matrix_store: MatrixStore = Depends(matrix_store),
 ) -> List[Schedule]:
     """Create a schedule for each driver within the given constraints
 
     Args:
         max_time (int): Max time any one driver can work
-        time_matrix (List[List[int]]): matrix representation of the distances between each location
+        time_matrix (Optional[List[List[int]]]): matrix representation of the distances between each location
+        time_matrix_base64 (Optional[str]): time_matrix as base64 of a .npy file or raw int32 buffer (see decode_matrix), avoids parsing large matrices as json. Exactly one of time_matrix, time_matrix_base64, time_matrix_triangle and matrix_id is required
+        time_matrix_triangle (Optional[List[int]]): upper triangle of a symmetric time matrix, diagonal included, in row-major order as returned by time_matrix:create with symmetric. Solved without expanding it to the square matrix
+        matrix_id (Optional[str]): id of a master matrix stored with matrices:put, the time matrix is sliced from it by location_ids
+        location_ids (Optional[List[str]]): with matrix_id, the location id of each location, these also name the locations unless location_names is given
         driver_indicies (List[int]): indicies where locations relate to a drivers location
         delivery_pairs (List[Tuple[int, int]]): (pickup index, delivery index) for each delivery. If not delivering give same pickup and delivery index
         delivery_weights (Optional[List[int]]): vehicle capacity required to fulfill delivery.
@@ -47,28 +148,75 @@ def create_schedule(
         site_eta (Optional[List[int]]): estimated time at each location
         time_worked (Optional[List[int]]): time already worked by each driver before this reques to ensure dont exceed max time
         location_names (Optional[List[str]]): Names of locations in the time matrix
+        capacity_dimensions (Optional[Dict[str, CapacityDimension]]): additional named capacities (e.g. volume) constrained alongside delivery_weights
+        previous_schedule (Optional[List[Schedule]]): schedules returned by an earlier request, search starts from these with new locations inserted. Locations are matched by name so location_names must be given if locations were added or removed
+        drop_penalties (Optional[List[int]]): makes deliveries optional, a best-effort schedule leaves out pairs that cannot be or are not worth serving at the cost of their penalty, added to the objective, rather than failing. Give a penalty for each delivery pair, higher than the time serving it adds to the objective so pairs are only dropped when they must be
+        portfolio (bool): race several search strategies in parallel and keep the best solution, the winner is given in the X-Solver-Strategy header
+        first_feasible (bool): with portfolio, return the first solution found rather than the best
+        decompose (bool): split locations and drivers into regions solved in parallel processes then stitched together, for large fleets where one model cannot be solved in time
+        clusters (Optional[int]): number of regions to decompose into, one per 150 locations if not given
+        boundary_repair (bool): with decompose, re-solve neighbouring regions together after stitching
+        preset (SearchPreset): fast (1s), balanced (10s) or quality (300s with guided local search) search, the fields below override it
+        time_limit (Optional[float]): seconds the search may run for
+        solution_limit (Optional[int]): stop the search after this many solutions
+        metaheuristic (Optional[Metaheuristic]): local search metaheuristic used to escape local optima
+        lns_time_limit (Optional[float]): seconds each large neighbourhood search completion may take
+        improvement_window (Optional[float]): stop the search once the objective has not improved for this many seconds
+        nearest_neighbors (Optional[int]): penalise travel from each location to anything but its k nearest successors or the end of a route, speeds up the search of large instances
+        precedence (Optional[PrecedencePolicy]): model delivery pairs with the solvers native pickup and delivery support, direct goes straight from each pickup to its delivery, lifo delivers the last picked up first, fifo the first picked up first and free in any order. If not given each pickup goes straight to its delivery, enforced with extra constraints on every pair
+        schedule_format (ScheduleFormat): format query param, legs returns a Schedule per driver, columnar returns ColumnarSchedules with parallel arrays per driver which are much cheaper to build and smaller for large fleets
+        idempotency_key (Optional[str]): Idempotency-Key header, retries with the same key return the stored result. Reusing a key for different inputs is rejected
+
+    Request bodies may be gzip compressed with Content-Encoding: gzip
+
+    Solutions are cached by their inputs so identical requests are only solved once, the X-Solver-Cache header is hit when answered from the cache
 
     Returns:
-        List[Schedule]: Schedule for each driver
+        List[Schedule]: Schedule for each driver, or ColumnarSchedules if the columnar format was asked for. With drop_penalties PartialSchedules
+            listing the dropped pairs alongside the schedules, columnar schedules give them as dropped_pairs. The objective of the solution is given in the X-Solver-Objective header
     """
 
-    # log all inputs
-    logger.info(
-        f"""INPUTS:
-        time_matrix: {time_matrix}, 
-        driver_indicies: {driver_indicies}, 
-        delivery_pairs: {delivery_pairs}, 
-        delivery_weights: {delivery_weights}, 
-        vehicle_capacities: {vehicle_capacities}, 
-        site_eta: {site_eta}, 
-        time_worked: {time_worked}
-        max_time: {max_time}
-        location_names: {location_names}"""
-    )
-
+    # everything synchronous runs in the threadpool, large matrices would otherwise block the event loop
     try:
-        routing_model.solve(
-            time_matrix=time_matrix,
+        matrix = await run_in_threadpool(
+            matrix_store.resolve,
+            time_matrix,
+            time_matrix_base64,
+            matrix_id,
+            location_ids,
+            time_matrix_triangle,
+        )
+    except Exception as e:
+        logger.error(str(e))
+        raise HTTPException(status_code=422, detail=str(e))
+    # stops are named by their location id unless named otherwise
+    location_names = location_names or location_ids
+
+    # reading and validating the body happens before the handler is called
+    size = size_bucket(matrix_order(matrix))
+    _observe_phase(request, "validate", size)
+
+    def submit() -> Tuple[Future, bool]:
+        """Pack the inputs and start their solve, or find it in the solution cache"""
+        # log all inputs, binary matrices by shape only
+        logger.info(
+            f"""INPUTS:
+            time_matrix: {time_matrix if time_matrix is not None else f"int32{matrix.shape}"}, 
+            driver_indicies: {driver_indicies}, 
+            delivery_pairs: {delivery_pairs}, 
+            delivery_weights: {delivery_weights}, 
+            vehicle_capacities: {vehicle_capacities}, 
+            site_eta: {site_eta}, 
+            time_worked: {time_worked}
+            max_time: {max_time}
+            location_names: {location_names}
+            capacity_dimensions: {capacity_dimensions}
+            previous_schedule: {previous_schedule}
+            drop_penalties: {drop_penalties}"""
+        )
+
+        inputs = pack_inputs(
+            time_matrix=matrix,
             driver_indicies=driver_indicies,
             delivery_pairs=delivery_pairs,
             delivery_weights=delivery_weights,
@@ -76,22 +224,305 @@ def create_schedule(
             site_eta=site_eta,
             time_worked=time_worked,
             max_time=max_time,
+            capacity_dimensions=capacity_dimensions,
+            initial_routes=routes_from_schedules(previous_schedule, location_names)
+            if previous_schedule
+            else None,
+            drop_penalties=drop_penalties,
+        )
+        params = search_params(
+            preset.value,
+            time_limit=time_limit,
+            solution_limit=solution_limit,
+            metaheuristic=metaheuristic.value if metaheuristic else None,
+            lns_time_limit=lns_time_limit,
         )
-        # list of schedules, 1 for each driver
-        return [
-            Schedule.from_raw(
-                driver_id=i,
-                route=routes,
-                time=times,
-                locations=location_names,
+        router_options = dict(
+            improvement_window=improvement_window, nearest_neighbors=nearest_neighbors
+        )
+        if precedence is not None:
+            router_options["precedence"] = precedence.value
+        key = solution_key(
+            inputs,
+            portfolio=portfolio,
+            first_feasible=first_feasible,
+            search=params.SerializeToString(deterministic=True),
+            router_options=router_options,
+            decompose=decompose and (clusters, boundary_repair),
+        )
+        if idempotency_key:
+            solution_cache.claim(idempotency_key, key)
+
+        if portfolio and decompose:
+            raise Exception("portfolio and decompose cannot be combined")
+        if decompose:
+            return solution_cache.get_or_submit(
+                key,
+                lambda: solve_decomposed(
+                    solver_pool,
+                    inputs,
+                    clusters,
+                    params,
+                    boundary_repair=boundary_repair,
+                    router_options=router_options,
+                ),
             )
-            for i, (routes, times) in enumerate(
-                zip(routing_model.get_route_list(), routing_model.get_route_times())
+        if portfolio:
+            return solution_cache.get_or_submit(
+                key,
+                lambda: solve_portfolio(
+                    solver_pool,
+                    inputs,
+                    first_feasible=first_feasible,
+                    params=params,
+                    router_options=router_options,
+                ),
+            )
+        return solution_cache.get_or_submit(
+            key,
+            lambda: solver_pool.submit(inputs, params, router_options=router_options),
+        )
+
+    def build(packed: PackedRoutes) -> Union[List[Schedule], Response]:
+        """Schedules of the solution in the requested format"""
+        start = time.perf_counter()
+        dropped = (
+            None
+            if drop_penalties is None
+            else dropped_pairs(packed.nodes, delivery_pairs)
+        )
+        if dropped:
+            logger.warning(f"dropped delivery pairs {dropped}")
+        if schedule_format == ScheduleFormat.columnar:
+            columns = build_columns(packed.nodes, packed.times, packed.offsets)
+            columns.dropped_pairs = dropped
+            # serialized here without validating against response_model
+            schedules = Response(
+                columns.json(exclude_none=True),
+                media_type="application/json",
+                headers=_solver_headers(response),
             )
-        ]
+        else:
+            routes, times = unpack_routes(packed)
+            schedules = build_schedules(routes, times, location_names)
+            if dropped is not None:
+                partial = PartialSchedules.construct(
+                    schedules=schedules, dropped_pairs=dropped
+                )
+                # not a List[Schedule] so serialized here rather than by the response_model
+                schedules = (
+                    FastJSONResponse(partial, headers=_solver_headers(response))
+                    if FAST_JSON
+                    else Response(
+                        partial.json(),
+                        media_type="application/json",
+                        headers=_solver_headers(response),
+                    )
+                )
+            elif FAST_JSON:
+                # built here so not validated again against the response_model
+                schedules = FastJSONResponse(
+                    schedules, headers=_solver_headers(response)
+                )
+        PHASE_SECONDS.observe(time.perf_counter() - start, phase="schedules", size=size)
+        return schedules
+
+    try:
+        future, cached = await run_in_threadpool(submit)
+        packed = await asyncio.wrap_future(future)
+        if portfolio:
+            logger.info(f"portfolio won by {packed.strategy}")
+            response.headers["X-Solver-Strategy"] = packed.strategy
+            packed = packed.routes
+        response.headers["X-Solver-Cache"] = "hit" if cached else "miss"
+        response.headers["X-Solver-Objective"] = str(packed.objective)
+
+        schedules = await run_in_threadpool(build, packed)
+
+        # serialized after returning, observed by the log_requests middleware
+        request.state.metrics_size = size
+        request.state.handler_end = time.perf_counter()
+        return schedules
+    except SolverPoolFull as e:
+        logger.warning(str(e))
+        raise _too_many_requests(e)
+    except IdempotencyKeyReused as e:
+        logger.warning(str(e))
+        raise HTTPException(status_code=HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
     except Exception as e:
         logger.error(str(e))
         raise HTTPException(
             status_code=422,
             detail=str(e),
         )
+
+
+@router.post(
+    "/batch",
+    response_class=StreamingResponse,
+    name="schedule:batch",
+    status_code=HTTP_200_OK,
+)
+async def create_schedule_batch(
+    instances: List[BatchInstance],
+    solver_pool: SolverPool = Depends(solver_pool),
+    matrix_store: MatrixStore = Depends(matrix_store),
+) -> StreamingResponse:
+    """Solve many independent instances, streaming each result as a line of json as soon as it is solved
+
+    Args:
+        instances (List[BatchInstance]): same inputs as schedule:jobs with the caller's id of each instance
+
+    Request bodies may be gzip compressed with Content-Encoding: gzip
+
+    Returns:
+        StreamingResponse: newline delimited BatchResult of each instance in the order they finish,
+            instances that fail are given with their error rather than stopping the batch
+    """
+    ids = [instance.id for instance in instances]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=422, detail="Instance ids must be unique")
+    logger.info(f"batch of {len(instances)} instances")
+
+    async def lines():
+        async for result in solve_batch(
+            solver_pool, instances, BATCH_CONCURRENCY, matrix_store
+        ):
+            if result.error:
+                logger.error(f"batch instance {result.id} failed: {result.error}")
+            yield result.json() + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.post(
+    "/stream",
+    response_class=StreamingResponse,
+    name="schedule:stream",
+    status_code=HTTP_200_OK,
+)
+def create_schedule_stream(
+    request: ScheduleRequest,
+    solver_pool: SolverPool = Depends(solver_pool),
+    matrix_store: MatrixStore = Depends(matrix_store),
+) -> StreamingResponse:
+    """Solve a schedule, streaming the schedules of each improving solution as server-sent events while the search runs
+
+    Args:
+        request (ScheduleRequest): same inputs as schedule:jobs, decompose is not supported
+
+    Returns:
+        StreamingResponse: a solution event with the objective and schedules of each improving solution,
+            then a result event with the final solution or an error event with the reason the search failed
+    """
+    try:
+        progress = solver_pool.progress_queue()
+        future, location_names = submit_request(
+            solver_pool, request, progress, matrix_store=matrix_store
+        )
+    except SolverPoolFull as e:
+        logger.warning(str(e))
+        raise _too_many_requests(e)
+    except Exception as e:
+        logger.error(str(e))
+        raise HTTPException(status_code=422, detail=str(e))
+
+    async def events():
+        try:
+            async for final, event in stream_solutions(
+                future,
+                progress,
+                location_names,
+                None if request.drop_penalties is None else request.delivery_pairs,
+            ):
+                event_type = "result" if final else "solution"
+                yield f"event: {event_type}\ndata: {event.json()}\n\n"
+        except Exception as e:
+            logger.error(str(e))
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"}
+    )
+
+
+@router.post(
+    "/jobs",
+    response_model=Job,
+    name="schedule:create_job",
+    status_code=HTTP_202_ACCEPTED,
+)
+def create_schedule_job(
+    request: ScheduleRequest, job_queue: JobQueue = Depends(job_queue)
+) -> Job:
+    """Queue a schedule to be solved in the background, poll schedule:get_job with the returned id for the result
+
+    Args:
+        request (ScheduleRequest): same inputs as schedule:create with max_time given in the body
+
+    Returns:
+        Job: pending job
+    """
+    try:
+        job = job_queue.submit(request)
+    except SolverPoolFull as e:
+        logger.warning(str(e))
+        raise _too_many_requests(e)
+    except Exception as e:
+        logger.error(str(e))
+        raise HTTPException(status_code=422, detail=str(e))
+    logger.info(f"queued job {job.id}")
+    return job
+
+
+@router.get(
+    "/jobs/{job_id}",
+    response_model=Job,
+    name="schedule:get_job",
+    status_code=HTTP_200_OK,
+)
+def get_schedule_job(job_id: str, job_queue: JobQueue = Depends(job_queue)) -> Job:
+    """Status of a scheduling job, result holds the schedule for each driver once completed"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+
+@router.delete(
+    "/jobs/{job_id}",
+    response_model=Job,
+    name="schedule:cancel_job",
+    status_code=HTTP_200_OK,
+)
+def cancel_schedule_job(job_id: str, job_queue: JobQueue = Depends(job_queue)) -> Job:
+    """Cancel a scheduling job, the result of a job already being solved is discarded"""
+    job = job_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Job not found")
+    logger.info(f"cancelled job {job.id}")
+    return job
+
+
+def _observe_phase(request: Request, phase: str, size: str) -> None:
+    """Observe the time since the request started, see the log_requests middleware"""
+    start = getattr(request.state, "start", None)
+    if start is not None:
+        PHASE_SECONDS.observe(time.perf_counter() - start, phase=phase, size=size)
+
+
+def _solver_headers(response: Response) -> Dict[str, str]:
+    """Headers set on the injected response, these are not copied to responses returned by the handler"""
+    return {
+        name: value
+        for name, value in response.headers.items()
+        if name.startswith("x-solver")
+    }
+
+
+def _too_many_requests(e: SolverPoolFull) -> HTTPException:
+    return HTTPException(
+        status_code=HTTP_429_TOO_MANY_REQUESTS,
+        detail=str(e),
+        headers={"Retry-After": str(e.retry_after)},
+    )
@@ -1,17 +1,40 @@
 import logging
-from typing import List
-from fastapi import APIRouter
-from starlette.status import HTTP_200_OK
+from typing import List, Optional, Tuple, Union
+import httpx
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.status import (
+    HTTP_200_OK,
+    HTTP_422_UNPROCESSABLE_ENTITY,
+    HTTP_502_BAD_GATEWAY,
+)
 
-from src.models.time_matrix import TimeMatrix
-from src.tasks.time_matrix import get_time_matrix
+from src.api.fast_json import FastJSONResponse
+from src.api.gzip import GzipRoute
+from src.core.config import FAST_JSON
+from src.models.calibration import Calibration
+from src.models.time_matrix import MatrixProvider, TimeMatrix
+from src.tasks.matrix_codec import pack_triangle, unpack_triangle
+from src.tasks.time_matrix import (
+    extend_time_matrix,
+    get_time_matrix,
+    get_time_triangle,
+)
+from src.tasks.travel_estimate import DETOUR_FACTOR, calibrate, estimate_time_matrix
 
 
 # get root logger
 logger = logging.getLogger(__name__)
 
 
-router = APIRouter(prefix="/time_matrix")
+router = APIRouter(prefix="/time_matrix", route_class=GzipRoute)
+
+
+def http_client(request: Request) -> httpx.AsyncClient:
+    # shared between requests so connections are reused, see server startup
+    return request.app.state.http_client
 
 
 @router.post(
@@ -20,8 +43,17 @@ router = APIRouter(prefix="/time_matrix")
     name="time_matrix:create",
     status_code=HTTP_200_OK,
 )
-def create_time_matrix(
-    return_home: bool, locations: List[str], driver_indicies: List[int]
+async def create_time_matrix(
+    return_home: bool,
+    locations: List[str],
+    driver_indicies: List[int],
+    coordinates: Optional[List[Tuple[float, float]]] = None,
+    calibration: Optional[Calibration] = None,
+    provider: MatrixProvider = MatrixProvider.google,
+    speed_profile: str = "car",
+    detour_factor: float = DETOUR_FACTOR,
+    symmetric: bool = False,
+    client: httpx.AsyncClient = Depends(http_client),
 ) -> TimeMatrix:
     """Create a time matrix to represent distance between locations
 
@@ -29,6 +61,12 @@ def create_time_matrix(
         locations (List[str]): Names of locations of interest
         driver_indicies (List[int]): indicies where locations relate to a drivers location
         return_home: Whether or not to include returning to home as a distance.
+        coordinates (Optional[List[Tuple[float, float]]]): (lat, long) of each location, used instead of names if given. Required by the estimate provider
+        calibration (Optional[Calibration]): durations previously fetched for some coordinates, the estimate provider fits its speed to these
+        provider (MatrixProvider): google to query the Distance Matrix API, estimate to compute travel times offline from coordinates
+        speed_profile (str): average speed used by the estimate provider (car, van, truck, bicycle, walking)
+        detour_factor (float): ratio of road to straight line distance used by the estimate provider
+        symmetric (bool): treat travel times as the same in both directions, only the upper triangle is requested and it is returned packed as triangle instead of matrix. Requires return_home
 
     Returns:
         TimeMatrix
@@ -38,10 +76,154 @@ def create_time_matrix(
         f"""INPUTS:
     locations: {locations},
     driver_indicies: {driver_indicies},
-    return_home: {return_home}"""
+    return_home: {return_home}
+    coordinates: {coordinates}
+    provider: {provider}"""
+    )
+
+    if coordinates is not None and len(coordinates) != len(locations):
+        raise HTTPException(
+            status_code=HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="len(coordinates) != len(locations), require coordinates for all locations",
+        )
+    if symmetric and not return_home:
+        raise HTTPException(
+            status_code=HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="symmetric time matrices require return_home",
+        )
+
+    if provider == MatrixProvider.estimate:
+        if coordinates is None:
+            raise HTTPException(
+                status_code=HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="estimate provider requires coordinates",
+            )
+        try:
+            matrix = estimate_time_matrix(
+                coordinates,
+                driver_indicies,
+                return_home,
+                speed_profile=speed_profile,
+                detour_factor=detour_factor,
+                calibration=calibrate(calibration.coordinates, calibration.matrix)
+                if calibration
+                else None,
+            )
+        except Exception as e:
+            logger.error(str(e))
+            raise HTTPException(
+                status_code=HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e)
+            )
+        if symmetric:
+            # straight line estimates are the same in both directions
+            return _time_matrix_response(
+                locations, driver_indicies, triangle=pack_triangle(matrix)
+            )
+    elif symmetric:
+        try:
+            triangle = await get_time_triangle(
+                coordinates or locations,
+                client=client,
+                coordinates=coordinates is not None,
+            )
+        except Exception as e:
+            logger.error(str(e))
+            raise HTTPException(status_code=HTTP_502_BAD_GATEWAY, detail=str(e))
+        return _time_matrix_response(locations, driver_indicies, triangle=triangle)
+    else:
+        try:
+            matrix = await get_time_matrix(
+                coordinates or locations,
+                driver_indicies,
+                return_home,
+                client=client,
+                coordinates=coordinates is not None,
+            )
+        except Exception as e:
+            logger.error(str(e))
+            raise HTTPException(status_code=HTTP_502_BAD_GATEWAY, detail=str(e))
+    return _time_matrix_response(locations, driver_indicies, matrix=matrix)
+
+
+@router.post(
+    "/extend",
+    response_model=TimeMatrix,
+    name="time_matrix:extend",
+    status_code=HTTP_200_OK,
+)
+async def extend_time_matrix_route(
+    return_home: bool,
+    time_matrix: TimeMatrix,
+    new_locations: List[str],
+    coordinates: Optional[List[Tuple[float, float]]] = None,
+    client: httpx.AsyncClient = Depends(http_client),
+) -> TimeMatrix:
+    """Add locations to a time matrix from time_matrix:create, only the times to and from the new locations are requested
+
+    Args:
+        return_home: as given when the time matrix was created
+        time_matrix (TimeMatrix): existing time matrix, its driver_indicies are kept. A triangle is extended to a full matrix
+        new_locations (List[str]): Names of locations added after the existing ones
+        coordinates (Optional[List[Tuple[float, float]]]): (lat, long) of the existing then new locations, used instead of names if given
+
+    Returns:
+        TimeMatrix
+    """
+    locations = time_matrix.locations + new_locations
+    if coordinates is not None and len(coordinates) != len(locations):
+        raise HTTPException(
+            status_code=HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="len(coordinates) != len(locations) + len(new_locations), require coordinates for all locations",
+        )
+    if (time_matrix.matrix is None) == (time_matrix.triangle is None):
+        raise HTTPException(
+            status_code=HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="time_matrix requires exactly one of matrix or triangle",
+        )
+    logger.info(
+        f"extending time matrix of {len(time_matrix.locations)} locations with {new_locations}"
     )
 
-    matrix = get_time_matrix(locations, driver_indicies, return_home)
+    n_old = len(time_matrix.locations)
+    try:
+        matrix = await extend_time_matrix(
+            # the new locations are requested in both directions so extended as a square
+            time_matrix.matrix
+            if time_matrix.triangle is None
+            else unpack_triangle(time_matrix.triangle),
+            coordinates[:n_old] if coordinates else time_matrix.locations,
+            coordinates[n_old:] if coordinates else new_locations,
+            time_matrix.driver_indicies,
+            return_home,
+            client=client,
+            coordinates=coordinates is not None,
+        )
+    except Exception as e:
+        logger.error(str(e))
+        raise HTTPException(status_code=HTTP_502_BAD_GATEWAY, detail=str(e))
+    return _time_matrix_response(locations, time_matrix.driver_indicies, matrix=matrix)
+
+
+def _time_matrix_response(
+    locations: List[str],
+    driver_indicies: List[int],
+    matrix: Optional[Union[np.ndarray, List[List[int]]]] = None,
+    triangle: Optional[np.ndarray] = None,
+) -> Union[TimeMatrix, Response]:
+    """TimeMatrix of the handler, encoded directly from numpy when FAST_JSON is set"""
+    if FAST_JSON:
+        # built here so not validated element by element against the response_model
+        return FastJSONResponse(
+            dict(
+                locations=locations,
+                driver_indicies=driver_indicies,
+                matrix=matrix,
+                triangle=triangle,
+            )
+        )
     return TimeMatrix(
-        locations=locations, driver_indicies=driver_indicies, matrix=matrix
+        locations=locations,
+        driver_indicies=driver_indicies,
+        matrix=matrix.tolist() if isinstance(matrix, np.ndarray) else matrix,
+        triangle=None if triangle is None else triangle.tolist(),
     )
@@ -4,8 +4,12 @@ import random
 import string
 from fastapi import FastAPI
 from starlette.requests import Request
+from src.api.routes.matrix_route import router as matrix_router
+from src.api.routes.metrics_route import router as metrics_router
 from src.api.routes.schedule_route import router as schedule_router
 from src.api.routes.time_route import router as time_router
+from src.core.metrics import PHASE_SECONDS
+from src.tasks.time_matrix import create_client
 
 # setup loggers
 logging.config.fileConfig("logging.conf", disable_existing_loggers=False)
@@ -17,6 +21,18 @@ logger = logging.getLogger(__name__)
 app = FastAPI(title="Pickup/Delivery POC")
 app.include_router(time_router)
 app.include_router(schedule_router)
+app.include_router(matrix_router)
+app.include_router(metrics_router)
+
+
+@app.on_event("startup")
+async def open_http_client():
+    app.state.http_client = create_client()
+
+
+@app.on_event("shutdown")
+async def close_http_client():
+    await app.state.http_client.aclose()
 
 
 @app.middleware("http")
@@ -24,9 +40,19 @@ async def log_requests(request: Request, call_next):
     idem = "".join(random.choices(string.ascii_uppercase + string.digits, k=6))
     logger.info(f"rid={idem} start request path={request.url.path}")
     start_time = time.time()
+    request.state.start = time.perf_counter()
 
     response = await call_next(request)
 
+    # time between the handler returning and the response being ready is serialization
+    handler_end = getattr(request.state, "handler_end", None)
+    if handler_end is not None:
+        PHASE_SECONDS.observe(
+            time.perf_counter() - handler_end,
+            phase="serialize",
+            size=request.state.metrics_size,
+        )
+
     process_time = (time.time() - start_time) * 1000
     formatted_process_time = "{0:.2f}".format(process_time)
     logger.info(
@@ -6,3 +6,32 @@ config = Config(".env")
 API_ADDRESS = "https://maps.googleapis.com/maps/api/distancematrix/json"
 # google maps API KEY (used to create distance matrix for real locations)
 API_KEY = config("API_KEY", cast=str)
+# Distance Matrix requests sent at once when building a time matrix
+MATRIX_CONCURRENCY = config("MATRIX_CONCURRENCY", cast=int, default=8)
+# seconds before a Distance Matrix request times out
+MATRIX_TIMEOUT = config("MATRIX_TIMEOUT", cast=float, default=10)
+# times a rate limited or failed Distance Matrix request is retried
+MATRIX_RETRIES = config("MATRIX_RETRIES", cast=int, default=3)
+# base seconds of the exponential backoff between retries
+MATRIX_BACKOFF = config("MATRIX_BACKOFF", cast=float, default=0.5)
+
+# number of processes solving schedules
+SOLVER_WORKERS = config("SOLVER_WORKERS", cast=int, default=1)
+# schedules that can wait for a solver process before new requests are rejected
+SOLVER_QUEUE_SIZE = config("SOLVER_QUEUE_SIZE", cast=int, default=16)
+# instances of one batch solving at once, the rest wait for one of them to finish
+BATCH_CONCURRENCY = config("BATCH_CONCURRENCY", cast=int, default=SOLVER_WORKERS)
+# finished scheduling jobs kept in memory for retrieval
+JOB_RETENTION = config("JOB_RETENTION", cast=int, default=256)
+# solutions kept in memory so identical requests are not solved again
+SOLUTION_CACHE_SIZE = config("SOLUTION_CACHE_SIZE", cast=int, default=128)
+# seconds a cached solution is valid for
+SOLUTION_CACHE_TTL = config("SOLUTION_CACHE_TTL", cast=float, default=3600)
+# sqlite file cached solutions are also persisted to, memory only if empty
+SOLUTION_CACHE_PATH = config("SOLUTION_CACHE_PATH", cast=str, default="")
+# directory master time matrices are stored in, share it between workers
+MATRIX_STORE_PATH = config("MATRIX_STORE_PATH", cast=str, default="matrices")
+# bytes a gzip compressed request body may decompress to before it is rejected
+GZIP_MAX_SIZE = config("GZIP_MAX_SIZE", cast=int, default=512 * 2**20)
+# encode time matrix and schedule responses directly with orjson (the fast-json extra, json if not installed) without re-validating them
+FAST_JSON = config("FAST_JSON", cast=bool, default=False)
@@ -0,0 +1,133 @@
+import bisect
+import threading
+from typing import Dict, List, Tuple
+
+
+# upper bounds (seconds) of latency histogram buckets
+LATENCY_BUCKETS = [
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+]
+# upper bounds of instance size (number of locations) label values
+SIZE_BUCKETS = [10, 25, 50, 100, 250, 500, 1000]
+
+
+def size_bucket(n_locations: int) -> str:
+    """Label of the instance size bucket n_locations falls in e.g. 26-50"""
+    i = bisect.bisect_left(SIZE_BUCKETS, n_locations)
+    if i == len(SIZE_BUCKETS):
+        return f"{SIZE_BUCKETS[-1] + 1}+"
+    low = SIZE_BUCKETS[i - 1] + 1 if i else 0
+    return f"{low}-{SIZE_BUCKETS[i]}"
+
+
+class Counter:
+    """Monotonic count for each combination of label values"""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...]) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(str(labels[label]) for label in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            return [
+                (self.name, dict(zip(self.labels, key)), value)
+                for key, value in sorted(self._values.items())
+            ]
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observations for each combination of label values"""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Tuple[str, ...],
+        buckets: List[float] = LATENCY_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = sorted(buckets)
+        self._lock = threading.Lock()
+        # per label values: count in each bucket (last is +Inf), sum
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[label]) for label in self.labels)
+        with self._lock:
+            counts, total = self._values.setdefault(
+                key, ([0] * (len(self.buckets) + 1), [0.0])
+            )
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            total[0] += value
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        samples = []
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                labels = dict(zip(self.labels, key))
+                cumulative = 0
+                for bound, count in zip(self.buckets + ["+Inf"], counts):
+                    cumulative += count
+                    bucket_labels = {**labels, "le": str(bound)}
+                    samples.append((f"{self.name}_bucket", bucket_labels, cumulative))
+                samples.append((f"{self.name}_sum", labels, total[0]))
+                samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+
+PHASE_SECONDS = Histogram(
+    "schedule_phase_seconds",
+    "Seconds spent in each phase of creating a schedule",
+    labels=("phase", "size"),
+)
+SOLVE_OUTCOMES = Counter(
+    "schedule_solve_outcomes_total",
+    "Solves by outcome (found, not_found, timeout, error)",
+    labels=("outcome", "size"),
+)
+METRICS = [PHASE_SECONDS, SOLVE_OUTCOMES]
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for name, labels, value in metric.samples():
+            label_str = ",".join(
+                f'{label}="{_escape(value)}"' for label, value in labels.items()
+            )
+            lines.append(f"{name}{{{label_str}}} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
@@ -0,0 +1,21 @@
+from typing import List, Optional, Tuple
+
+from src.models.base import BaseModel
+from src.models.job import JobStatus
+from src.models.schedule import Schedule
+from src.models.schedule_request import ScheduleRequest
+
+
+class BatchInstance(ScheduleRequest):
+    # caller's id of the instance, results are tagged with it
+    id: str
+
+
+class BatchResult(BaseModel):
+    id: str
+    # completed or failed
+    status: JobStatus
+    result: Optional[List[Schedule]] = None
+    # delivery pairs left unserved, only given when solved with drop_penalties
+    dropped_pairs: Optional[List[Tuple[int, int]]] = None
+    error: Optional[str] = None
@@ -0,0 +1,8 @@
+from typing import List, Tuple
+
+from src.models.base import BaseModel
+
+
+class Calibration(BaseModel):
+    coordinates: List[Tuple[float, float]]
+    matrix: List[List[int]]
@@ -0,0 +1,8 @@
+from typing import List
+
+from src.models.base import BaseModel
+
+
+class CapacityDimension(BaseModel):
+    delivery_weights: List[int]
+    vehicle_capacities: List[int]
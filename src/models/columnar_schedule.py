@@ -0,0 +1,30 @@
+from datetime import datetime
+from enum import Enum
+from typing import List, Optional, Tuple
+
+from src.models.base import BaseModel
+
+
+class ScheduleFormat(str, Enum):
+    # a Schedule per driver with a Route per leg
+    legs = "legs"
+    # parallel arrays per driver, see ColumnarSchedules
+    columnar = "columnar"
+
+
+class DriverColumns(BaseModel):
+    driver: int
+    # location indicies visited, starting and ending at the driver's location
+    nodes: List[int]
+    # seconds of each leg between consecutive nodes, one fewer than nodes
+    durations: List[int]
+    # seconds after reference_time the driver arrives at each node
+    arrival_offsets: List[int]
+
+
+class ColumnarSchedules(BaseModel):
+    # time every driver starts from
+    reference_time: datetime
+    drivers: List[DriverColumns]
+    # delivery pairs left unserved, only given when solved with drop_penalties
+    dropped_pairs: Optional[List[Tuple[int, int]]] = None
@@ -0,0 +1,22 @@
+from enum import Enum
+from typing import List, Optional, Tuple
+
+from src.models.base import BaseModel
+from src.models.schedule import Schedule
+
+
+class JobStatus(str, Enum):
+    pending = "pending"
+    running = "running"
+    completed = "completed"
+    failed = "failed"
+    cancelled = "cancelled"
+
+
+class Job(BaseModel):
+    id: str
+    status: JobStatus
+    result: Optional[List[Schedule]] = None
+    # delivery pairs left unserved, only given when solved with drop_penalties
+    dropped_pairs: Optional[List[Tuple[int, int]]] = None
+    error: Optional[str] = None
@@ -0,0 +1,7 @@
+from src.models.base import BaseModel
+
+
+class MatrixInfo(BaseModel):
+    id: str
+    # number of locations, the matrix is this many rows and columns
+    locations: int
@@ -0,0 +1,10 @@
+from typing import List, Tuple
+
+from src.models.base import BaseModel
+from src.models.schedule import Schedule
+
+
+class PartialSchedules(BaseModel):
+    schedules: List[Schedule]
+    # (pickup index, delivery index) of delivery pairs left unserved
+    dropped_pairs: List[Tuple[int, int]]
@@ -0,0 +1,9 @@
+from enum import Enum
+
+
+class PrecedencePolicy(str, Enum):
+    # see PRECEDENCE_POLICIES
+    direct = "direct"
+    lifo = "lifo"
+    fifo = "fifo"
+    free = "free"
@@ -17,24 +17,28 @@ class Schedule(BaseModel):
         route: List[int],
         time: List[int],
         locations: Optional[List[str]] = None,
+        reference_time: Optional[datetime] = None,
     ) -> "Schedule":
-        driver = Driver(id=driver_id)
+        """Schedule of a driver from their solved route and cumulative times
+
+        Arrival times are offset from reference_time (now if not given) by the time since the driver started,
+        time already worked before the request is not counted
+        """
+        if reference_time is None:
+            reference_time = datetime.now()
+        start = reference_time - timedelta(seconds=time[0])
+        # one location per stop shared by the legs either side of it
+        stops = [
+            Location(name=locations[node] if locations else str(node)) for node in route
+        ]
         driver_route = [
             Route(
                 id=i,
-                start=Location(
-                    name=locations[route[i]] if locations else str(route[i])
-                ),  # pass name if given
-                end=Location(
-                    name=locations[route[i + 1]] if locations else str(route[i + 1])
-                ),
+                start=stops[i],
+                end=stops[i + 1],
                 duration=time[i + 1] - time[i],
-                arrival_time=(
-                    datetime.now()
-                    + timedelta(seconds=time[i + 1])
-                    - timedelta(seconds=time[0])  # remove starting load from time calc
-                ).time(),
+                arrival_time=(start + timedelta(seconds=time[i + 1])).time(),
             )
             for i in range(len(route) - 1)
         ]
-        return Schedule(driver=driver, route=driver_route)
+        return Schedule(driver=Driver(id=driver_id), route=driver_route)
@@ -0,0 +1,38 @@
+from typing import Dict, List, Optional, Tuple
+from pydantic import PositiveFloat, PositiveInt
+
+from src.models.base import BaseModel
+from src.models.capacity import CapacityDimension
+from src.models.precedence import PrecedencePolicy
+from src.models.schedule import Schedule
+from src.models.search import Metaheuristic, SearchPreset
+
+
+class ScheduleRequest(BaseModel):
+    driver_indicies: List[int]
+    delivery_pairs: List[Tuple[int, int]]
+    time_matrix: Optional[List[List[int]]] = None
+    time_matrix_base64: Optional[str] = None
+    time_matrix_triangle: Optional[List[int]] = None
+    matrix_id: Optional[str] = None
+    location_ids: Optional[List[str]] = None
+    delivery_weights: Optional[List[int]] = None
+    vehicle_capacities: Optional[List[int]] = None
+    site_eta: Optional[List[int]] = None
+    time_worked: Optional[List[int]] = None
+    max_time: int = 28800
+    location_names: Optional[List[str]] = None
+    capacity_dimensions: Optional[Dict[str, CapacityDimension]] = None
+    drop_penalties: Optional[List[int]] = None
+    previous_schedule: Optional[List[Schedule]] = None
+    preset: SearchPreset = SearchPreset.balanced
+    time_limit: Optional[PositiveFloat] = None
+    solution_limit: Optional[PositiveInt] = None
+    metaheuristic: Optional[Metaheuristic] = None
+    lns_time_limit: Optional[PositiveFloat] = None
+    improvement_window: Optional[PositiveFloat] = None
+    nearest_neighbors: Optional[PositiveInt] = None
+    precedence: Optional[PrecedencePolicy] = None
+    decompose: bool = False
+    clusters: Optional[PositiveInt] = None
+    boundary_repair: bool = True
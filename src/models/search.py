@@ -0,0 +1,17 @@
+from enum import Enum
+
+
+class SearchPreset(str, Enum):
+    # see SEARCH_PRESETS
+    fast = "fast"
+    balanced = "balanced"
+    quality = "quality"
+
+
+class Metaheuristic(str, Enum):
+    automatic = "automatic"
+    greedy_descent = "greedy_descent"
+    guided_local_search = "guided_local_search"
+    simulated_annealing = "simulated_annealing"
+    tabu_search = "tabu_search"
+    generic_tabu_search = "generic_tabu_search"
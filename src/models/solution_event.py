@@ -0,0 +1,11 @@
+from typing import List, Optional, Tuple
+
+from src.models.base import BaseModel
+from src.models.schedule import Schedule
+
+
+class SolutionEvent(BaseModel):
+    objective: int
+    schedules: List[Schedule]
+    # delivery pairs left unserved, only given when solved with drop_penalties
+    dropped_pairs: Optional[List[Tuple[int, int]]] = None
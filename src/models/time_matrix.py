@@ -1,9 +1,19 @@
-from typing import List
+from enum import Enum
+from typing import List, Optional
 
 from src.models.base import BaseModel
 
 
+class MatrixProvider(str, Enum):
+    # Google Distance Matrix API
+    google = "google"
+    # offline estimate from coordinates
+    estimate = "estimate"
+
+
 class TimeMatrix(BaseModel):
     locations: List[str]
     driver_indicies: List[int]
-    matrix: List[List[int]]
+    matrix: Optional[List[List[int]]] = None
+    # upper triangle of a symmetric matrix in row-major order, given instead of matrix
+    triangle: Optional[List[int]] = None
@@ -0,0 +1,101 @@
+import asyncio
+from collections import deque
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional, Tuple
+
+from src.models.batch import BatchInstance, BatchResult
+from src.models.job import JobStatus
+from src.tasks.jobs import submit_request
+from src.tasks.matrix_store import MatrixStore
+from src.tasks.pool import SolverPool, SolverPoolFull, unpack_routes
+from src.tasks.schedule import build_schedules, dropped_pairs
+
+# longest seconds waited before retrying a full solver pool
+RETRY_INTERVAL = 1.0
+
+
+class _Solving(NamedTuple):
+    instance_id: str
+    location_names: Optional[List[str]]
+    # pairs the solve may leave unserved, None unless solved with drop_penalties
+    droppable: Optional[List[Tuple[int, int]]]
+
+
+async def solve_batch(
+    solver_pool: SolverPool,
+    instances: List[BatchInstance],
+    concurrency: int,
+    matrix_store: Optional[MatrixStore] = None,
+) -> AsyncIterator[BatchResult]:
+    """Solve independent instances in the solver pool, yielding the result of each as soon as it finishes
+
+    At most concurrency instances are queued at once so a batch never fills the pool on its own,
+    when other requests have filled it submission waits for capacity rather than failing.
+    Instances that fail are yielded as failed results instead of stopping the batch.
+
+    Args:
+        solver_pool (SolverPool): pool instances are solved in, shared with other requests
+        instances (List[BatchInstance]): instances to solve
+        concurrency (int): instances solving or queued at once
+        matrix_store (Optional[MatrixStore]): store instances giving a matrix_id take their time matrix from
+
+    Returns:
+        AsyncIterator[BatchResult]: result of each instance in the order they finish
+    """
+    waiting = deque(instances)
+    solving: Dict[asyncio.Future, _Solving] = {}
+    try:
+        while waiting or solving:
+            while waiting and len(solving) < max(concurrency, 1):
+                instance = waiting[0]
+                try:
+                    future, location_names = submit_request(
+                        solver_pool, instance, matrix_store=matrix_store
+                    )
+                except SolverPoolFull as e:
+                    if solving:
+                        # capacity frees up once one of ours finishes
+                        break
+                    await asyncio.sleep(min(e.retry_after, RETRY_INTERVAL))
+                    continue
+                except Exception as e:
+                    waiting.popleft()
+                    yield _failed(instance.id, e)
+                    continue
+                waiting.popleft()
+                solving[asyncio.wrap_future(future)] = _Solving(
+                    instance.id,
+                    location_names,
+                    None
+                    if instance.drop_penalties is None
+                    else instance.delivery_pairs,
+                )
+
+            if not solving:
+                continue
+            done, _ = await asyncio.wait(solving, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                yield _result(future, solving.pop(future))
+    finally:
+        # caller stopped reading e.g. the client disconnected, solves not started are dropped
+        for future in solving:
+            future.cancel()
+
+
+def _result(future: asyncio.Future, solving: _Solving) -> BatchResult:
+    try:
+        packed = future.result()
+        schedules = build_schedules(*unpack_routes(packed), solving.location_names)
+    except Exception as e:
+        return _failed(solving.instance_id, e)
+    return BatchResult(
+        id=solving.instance_id,
+        status=JobStatus.completed,
+        result=schedules,
+        dropped_pairs=None
+        if solving.droppable is None
+        else dropped_pairs(packed.nodes, solving.droppable),
+    )
+
+
+def _failed(instance_id: str, error: Exception) -> BatchResult:
+    return BatchResult(id=instance_id, status=JobStatus.failed, error=str(error))
@@ -0,0 +1,191 @@
+import hashlib
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+
+class IdempotencyKeyReused(Exception):
+    pass
+
+
+def solution_key(inputs: Dict[str, Any], **options: Any) -> str:
+    """Canonical hash of packed solver inputs (see pack_inputs) and any options changing the solution
+
+    Arrays are hashed by dtype, shape and raw bytes so equal inputs hash the same however they were sent
+    """
+    digest = hashlib.sha256()
+
+    def update(value: Any) -> None:
+        if isinstance(value, np.ndarray):
+            digest.update(f"{value.dtype.str}{value.shape}".encode())
+            digest.update(np.ascontiguousarray(value).tobytes())
+        elif isinstance(value, dict):
+            digest.update(b"{")
+            for name in sorted(value):
+                digest.update(f"{name}:".encode())
+                update(value[name])
+            digest.update(b"}")
+        elif isinstance(value, (list, tuple)):
+            digest.update(b"(")
+            for item in value:
+                update(item)
+            digest.update(b")")
+        else:
+            digest.update(f"{value!r};".encode())
+
+    update(inputs)
+    update(options)
+    return digest.hexdigest()
+
+
+class SolutionCache:
+    """Solver results by solution key, evicted when least recently used or older than the ttl
+
+    Identical requests arriving while the first is still solving share its solve, results can also be
+    persisted in sqlite so they survive restarts and are shared between workers on the same disk.
+    """
+
+    def __init__(
+        self, max_entries: int, ttl: float, path: Optional[str] = None
+    ) -> None:
+        """
+        Args:
+            max_entries (int): results kept in memory
+            ttl (float): seconds a result (or idempotency key) is valid for
+            path (Optional[str]): sqlite database file results and idempotency keys are also stored in, memory only if not given
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._in_flight: Dict[str, Future] = {}
+        self._idempotency: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS solutions (key TEXT PRIMARY KEY, created REAL, value BLOB)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS idempotency (idempotency_key TEXT PRIMARY KEY, created REAL, key TEXT)"
+            )
+            self._db.commit()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Cached result, None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.time() - self.ttl:
+                self._entries.move_to_end(key)
+                return entry[1]
+            self._entries.pop(key, None)
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT created, value FROM solutions WHERE key = ? AND created > ?",
+                    (key, time.time() - self.ttl),
+                ).fetchone()
+                if row:
+                    value = pickle.loads(row[1])
+                    self._store(key, row[0], value)
+                    return value
+        return None
+
+    def set(self, key: str, value: Any) -> None:
+        created = time.time()
+        with self._lock:
+            self._store(key, created, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO solutions VALUES (?, ?, ?)",
+                    (key, created, pickle.dumps(value)),
+                )
+                self._db.execute(
+                    "DELETE FROM solutions WHERE created <= ?", (created - self.ttl,)
+                )
+                self._db.commit()
+
+    def get_or_submit(
+        self, key: str, submit: Callable[[], Future]
+    ) -> Tuple[Future, bool]:
+        """Future of the cached result, of an identical solve in flight, or of a new solve started with submit
+
+        Returns:
+            Tuple[Future, bool]: future of the result and whether it was answered from the cache
+        """
+        value = self.get(key)
+        if value is not None:
+            future = Future()
+            future.set_result(value)
+            return future, True
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                return future, False
+            future = submit()
+            self._in_flight[key] = future
+
+        def on_done(future: Future) -> None:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            # failures are not cached so they can be retried
+            if not future.cancelled() and future.exception() is None:
+                self.set(key, future.result())
+
+        future.add_done_callback(on_done)
+        return future, False
+
+    def claim(self, idempotency_key: str, key: str) -> None:
+        """Bind an idempotency key to a solution key, raises IdempotencyKeyReused if already bound to another
+
+        With a database keys are bound there too, so retries reaching another worker or arriving after a restart are checked
+        """
+        now = time.time()
+        with self._lock:
+            claimed = self._idempotency.get(idempotency_key)
+            if claimed and claimed[0] > now - self.ttl and claimed[1] != key:
+                raise _reused(idempotency_key)
+            if self._db is not None:
+                self._db.execute(
+                    "DELETE FROM idempotency WHERE created <= ?", (now - self.ttl,)
+                )
+                # bound atomically, whichever worker inserts first owns the key
+                self._db.execute(
+                    "INSERT OR IGNORE INTO idempotency VALUES (?, ?, ?)",
+                    (idempotency_key, now, key),
+                )
+                (bound,) = self._db.execute(
+                    "SELECT key FROM idempotency WHERE idempotency_key = ?",
+                    (idempotency_key,),
+                ).fetchone()
+                if bound != key:
+                    self._db.commit()
+                    raise _reused(idempotency_key)
+                self._db.execute(
+                    "UPDATE idempotency SET created = ? WHERE idempotency_key = ?",
+                    (now, idempotency_key),
+                )
+                self._db.commit()
+            self._idempotency[idempotency_key] = (now, key)
+            self._idempotency.move_to_end(idempotency_key)
+            while len(self._idempotency) > self.max_entries:
+                self._idempotency.popitem(last=False)
+
+    def _store(self, key: str, created: float, value: Any) -> None:
+        self._entries[key] = (created, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+def _reused(idempotency_key: str) -> IdempotencyKeyReused:
+    return IdempotencyKeyReused(
+        f"Idempotency-Key {idempotency_key} was already used with a different request"
+    )
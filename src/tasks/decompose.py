@@ -0,0 +1,400 @@
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from ortools.constraint_solver import pywrapcp
+
+from src.tasks.matrix_codec import is_triangle, unpack_triangle
+from src.tasks.pool import PackedRoutes, SolverPool, SolverPoolFull, unpack_routes
+from src.tasks.routing import SEARCH_PARAMS, SPAN_COST_COEFFICIENT
+
+# locations per cluster when the number of clusters is not given
+CLUSTER_SIZE = 150
+# k-medoids refinement rounds
+MEDOID_ITERATIONS = 10
+# share of the search time limit given to boundary repair
+REPAIR_TIME_RATIO = 0.25
+
+
+class Cluster(NamedTuple):
+    # medoid location of the cluster
+    medoid: int
+    # locations solved together
+    nodes: np.ndarray
+    # indicies of the drivers serving the cluster
+    vehicles: np.ndarray
+
+
+def partition(
+    time_matrix: np.ndarray,
+    driver_indicies: np.ndarray,
+    delivery_pairs: np.ndarray,
+    n_clusters: int,
+) -> List[Cluster]:
+    """Split locations and drivers into regions by k-medoids on travel times, pickup/delivery pairs stay together
+
+    Drivers are shared between clusters in proportion to their number of pairs, each cluster getting at least one.
+
+    Args:
+        time_matrix (np.ndarray): travel times between locations
+        driver_indicies (np.ndarray): location of each driver
+        delivery_pairs (np.ndarray): (pickup index, delivery index) for each delivery
+        n_clusters (int): number of regions, reduced to the number of drivers or pairs if fewer
+
+    Returns:
+        List[Cluster]: non empty regions
+    """
+    n_locations = len(time_matrix)
+    distance = (time_matrix + time_matrix.T) / 2
+
+    # locations in no pair are clustered on their own
+    depots = np.zeros(n_locations, dtype=bool)
+    depots[driver_indicies] = True
+    paired = np.zeros(n_locations, dtype=bool)
+    paired[delivery_pairs.ravel()] = True
+    singles = np.flatnonzero(~paired & ~depots)
+    units = np.concatenate([delivery_pairs, np.stack([singles, singles], axis=1)])
+    if not len(units):
+        raise Exception("Nothing to visit")
+    n_clusters = max(1, min(n_clusters, len(driver_indicies), len(units)))
+
+    # mean travel time from the locations of each unit to every location
+    unit_cost = (distance[units[:, 0]] + distance[units[:, 1]]) / 2
+
+    # spread initial medoids apart, starting furthest from the first driver
+    candidates = np.unique(units)
+    medoids = [candidates[np.argmax(distance[driver_indicies[0], candidates])]]
+    while len(medoids) < n_clusters:
+        nearest = distance[np.ix_(candidates, medoids)].min(axis=1)
+        medoids.append(candidates[np.argmax(nearest)])
+    medoids = np.array(medoids)
+
+    for _ in range(MEDOID_ITERATIONS):
+        assignment = np.argmin(unit_cost[:, medoids], axis=1)
+        updated = medoids.copy()
+        for c in range(n_clusters):
+            members = np.flatnonzero(assignment == c)
+            if len(members):
+                nodes = np.unique(units[members])
+                updated[c] = nodes[np.argmin(unit_cost[np.ix_(members, nodes)].sum(0))]
+        if np.array_equal(updated, medoids):
+            break
+        medoids = updated
+    assignment = np.argmin(unit_cost[:, medoids], axis=1)
+
+    # drivers in proportion to pairs by largest remainder, at least one each
+    counts = np.bincount(assignment, minlength=n_clusters)
+    share = 1 + counts / counts.sum() * (len(driver_indicies) - n_clusters)
+    quota = np.floor(share).astype(int)
+    remainder = len(driver_indicies) - quota.sum()
+    quota[np.argsort(quota - share)[:remainder]] += 1
+
+    # closest driver and cluster with quota left until every driver is placed
+    vehicle_cost = distance[np.ix_(driver_indicies, medoids)].astype(float)
+    vehicles = [[] for _ in range(n_clusters)]
+    for _ in range(len(driver_indicies)):
+        vehicle, c = np.unravel_index(np.argmin(vehicle_cost), vehicle_cost.shape)
+        vehicles[c].append(vehicle)
+        vehicle_cost[vehicle] = np.inf
+        quota[c] -= 1
+        if quota[c] == 0:
+            vehicle_cost[:, c] = np.inf
+
+    clusters = []
+    for c in range(n_clusters):
+        cluster_vehicles = np.array(sorted(vehicles[c]), dtype=np.int64)
+        visits = np.unique(units[assignment == c])
+        depot_nodes = np.unique(driver_indicies[cluster_vehicles])
+        clusters.append(
+            Cluster(
+                medoid=int(medoids[c]),
+                nodes=np.concatenate([depot_nodes, np.setdiff1d(visits, depot_nodes)]),
+                vehicles=cluster_vehicles,
+            )
+        )
+    return clusters
+
+
+def cluster_inputs(
+    inputs: Dict[str, Any],
+    cluster: Cluster,
+    routes: Optional[List[List[int]]] = None,
+) -> Dict[str, Any]:
+    """Packed inputs (see pack_inputs) of the subproblem of a cluster, indexed by position in cluster.nodes
+
+    Args:
+        inputs (Dict[str, Any]): packed inputs of the whole problem
+        cluster (Cluster): region to solve
+        routes (Optional[List[List[int]]]): routes of every driver to start from, overrides the initial routes of the inputs
+    """
+    nodes, vehicles = cluster.nodes, cluster.vehicles
+    local = np.full(len(inputs["time_matrix"]), -1, dtype=np.int64)
+    local[nodes] = np.arange(len(nodes))
+
+    pairs = inputs["delivery_pairs"]
+    kept = np.flatnonzero(np.all(local[pairs] >= 0, axis=1))
+
+    def select(values: Optional[np.ndarray], index: np.ndarray) -> Optional[np.ndarray]:
+        return None if values is None else values[index]
+
+    if routes is None and inputs["initial_routes"] is not None:
+        flat, offsets = inputs["initial_routes"]
+        routes = [route.tolist() for route in np.split(flat, offsets[:-1])]
+    initial_routes = None
+    if routes is not None:
+        # other clusters locations are left out of the routes
+        cluster_routes = [
+            [int(local[node]) for node in routes[v] if local[node] >= 0]
+            for v in vehicles
+            if v < len(routes)
+        ]
+        initial_routes = (
+            np.asarray(sum(cluster_routes, []), dtype=np.int64),
+            np.cumsum([len(route) for route in cluster_routes], dtype=np.int64),
+        )
+
+    return dict(
+        time_matrix=np.ascontiguousarray(inputs["time_matrix"][np.ix_(nodes, nodes)]),
+        driver_indicies=local[inputs["driver_indicies"][vehicles]],
+        delivery_pairs=local[pairs[kept]].reshape(-1, 2),
+        delivery_weights=select(inputs["delivery_weights"], kept),
+        vehicle_capacities=select(inputs["vehicle_capacities"], vehicles),
+        site_eta=select(inputs["site_eta"], nodes),
+        time_worked=select(inputs["time_worked"], vehicles),
+        max_time=inputs["max_time"],
+        capacity_dimensions={
+            name: (select(weights, kept), select(capacities, vehicles))
+            for name, (weights, capacities) in inputs["capacity_dimensions"].items()
+        },
+        initial_routes=initial_routes,
+        drop_penalties=select(inputs["drop_penalties"], kept),
+    )
+
+
+def stitch(
+    inputs: Dict[str, Any], clusters: List[Cluster], results: List[PackedRoutes]
+) -> PackedRoutes:
+    """Routes of every driver from the solutions of each cluster, mapped back to the whole problems locations
+
+    The objective is that of the whole problem, see solution_cost
+    """
+    n_vehicles = len(inputs["driver_indicies"])
+    routes: List[List[int]] = [[] for _ in range(n_vehicles)]
+    times: List[List[int]] = [[] for _ in range(n_vehicles)]
+    for cluster, result in zip(clusters, results):
+        cluster_routes, cluster_times = unpack_routes(result)
+        for vehicle, route, route_times in zip(
+            cluster.vehicles, cluster_routes, cluster_times
+        ):
+            routes[vehicle] = cluster.nodes[route].tolist()
+            times[vehicle] = route_times
+    nodes = np.concatenate(routes).astype(np.int32)
+    times = np.concatenate(times).astype(np.int64)
+    offsets = np.cumsum([len(route) for route in routes])
+    return PackedRoutes(
+        nodes=nodes,
+        times=times,
+        offsets=offsets,
+        objective=solution_cost(inputs, nodes, times, offsets),
+    )
+
+
+def solution_cost(
+    inputs: Dict[str, Any], nodes: np.ndarray, times: np.ndarray, offsets: np.ndarray
+) -> int:
+    """Objective of a solution to the whole problem as the Router computes it
+
+    Each cluster objective carries a span cost of its own, so summing them does not give the
+    objective of the stitched routes nor compare with the objective of a merged pair of clusters
+
+    Args:
+        inputs (Dict[str, Any]): see pack_inputs
+        nodes (np.ndarray): visited locations of all drivers concatenated, see Router.extract_routes
+        times (np.ndarray): cumulative time at each visited location
+        offsets (np.ndarray): end offset of each driver in nodes and times
+
+    Returns:
+        int: travel time of every route, the span cost from the earliest start to the latest end and the penalty of each dropped pair
+    """
+    starts = np.concatenate([[0], offsets[:-1]]).astype(np.int64)
+    start_times, end_times = times[starts], times[offsets - 1]
+    # no slack so the time gained along a route is the travel time of its arcs
+    cost = int((end_times - start_times).sum())
+    cost += SPAN_COST_COEFFICIENT * int(end_times.max() - start_times.min())
+    if inputs["drop_penalties"] is not None:
+        dropped = ~np.isin(inputs["delivery_pairs"][:, 0], nodes)
+        cost += int(inputs["drop_penalties"][dropped].sum())
+    return cost
+
+
+def apply_repairs(
+    inputs: Dict[str, Any],
+    clusters: List[Cluster],
+    results: List[PackedRoutes],
+    pairs: List[Tuple[int, int]],
+    merged: List[Cluster],
+    repairs: List[Optional[PackedRoutes]],
+) -> PackedRoutes:
+    """Stitched routes keeping each repair that lowers the objective of the whole problem
+
+    Args:
+        inputs (Dict[str, Any]): see pack_inputs
+        clusters (List[Cluster]): clusters solved on their own
+        results (List[PackedRoutes]): solution of each cluster
+        pairs (List[Tuple[int, int]]): indicies of the clusters merged for each repair, see neighbouring_pairs
+        merged (List[Cluster]): cluster of each pair
+        repairs (List[Optional[PackedRoutes]]): solution of each merged cluster, None if it was not solved
+
+    Returns:
+        PackedRoutes: routes of the whole problem
+    """
+    kept = dict(enumerate(zip(clusters, results)))
+    best = stitch(inputs, clusters, results)
+    for (a, b), cluster, repaired in zip(pairs, merged, repairs):
+        if repaired is None:
+            continue
+        candidate = {i: kept[i] for i in kept if i not in (a, b)}
+        candidate[a] = (cluster, repaired)
+        stitched = stitch(
+            inputs,
+            [c for c, _ in candidate.values()],
+            [r for _, r in candidate.values()],
+        )
+        if stitched.objective < best.objective:
+            kept, best = candidate, stitched
+    return best
+
+
+def neighbouring_pairs(
+    time_matrix: np.ndarray, clusters: List[Cluster]
+) -> List[Tuple[int, int]]:
+    """Disjoint pairs of clusters with the closest medoids"""
+    medoids = [cluster.medoid for cluster in clusters]
+    distance = time_matrix[np.ix_(medoids, medoids)].astype(float)
+    distance = distance + distance.T
+    np.fill_diagonal(distance, np.inf)
+    pairs = []
+    for _ in range(len(clusters) // 2):
+        a, b = np.unravel_index(np.argmin(distance), distance.shape)
+        pairs.append((int(a), int(b)))
+        distance[[a, b], :] = np.inf
+        distance[:, [a, b]] = np.inf
+    return pairs
+
+
+def solve_decomposed(
+    solver_pool: SolverPool,
+    inputs: Dict[str, Any],
+    n_clusters: Optional[int] = None,
+    params: pywrapcp.DefaultRoutingSearchParameters = SEARCH_PARAMS,
+    boundary_repair: bool = True,
+    router_options: Optional[Dict[str, Any]] = None,
+) -> Future:
+    """Solve each region of the problem in its own solver process and stitch the routes together
+
+    With boundary_repair, neighbouring clusters are then merged in pairs and re-solved starting from
+    their stitched routes so pairs near a boundary can move to the other clusters drivers. Repairs
+    only replace routes they improve and are skipped if the pool has no capacity for them.
+
+    Args:
+        solver_pool (SolverPool): pool subproblems are queued in, raises SolverPoolFull if it cannot take every cluster
+        inputs (Dict[str, Any]): see pack_inputs
+        n_clusters (Optional[int]): number of regions, one per CLUSTER_SIZE locations if not given
+        params (pywrapcp.DefaultRoutingSearchParameters): search parameters of each subproblem
+        boundary_repair (bool): re-solve neighbouring clusters together after stitching
+        router_options (Optional[Dict[str, Any]]): see solve_packed
+
+    Returns:
+        Future: resolves to the PackedRoutes of the whole problem
+    """
+    if is_triangle(inputs["time_matrix"]):
+        # clusters slice the square matrix
+        inputs = dict(inputs, time_matrix=unpack_triangle(inputs["time_matrix"]))
+    time_matrix = inputs["time_matrix"]
+    if n_clusters is None:
+        n_clusters = -(-len(time_matrix) // CLUSTER_SIZE)
+    clusters = partition(
+        time_matrix, inputs["driver_indicies"], inputs["delivery_pairs"], n_clusters
+    )
+    futures = solver_pool.submit_each(
+        [cluster_inputs(inputs, cluster) for cluster in clusters],
+        params,
+        router_options=router_options,
+    )
+
+    result = Future()
+
+    def repair(stitched: PackedRoutes, results: List[PackedRoutes]) -> None:
+        pairs = neighbouring_pairs(time_matrix, clusters)
+        merged = [
+            Cluster(
+                medoid=clusters[a].medoid,
+                nodes=np.union1d(clusters[a].nodes, clusters[b].nodes),
+                vehicles=np.concatenate([clusters[a].vehicles, clusters[b].vehicles]),
+            )
+            for a, b in pairs
+        ]
+        routes, _ = unpack_routes(stitched)
+        repair_params = pywrapcp.DefaultRoutingSearchParameters()
+        repair_params.CopyFrom(params)
+        repair_params.time_limit.FromMilliseconds(
+            max(1, int(params.time_limit.ToMilliseconds() * REPAIR_TIME_RATIO))
+        )
+        try:
+            repair_futures = solver_pool.submit_each(
+                [cluster_inputs(inputs, cluster, routes) for cluster in merged],
+                repair_params,
+                router_options=router_options,
+            )
+        except SolverPoolFull:
+            result.set_result(stitched)
+            return
+
+        def finish() -> None:
+            repairs = [
+                None if future.exception() is not None else future.result()
+                for future in repair_futures
+            ]
+            result.set_result(
+                apply_repairs(inputs, clusters, results, pairs, merged, repairs)
+            )
+
+        _when_all(repair_futures, finish, result)
+
+    def on_clusters_done() -> None:
+        for future in futures:
+            if future.exception() is not None:
+                result.set_exception(future.exception())
+                return
+        results = [future.result() for future in futures]
+        stitched = stitch(inputs, clusters, results)
+        if boundary_repair and len(clusters) > 1:
+            repair(stitched, results)
+        else:
+            result.set_result(stitched)
+
+    _when_all(futures, on_clusters_done, result)
+    return result
+
+
+def _when_all(
+    futures: List[Future], callback: Callable[[], None], result: Future
+) -> None:
+    """Call callback once every future is done, failing result if the callback raises"""
+    lock = threading.Lock()
+    remaining = [len(futures)]
+
+    def on_done(_: Future) -> None:
+        with lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        try:
+            callback()
+        except Exception as e:
+            if not result.done():
+                result.set_exception(e)
+
+    for future in futures:
+        future.add_done_callback(on_done)
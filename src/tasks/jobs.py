@@ -0,0 +1,187 @@
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from src.models.job import Job, JobStatus
+from src.models.schedule_request import ScheduleRequest
+from src.tasks.decompose import solve_decomposed
+from src.tasks.matrix_codec import resolve_time_matrix
+from src.tasks.matrix_store import MatrixStore
+from src.tasks.pool import SolverPool, pack_inputs, unpack_routes
+from src.tasks.schedule import build_schedules, dropped_pairs, routes_from_schedules
+from src.tasks.search import search_params
+
+
+def submit_request(
+    solver_pool: SolverPool,
+    request: ScheduleRequest,
+    progress: Optional[queue.Queue] = None,
+    matrix_store: Optional[MatrixStore] = None,
+) -> Tuple[Future, Optional[List[str]]]:
+    """Queue a schedule request in the solver pool, raises SolverPoolFull if no capacity is left
+
+    Args:
+        solver_pool (SolverPool): pool the request is solved in
+        request (ScheduleRequest): inputs and search options
+        progress (Optional[queue.Queue]): receives improving solutions while solving, see SolverPool.submit. Cannot be combined with decompose
+        matrix_store (Optional[MatrixStore]): store requests giving a matrix_id take their time matrix from
+
+    Returns:
+        Tuple[Future, Optional[List[str]]]: resolves to the PackedRoutes of the solution, and the location names to build its schedules with
+    """
+    # only the schedule fields of subclasses such as BatchInstance
+    inputs = {name: getattr(request, name) for name in ScheduleRequest.__fields__}
+    matrix_id, location_ids = inputs.pop("matrix_id"), inputs.pop("location_ids")
+    if matrix_store is not None:
+        inputs["time_matrix"] = matrix_store.resolve(
+            inputs["time_matrix"],
+            inputs.pop("time_matrix_base64"),
+            matrix_id,
+            location_ids,
+            inputs.pop("time_matrix_triangle"),
+        )
+    elif matrix_id is not None:
+        raise Exception("No matrix store to take matrix_id from")
+    else:
+        inputs["time_matrix"] = resolve_time_matrix(
+            inputs["time_matrix"],
+            inputs.pop("time_matrix_base64"),
+            inputs.pop("time_matrix_triangle"),
+        )
+    metaheuristic = inputs.pop("metaheuristic")
+    params = search_params(
+        inputs.pop("preset").value,
+        time_limit=inputs.pop("time_limit"),
+        solution_limit=inputs.pop("solution_limit"),
+        metaheuristic=metaheuristic.value if metaheuristic else None,
+        lns_time_limit=inputs.pop("lns_time_limit"),
+    )
+    router_options = dict(
+        improvement_window=inputs.pop("improvement_window"),
+        nearest_neighbors=inputs.pop("nearest_neighbors"),
+    )
+    precedence = inputs.pop("precedence")
+    if precedence is not None:
+        router_options["precedence"] = precedence.value
+    decompose = inputs.pop("decompose")
+    clusters = inputs.pop("clusters")
+    boundary_repair = inputs.pop("boundary_repair")
+    # stops are named by their location id unless named otherwise
+    location_names = inputs.pop("location_names") or location_ids
+    previous_schedule = inputs.pop("previous_schedule")
+    if previous_schedule:
+        inputs["initial_routes"] = routes_from_schedules(
+            previous_schedule, location_names
+        )
+
+    if decompose:
+        if progress is not None:
+            raise Exception("decomposed solves cannot report improving solutions")
+        future = solve_decomposed(
+            solver_pool,
+            pack_inputs(**inputs),
+            clusters,
+            params,
+            boundary_repair=boundary_repair,
+            router_options=router_options,
+        )
+    else:
+        future = solver_pool.submit(
+            pack_inputs(**inputs),
+            params,
+            router_options=router_options,
+            progress=progress,
+        )
+    return future, location_names
+
+
+class JobQueue:
+    """Tracks schedule requests solved in the background by a solver pool, finished jobs are kept in memory until evicted"""
+
+    def __init__(
+        self,
+        solver_pool: SolverPool,
+        max_finished: int,
+        matrix_store: Optional[MatrixStore] = None,
+    ) -> None:
+        """
+        Args:
+            solver_pool (SolverPool): pool jobs are solved in, shares its capacity with other requests
+            max_finished (int): number of finished jobs kept for retrieval, oldest are evicted first
+            matrix_store (Optional[MatrixStore]): store jobs giving a matrix_id take their time matrix from
+        """
+        self.solver_pool = solver_pool
+        self.max_finished = max_finished
+        self.matrix_store = matrix_store
+        self._lock = threading.RLock()
+        self._jobs: Dict[str, Job] = {}
+        self._futures: Dict[str, Future] = {}
+        self._finished: "OrderedDict[str, None]" = OrderedDict()
+
+    def submit(self, request: ScheduleRequest) -> Job:
+        """Queue a schedule request, raises SolverPoolFull if no capacity is left"""
+        job = Job(id=uuid4().hex, status=JobStatus.pending)
+        with self._lock:
+            future, location_names = submit_request(
+                self.solver_pool, request, matrix_store=self.matrix_store
+            )
+            self._jobs[job.id] = job
+            self._futures[job.id] = future
+        # pairs the solve may leave unserved
+        droppable = None if request.drop_penalties is None else request.delivery_pairs
+        future.add_done_callback(
+            lambda f: self._on_done(job.id, f, location_names, droppable)
+        )
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Current state of the job, None if unknown or evicted"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            future = self._futures.get(job_id)
+            if job and future and job.status == JobStatus.pending and future.running():
+                job.status = JobStatus.running
+            return job
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a job, a job already solving is left to reach its time limit but its result is discarded"""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        with self._lock:
+            if job.status in [JobStatus.pending, JobStatus.running]:
+                job.status = JobStatus.cancelled
+                future = self._futures.get(job_id)
+                if future:
+                    future.cancel()
+        return job
+
+    def _on_done(
+        self,
+        job_id: str,
+        future: Future,
+        location_names: Optional[List[str]],
+        droppable: Optional[List[Tuple[int, int]]] = None,
+    ) -> None:
+        with self._lock:
+            self._futures.pop(job_id, None)
+            job = self._jobs[job_id]
+            if job.status != JobStatus.cancelled:
+                try:
+                    packed = future.result()
+                    job.result = build_schedules(*unpack_routes(packed), location_names)
+                    if droppable is not None:
+                        job.dropped_pairs = dropped_pairs(packed.nodes, droppable)
+                    job.status = JobStatus.completed
+                except Exception as e:
+                    job.error = str(e)
+                    job.status = JobStatus.failed
+
+            # evict oldest finished jobs
+            self._finished[job_id] = None
+            while len(self._finished) > self.max_finished:
+                evicted, _ = self._finished.popitem(last=False)
+                self._jobs.pop(evicted, None)
@@ -0,0 +1,145 @@
+import base64
+import io
+import math
+from typing import List, Optional, Union
+
+import numpy as np
+
+# magic string every .npy file starts with
+NPY_MAGIC = b"\x93NUMPY"
+# raw buffers start with the number of rows and columns as little-endian uint32
+RAW_HEADER = np.dtype([("rows", "<u4"), ("cols", "<u4")])
+
+
+def encode_matrix(matrix: Union[np.ndarray, List[List[int]]], npy: bool = False) -> str:
+    """Base64 of the matrix as a .npy file or a raw int32 buffer, the inverse of decode_matrix"""
+    matrix = np.asarray(matrix, dtype="<i4")
+    if npy:
+        buffer = io.BytesIO()
+        np.save(buffer, matrix)
+        data = buffer.getvalue()
+    else:
+        header = np.array([matrix.shape], dtype=RAW_HEADER).tobytes()
+        data = header + np.ascontiguousarray(matrix).tobytes()
+    return base64.b64encode(data).decode()
+
+
+def decode_matrix(data: str) -> np.ndarray:
+    """int32 matrix from base64 of a .npy file or a raw buffer, viewed in place rather than copied
+
+    Raw buffers are a RAW_HEADER (rows, cols) followed by the little-endian int32 elements in row-major order
+
+    Args:
+        data (str): base64 encoded matrix
+
+    Returns:
+        np.ndarray: read-only int32 matrix
+    """
+    buffer = base64.b64decode(data, validate=True)
+
+    if buffer.startswith(NPY_MAGIC):
+        stream = io.BytesIO(buffer)
+        version = np.lib.format.read_magic(stream)
+        read_header = (
+            np.lib.format.read_array_header_1_0
+            if version == (1, 0)
+            else np.lib.format.read_array_header_2_0
+        )
+        shape, fortran_order, dtype = read_header(stream)
+        if fortran_order:
+            raise Exception("Fortran ordered .npy matrices are not supported")
+        if dtype.kind not in "iu":
+            raise Exception(f"Matrix must hold integers, got {dtype}")
+        offset = stream.tell()
+    else:
+        if len(buffer) < RAW_HEADER.itemsize:
+            raise Exception("Matrix buffer is missing its shape header")
+        shape = tuple(np.frombuffer(buffer, dtype=RAW_HEADER, count=1)[0].tolist())
+        dtype = np.dtype("<i4")
+        offset = RAW_HEADER.itemsize
+
+    if len(shape) != 2 or shape[0] != shape[1]:
+        raise Exception(f"Matrix must be square, got shape {shape}")
+    if len(buffer) - offset != shape[0] * shape[1] * dtype.itemsize:
+        raise Exception(f"Matrix buffer does not match shape {shape}")
+
+    matrix = np.frombuffer(buffer, dtype=dtype, offset=offset).reshape(shape)
+    # only converts if sent as another integer type or byte order
+    return matrix.astype(np.int32, copy=False)
+
+
+def pack_triangle(matrix: Union[np.ndarray, List[List[int]]]) -> np.ndarray:
+    """Upper triangle of a symmetric matrix, diagonal included, as a flat int32 array in row-major order
+
+    Holds n * (n + 1) / 2 of the n * n elements, the inverse of unpack_triangle
+    """
+    matrix = np.asarray(matrix, dtype=np.int32)
+    return matrix[np.triu_indices(len(matrix))]
+
+
+def unpack_triangle(packed: Union[np.ndarray, List[int]]) -> np.ndarray:
+    """Square int32 matrix of a packed upper triangle, the lower triangle mirrors the upper"""
+    packed = np.asarray(packed, dtype=np.int32)
+    n = triangle_order(len(packed))
+    rows, cols = np.triu_indices(n)
+    matrix = np.empty((n, n), dtype=np.int32)
+    matrix[rows, cols] = packed
+    matrix[cols, rows] = packed
+    return matrix
+
+
+def triangle_order(size: int) -> int:
+    """Number of locations of a packed upper triangle of size elements"""
+    n = (math.isqrt(8 * size + 1) - 1) // 2
+    if n * (n + 1) // 2 != size:
+        raise Exception(f"{size} elements is not a packed upper triangle")
+    return n
+
+
+def triangle_index(n: int, i: int, j: int) -> int:
+    """Position of element i, j of an n location matrix in its packed upper triangle"""
+    if i > j:
+        i, j = j, i
+    # rows before i hold n, n - 1, ... elements
+    return i * n - i * (i - 1) // 2 + j - i
+
+
+def triangle_positions(n: int, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+    """triangle_index of many elements at once, rows and cols are broadcast together"""
+    low, high = np.minimum(rows, cols), np.maximum(rows, cols)
+    return low * n - low * (low - 1) // 2 + high - low
+
+
+def is_triangle(time_matrix: Union[np.ndarray, List[List[int]]]) -> bool:
+    """Whether a time matrix is a packed upper triangle rather than a square matrix"""
+    return isinstance(time_matrix, np.ndarray) and time_matrix.ndim == 1
+
+
+def matrix_order(time_matrix: Union[np.ndarray, List[List[int]]]) -> int:
+    """Number of locations of a square or packed time matrix"""
+    if is_triangle(time_matrix):
+        return triangle_order(len(time_matrix))
+    return len(time_matrix)
+
+
+def resolve_time_matrix(
+    time_matrix: Optional[List[List[int]]],
+    time_matrix_base64: Optional[str],
+    time_matrix_triangle: Optional[List[int]] = None,
+) -> Union[np.ndarray, List[List[int]]]:
+    """The time matrix from whichever of the fields was given, exactly one is required
+
+    A time_matrix_triangle is kept packed, see is_triangle
+    """
+    given = [time_matrix, time_matrix_base64, time_matrix_triangle]
+    if sum(value is not None for value in given) != 1:
+        raise Exception(
+            "Give exactly one of time_matrix, time_matrix_base64 or time_matrix_triangle"
+        )
+    if time_matrix_base64 is not None:
+        return decode_matrix(time_matrix_base64)
+    if time_matrix_triangle is not None:
+        packed = np.asarray(time_matrix_triangle, dtype=np.int32)
+        triangle_order(len(packed))
+        return packed
+    return time_matrix
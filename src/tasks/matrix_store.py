@@ -0,0 +1,220 @@
+import fcntl
+import json
+import os
+import re
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, NamedTuple, Optional, Union
+
+import numpy as np
+
+from src.tasks.matrix_codec import resolve_time_matrix
+
+# matrix ids are used as file names
+MATRIX_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+# times a matrix replaced while being opened is looked up again before giving up
+OPEN_ATTEMPTS = 5
+
+
+class MatrixVersionConflict(Exception):
+    pass
+
+
+class StoredMatrix(NamedTuple):
+    location_ids: List[str]
+    # position of each location id in the matrix
+    positions: Dict[str, int]
+    # read-only memory-mapped int32 matrix
+    matrix: np.ndarray
+    version: str
+
+
+class MatrixStore:
+    """Master time matrices kept on disk as int32 .npy files and memory-mapped when read
+
+    Every process mapping the same file shares the operating system's page cache, so gunicorn workers
+    hold one copy of each matrix between them. Each upload is written as a new version and the index
+    naming its location ids and file is replaced last, readers never see a half written matrix.
+    Uploads of the same id hold a file lock so concurrent writers never remove the version the index names.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Args:
+            path (str): directory matrices are stored in, created on first upload
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        # opened matrices by id, reopened when another process uploads a new version
+        self._opened: Dict[str, StoredMatrix] = {}
+
+    def put(
+        self,
+        matrix_id: str,
+        location_ids: List[str],
+        matrix: Union[np.ndarray, List[List[int]]],
+        version: Optional[str] = None,
+    ) -> StoredMatrix:
+        """Store a master matrix, replacing any matrix with the same id
+
+        Args:
+            matrix_id (str): letters, digits, _ or -
+            location_ids (List[str]): id of the location of each row and column of the matrix
+            matrix (Union[np.ndarray, List[List[int]]]): square time matrix
+            version (Optional[str]): only replace this version of the matrix, raising MatrixVersionConflict if another was uploaded since
+
+        Returns:
+            StoredMatrix: the stored matrix
+        """
+        _check_id(matrix_id)
+        matrix = np.asarray(matrix, dtype=np.int32)
+        if matrix.ndim != 2 or matrix.shape[0] != matrix.shape[1]:
+            raise Exception(f"Time matrix must be square, got shape {matrix.shape}")
+        if len(location_ids) != len(matrix):
+            raise Exception(
+                f"Got {len(location_ids)} location ids for {len(matrix)} locations"
+            )
+        if len(set(location_ids)) != len(location_ids):
+            raise Exception("Location ids must be unique")
+
+        os.makedirs(self.path, exist_ok=True)
+        with self._write_lock(matrix_id):
+            if version is not None:
+                current = self._read_index(matrix_id)
+                if current is None or current["version"] != version:
+                    raise MatrixVersionConflict(
+                        f"Matrix {matrix_id} was replaced since version {version} was read"
+                    )
+            version = uuid.uuid4().hex
+            np.save(self._matrix_file(matrix_id, version), matrix)
+            self._write_index(
+                matrix_id, dict(version=version, location_ids=location_ids)
+            )
+
+            # older versions still mapped by readers stay readable until unmapped
+            current = os.path.basename(self._matrix_file(matrix_id, version))
+            for name in os.listdir(self.path):
+                if name.startswith(f"{matrix_id}.") and name.endswith(".npy"):
+                    if name != current:
+                        os.remove(os.path.join(self.path, name))
+        return self.get(matrix_id)
+
+    def get(self, matrix_id: str) -> Optional[StoredMatrix]:
+        """The stored matrix, None if there is none with this id"""
+        _check_id(matrix_id)
+        for _ in range(OPEN_ATTEMPTS):
+            index = self._read_index(matrix_id)
+            if index is None:
+                return None
+            try:
+                return self._open(matrix_id, index)
+            except FileNotFoundError:
+                # replaced by a newer upload since the index was read
+                continue
+        raise Exception(
+            f"Matrix {matrix_id} version {index['version']} is missing, upload the matrix again"
+        )
+
+    def subset(self, matrix_id: str, location_ids: List[str]) -> np.ndarray:
+        """Time matrix between the given locations, in the given order, sliced from a stored matrix
+
+        Args:
+            matrix_id (str): id of the stored matrix
+            location_ids (List[str]): locations of the rows and columns of the returned matrix
+
+        Returns:
+            np.ndarray: int32 matrix, only the rows needed are read from disk
+        """
+        stored = self.get(matrix_id)
+        if stored is None:
+            raise Exception(f"Unknown matrix {matrix_id}")
+        missing = [id_ for id_ in location_ids if id_ not in stored.positions]
+        if missing:
+            raise Exception(f"Locations {missing} are not in matrix {matrix_id}")
+        rows = np.fromiter(
+            (stored.positions[id_] for id_ in location_ids),
+            dtype=np.int64,
+            count=len(location_ids),
+        )
+        return stored.matrix[np.ix_(rows, rows)]
+
+    def resolve(
+        self,
+        time_matrix: Optional[List[List[int]]],
+        time_matrix_base64: Optional[str],
+        matrix_id: Optional[str],
+        location_ids: Optional[List[str]],
+        time_matrix_triangle: Optional[List[int]] = None,
+    ) -> Union[np.ndarray, List[List[int]]]:
+        """The time matrix of a request from whichever of time_matrix, time_matrix_base64, time_matrix_triangle or matrix_id was given"""
+        if matrix_id is None:
+            if location_ids is not None:
+                raise Exception("location_ids are only used with matrix_id")
+            return resolve_time_matrix(
+                time_matrix, time_matrix_base64, time_matrix_triangle
+            )
+        if any(
+            value is not None
+            for value in (time_matrix, time_matrix_base64, time_matrix_triangle)
+        ):
+            raise Exception(
+                "Give exactly one of time_matrix, time_matrix_base64, time_matrix_triangle or matrix_id"
+            )
+        if location_ids is None:
+            raise Exception("location_ids are required with matrix_id")
+        return self.subset(matrix_id, location_ids)
+
+    def _open(self, matrix_id: str, index: dict) -> StoredMatrix:
+        with self._lock:
+            stored = self._opened.get(matrix_id)
+            if stored is None or stored.version != index["version"]:
+                location_ids = index["location_ids"]
+                stored = StoredMatrix(
+                    location_ids=location_ids,
+                    positions={id_: i for i, id_ in enumerate(location_ids)},
+                    matrix=np.load(
+                        self._matrix_file(matrix_id, index["version"]), mmap_mode="r"
+                    ),
+                    version=index["version"],
+                )
+                self._opened[matrix_id] = stored
+            return stored
+
+    @contextmanager
+    def _write_lock(self, matrix_id: str) -> Iterator[None]:
+        """Held by one upload of matrix_id at a time, across processes"""
+        with open(os.path.join(self.path, f"{matrix_id}.lock"), "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _index_file(self, matrix_id: str) -> str:
+        return os.path.join(self.path, f"{matrix_id}.json")
+
+    def _matrix_file(self, matrix_id: str, version: str) -> str:
+        return os.path.join(self.path, f"{matrix_id}.{version}.npy")
+
+    def _read_index(self, matrix_id: str) -> Optional[dict]:
+        try:
+            with open(self._index_file(matrix_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_index(self, matrix_id: str, index: dict) -> None:
+        # replaced in one step so readers see the old or new index, never part of one
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp, self._index_file(matrix_id))
+
+
+def _check_id(matrix_id: str) -> None:
+    if not MATRIX_ID.match(matrix_id):
+        raise Exception(
+            f"Invalid matrix id {matrix_id}, use up to 64 letters, digits, _ or -"
+        )
@@ -0,0 +1,318 @@
+import math
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing.managers import SyncManager
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+from ortools.constraint_solver import pywrapcp
+
+from src.core.metrics import PHASE_SECONDS, SOLVE_OUTCOMES, size_bucket
+from src.models.capacity import CapacityDimension
+from src.tasks.matrix_codec import matrix_order
+from src.tasks.routing import Router, SEARCH_PARAMS, SolutionNotFound, check_inputs
+from src.tasks.schedule import solve_routes
+
+
+class PackedRoutes(NamedTuple):
+    # visited nodes of all drivers concatenated
+    nodes: np.ndarray
+    # cumulative time at each visited node
+    times: np.ndarray
+    # end offset of each driver in nodes and times
+    offsets: np.ndarray
+    objective: int
+    # seconds spent in each phase of the solve, see Router.timings
+    timings: Dict[str, float] = {}
+
+
+class SolverPoolFull(Exception):
+    def __init__(self, retry_after: int) -> None:
+        super().__init__("Solver capacity exceeded, retry later")
+        # seconds until capacity is expected to free up
+        self.retry_after = retry_after
+
+
+def pack_inputs(
+    time_matrix: Union[np.ndarray, List[List[int]]],
+    driver_indicies: List[int],
+    delivery_pairs: List[Tuple[int, int]],
+    delivery_weights: Optional[List[int]] = None,
+    vehicle_capacities: Optional[List[int]] = None,
+    site_eta: Optional[List[int]] = None,
+    time_worked: Optional[List[int]] = None,
+    max_time: int = 28800,
+    capacity_dimensions: Optional[Dict[str, CapacityDimension]] = None,
+    initial_routes: Optional[List[List[int]]] = None,
+    drop_penalties: Optional[List[int]] = None,
+) -> Dict[str, Any]:
+    """Solver inputs as numpy arrays, these pickle as raw buffers rather than one object per element
+
+    See Router.solve for args, a packed triangle time matrix stays packed.
+    Raises an exception if the inputs can never be solved, see check_inputs
+    """
+
+    def as_array(values: Optional[List[int]]) -> Optional[np.ndarray]:
+        return None if values is None else np.asarray(values, dtype=np.int64)
+
+    inputs = dict(
+        time_matrix=np.asarray(time_matrix, dtype=np.int32),
+        driver_indicies=as_array(driver_indicies),
+        delivery_pairs=np.asarray(delivery_pairs, dtype=np.int64).reshape(-1, 2),
+        delivery_weights=as_array(delivery_weights),
+        vehicle_capacities=as_array(vehicle_capacities),
+        site_eta=as_array(site_eta),
+        time_worked=as_array(time_worked),
+        max_time=max_time,
+        capacity_dimensions={
+            name: (
+                as_array(dimension.delivery_weights),
+                as_array(dimension.vehicle_capacities),
+            )
+            for name, dimension in (capacity_dimensions or {}).items()
+        },
+        # ragged routes as flat nodes and the end offset of each route
+        initial_routes=None
+        if initial_routes is None
+        else (
+            np.asarray(sum(initial_routes, []), dtype=np.int64),
+            np.cumsum([len(route) for route in initial_routes], dtype=np.int64),
+        ),
+        drop_penalties=as_array(drop_penalties),
+    )
+    # rejected here rather than after waiting for a solver process
+    check_inputs(
+        **{name: value for name, value in inputs.items() if name != "initial_routes"}
+    )
+    return inputs
+
+
+def unpack_routes(packed: PackedRoutes) -> Tuple[List[List[int]], List[List[int]]]:
+    """Route and cumulative times of each driver from the flat arrays returned by solver processes"""
+    return (
+        [route.tolist() for route in np.split(packed.nodes, packed.offsets[:-1])],
+        [times.tolist() for times in np.split(packed.times, packed.offsets[:-1])],
+    )
+
+
+def solve_packed(
+    params: pywrapcp.DefaultRoutingSearchParameters,
+    inputs: Dict[str, Any],
+    deadline: Optional[float] = None,
+    router_options: Optional[Dict[str, Any]] = None,
+    progress: Optional[queue.Queue] = None,
+) -> PackedRoutes:
+    """Entry point of solver processes, solves packed inputs with a fresh router
+
+    Args:
+        params (pywrapcp.DefaultRoutingSearchParameters): search parameters passed to the solver
+        inputs (Dict[str, Any]): see pack_inputs
+        deadline (Optional[float]): epoch time the search must finish by, overrides the params time limit
+        router_options (Optional[Dict[str, Any]]): keyword arguments of Router besides params e.g. improvement_window
+        progress (Optional[queue.Queue]): PackedRoutes of each improving solution are put here while the search runs, see SolverPool.progress_queue
+    """
+    if deadline is not None:
+        params.time_limit.FromMilliseconds(max(0, int((deadline - time.time()) * 1000)))
+
+    def as_list(values: Optional[np.ndarray]) -> Optional[List[int]]:
+        return None if values is None else values.tolist()
+
+    initial_routes = None
+    if inputs["initial_routes"] is not None:
+        nodes, offsets = inputs["initial_routes"]
+        initial_routes = [route.tolist() for route in np.split(nodes, offsets[:-1])]
+
+    router_options = dict(router_options or {})
+    if progress is not None:
+        router_options["on_solution"] = lambda routes, times, objective: progress.put(
+            _pack_routes(routes, times, objective)
+        )
+
+    router = Router(params, **router_options)
+    nodes, times, offsets = solve_routes(
+        router,
+        time_matrix=inputs["time_matrix"],
+        driver_indicies=as_list(inputs["driver_indicies"]),
+        delivery_pairs=as_list(inputs["delivery_pairs"]),
+        delivery_weights=as_list(inputs["delivery_weights"]),
+        vehicle_capacities=as_list(inputs["vehicle_capacities"]),
+        site_eta=as_list(inputs["site_eta"]),
+        time_worked=as_list(inputs["time_worked"]),
+        max_time=inputs["max_time"],
+        capacity_dimensions={
+            name: (as_list(weights), as_list(capacities))
+            for name, (weights, capacities) in inputs["capacity_dimensions"].items()
+        },
+        initial_routes=initial_routes,
+        drop_penalties=as_list(inputs["drop_penalties"]),
+    )
+    return PackedRoutes(
+        nodes=nodes,
+        times=times,
+        offsets=offsets,
+        objective=router.solution.ObjectiveValue(),
+        timings=router.timings,
+    )
+
+
+def _pack_routes(
+    routes: List[List[int]], times: List[List[int]], objective: int
+) -> PackedRoutes:
+    return PackedRoutes(
+        nodes=np.concatenate(routes).astype(np.int32),
+        times=np.concatenate(times).astype(np.int64),
+        offsets=np.cumsum([len(route) for route in routes]),
+        objective=objective,
+    )
+
+
+class SolverPool:
+    """Solves in a fixed number of processes with a bounded queue
+
+    Solves hold the GIL for the whole search, running them in separate processes lets concurrent
+    requests use more than one core. Submissions beyond the queue are rejected rather than letting
+    every request wait longer.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        max_queue: int,
+        solve_time: int = SEARCH_PARAMS.time_limit.seconds,
+    ) -> None:
+        """
+        Args:
+            max_workers (int): number of solver processes
+            max_queue (int): number of solves that can wait for a free process before submissions are rejected
+            solve_time (int): expected seconds per solve, used to estimate when to retry
+        """
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.solve_time = solve_time
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._manager: Optional[SyncManager] = None
+
+    def submit(
+        self,
+        inputs: Dict[str, Any],
+        params: pywrapcp.DefaultRoutingSearchParameters = SEARCH_PARAMS,
+        router_options: Optional[Dict[str, Any]] = None,
+        progress: Optional[queue.Queue] = None,
+    ) -> Future:
+        """Queue packed inputs (see pack_inputs), raises SolverPoolFull if the queue is full
+
+        Args:
+            progress (Optional[queue.Queue]): from progress_queue, receives the PackedRoutes of each improving solution while solving
+
+        Returns:
+            Future: resolves to the PackedRoutes of the solution
+        """
+        return self._submit(
+            [(inputs, params)], router_options=router_options, progress=progress
+        )[0]
+
+    def idle_workers(self) -> int:
+        """Solver processes with no solve running or queued for them"""
+        with self._lock:
+            return max(0, self.max_workers - self._in_flight)
+
+    def progress_queue(self) -> queue.Queue:
+        """Queue solver processes can put improving solutions on while solving, see submit"""
+        with self._lock:
+            if self._manager is None:
+                # separate process serving queues shared with the spawned solver processes
+                self._manager = multiprocessing.get_context("spawn").Manager()
+            return self._manager.Queue()
+
+    def submit_many(
+        self,
+        inputs: Dict[str, Any],
+        params: List[pywrapcp.DefaultRoutingSearchParameters],
+        deadline: Optional[float] = None,
+        router_options: Optional[Dict[str, Any]] = None,
+    ) -> List[Future]:
+        """Queue one solve of the same inputs for each of the params, either all are queued or SolverPoolFull is raised
+
+        Args:
+            inputs (Dict[str, Any]): see pack_inputs
+            params (List[pywrapcp.DefaultRoutingSearchParameters]): search parameters of each solve
+            deadline (Optional[float]): epoch time all solves must finish by, including time spent queued
+            router_options (Optional[Dict[str, Any]]): see solve_packed
+
+        Returns:
+            List[Future]: resolve to the PackedRoutes of each solve
+        """
+        return self._submit([(inputs, p) for p in params], deadline, router_options)
+
+    def submit_each(
+        self,
+        inputs: List[Dict[str, Any]],
+        params: pywrapcp.DefaultRoutingSearchParameters = SEARCH_PARAMS,
+        router_options: Optional[Dict[str, Any]] = None,
+    ) -> List[Future]:
+        """Queue a solve of each of the inputs, either all are queued or SolverPoolFull is raised
+
+        Returns:
+            List[Future]: resolve to the PackedRoutes of each solve
+        """
+        return self._submit(
+            [(i, params) for i in inputs], router_options=router_options
+        )
+
+    def _submit(
+        self,
+        solves: List[Tuple[Dict[str, Any], pywrapcp.DefaultRoutingSearchParameters]],
+        deadline: Optional[float] = None,
+        router_options: Optional[Dict[str, Any]] = None,
+        progress: Optional[queue.Queue] = None,
+    ) -> List[Future]:
+        with self._lock:
+            if self._in_flight + len(solves) > self.max_workers + self.max_queue:
+                # every queued solve ahead has to finish first
+                raise SolverPoolFull(
+                    math.ceil(self._in_flight / self.max_workers) * self.solve_time
+                )
+            self._in_flight += len(solves)
+            if self._executor is None:
+                # created on first use so importing the app does not start processes
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            futures = [
+                self._executor.submit(
+                    solve_packed, params, inputs, deadline, router_options, progress
+                )
+                for inputs, params in solves
+            ]
+        for future, (inputs, _) in zip(futures, solves):
+            size = size_bucket(matrix_order(inputs["time_matrix"]))
+            future.add_done_callback(self._release)
+            future.add_done_callback(lambda f, size=size: _record_solve(f, size))
+        return futures
+
+    def _release(self, future: Future) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+
+def _record_solve(future: Future, size: str) -> None:
+    """Count the outcome of a finished solve and observe the time spent in each of its phases"""
+    if future.cancelled():
+        return
+    error = future.exception()
+    if error is None:
+        SOLVE_OUTCOMES.inc(outcome="found", size=size)
+        for phase, seconds in future.result().timings.items():
+            PHASE_SECONDS.observe(seconds, phase=phase, size=size)
+    elif isinstance(error, SolutionNotFound):
+        SOLVE_OUTCOMES.inc(
+            outcome="timeout" if error.timeout else "not_found", size=size
+        )
+    else:
+        SOLVE_OUTCOMES.inc(outcome="error", size=size)
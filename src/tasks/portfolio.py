@@ -0,0 +1,123 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from ortools.constraint_solver import pywrapcp
+
+from src.tasks.pool import PackedRoutes, SolverPool
+from src.tasks.routing import SEARCH_PARAMS
+from src.tasks.search import FirstSolutionStrategy, LocalSearchMetaheuristic
+
+# (first solution strategy, local search metaheuristic) combinations raced by default
+DEFAULT_STRATEGIES = [
+    (FirstSolutionStrategy.PATH_CHEAPEST_ARC, LocalSearchMetaheuristic.AUTOMATIC),
+    (FirstSolutionStrategy.SAVINGS, LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH),
+    (
+        FirstSolutionStrategy.PARALLEL_CHEAPEST_INSERTION,
+        LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH,
+    ),
+    (
+        FirstSolutionStrategy.PATH_CHEAPEST_ARC,
+        LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH,
+    ),
+]
+
+
+class PortfolioResult(NamedTuple):
+    # name of the winning strategy e.g. SAVINGS/GUIDED_LOCAL_SEARCH
+    strategy: str
+    routes: PackedRoutes
+
+
+def strategy_name(strategy: Tuple[int, int]) -> str:
+    first_solution, metaheuristic = strategy
+    return (
+        f"{FirstSolutionStrategy.Value.Name(first_solution)}"
+        f"/{LocalSearchMetaheuristic.Value.Name(metaheuristic)}"
+    )
+
+
+def strategy_params(
+    strategy: Tuple[int, int],
+    first_feasible: bool = False,
+    base: pywrapcp.DefaultRoutingSearchParameters = SEARCH_PARAMS,
+) -> pywrapcp.DefaultRoutingSearchParameters:
+    """Copy of the base search parameters using a strategy, stopping at the first solution if first_feasible"""
+    params = pywrapcp.DefaultRoutingSearchParameters()
+    params.CopyFrom(base)
+    params.first_solution_strategy, params.local_search_metaheuristic = strategy
+    if first_feasible:
+        params.solution_limit = 1
+    return params
+
+
+def solve_portfolio(
+    solver_pool: SolverPool,
+    inputs: Dict[str, Any],
+    strategies: List[Tuple[int, int]] = DEFAULT_STRATEGIES,
+    time_limit: Optional[float] = None,
+    first_feasible: bool = False,
+    params: pywrapcp.DefaultRoutingSearchParameters = SEARCH_PARAMS,
+    router_options: Optional[Dict[str, Any]] = None,
+) -> Future:
+    """Race strategies in their own solver processes under a shared deadline
+
+    Only as many strategies as there are idle solver processes are raced, in the order given and at
+    least the first, so none wait for a process while the deadline passes. Once the portfolio resolves
+    strategies still queued are cancelled, with first_feasible running ones stop at their first solution.
+
+    Args:
+        solver_pool (SolverPool): pool solves are queued in, raises SolverPoolFull if it cannot take the raced strategies
+        inputs (Dict[str, Any]): see pack_inputs
+        strategies (List[Tuple[int, int]]): (first solution strategy, local search metaheuristic) combinations in order of preference
+        time_limit (Optional[float]): seconds until every strategy must finish, defaults to the params time limit
+        first_feasible (bool): resolve with the first solution found by any strategy rather than the lowest objective
+        params (pywrapcp.DefaultRoutingSearchParameters): search parameters the strategies are applied to
+        router_options (Optional[Dict[str, Any]]): see solve_packed
+
+    Returns:
+        Future: resolves to the PortfolioResult of the winning strategy, or the exception of the last strategy if none succeed
+    """
+    if time_limit is None:
+        time_limit = params.time_limit.ToMilliseconds() / 1000
+    strategies = strategies[: max(1, solver_pool.idle_workers())]
+    futures = solver_pool.submit_many(
+        inputs,
+        [strategy_params(strategy, first_feasible, params) for strategy in strategies],
+        deadline=time.time() + time_limit,
+        router_options=router_options,
+    )
+    names = [strategy_name(strategy) for strategy in strategies]
+
+    portfolio = Future()
+    # reentrant as resolving the portfolio cancels futures, running their callbacks on this thread
+    lock = threading.RLock()
+    remaining = [len(futures)]
+    best: List[PortfolioResult] = []
+
+    def on_done(name: str, future: Future) -> None:
+        with lock:
+            remaining[0] -= 1
+            if portfolio.done():
+                return
+            if future.exception() is None:
+                result = PortfolioResult(strategy=name, routes=future.result())
+                if first_feasible:
+                    portfolio.set_result(result)
+                    return
+                if not best or result.routes.objective < best[0].routes.objective:
+                    best[:] = [result]
+            if remaining[0] == 0:
+                if best:
+                    portfolio.set_result(best[0])
+                else:
+                    portfolio.set_exception(future.exception())
+
+    def cancel_losers(_: Future) -> None:
+        for future in futures:
+            future.cancel()
+
+    for name, future in zip(names, futures):
+        future.add_done_callback(lambda f, name=name: on_done(name, f))
+    portfolio.add_done_callback(cancel_losers)
+    return portfolio
@@ -1,27 +1,89 @@
-from typing import List, Optional, Tuple
+import math
+import time
+from typing import Callable, Dict, List, Optional, Tuple, Union
+import numpy as np
 from ortools.constraint_solver import pywrapcp, routing_enums_pb2
 
+from src.tasks.matrix_codec import (
+    is_triangle,
+    matrix_order,
+    triangle_index,
+    triangle_positions,
+    unpack_triangle,
+)
+from src.tasks.search import DEFAULT_PRESET, search_params
+
+# cost per second between the earliest route start and the latest route end
+SPAN_COST_COEFFICIENT = 100
+
 # dimension names
 TIME_DIMENSION = "Time"
 CAPACITY_DIMENSION = "Capacity"
 
-# default search params
-SEARCH_PARAMS = pywrapcp.DefaultRoutingSearchParameters()
-SEARCH_PARAMS.first_solution_strategy = (
-    routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
-)
-SEARCH_PARAMS.time_limit.seconds = 10  # Timeout if solution not found
+# order pickups and deliveries of a vehicle may be interleaved in, see Router precedence
+PRECEDENCE_POLICIES = {
+    # each pickup is followed straight away by its delivery
+    "direct": pywrapcp.RoutingModel.PICKUP_AND_DELIVERY_NO_ORDER,
+    # last picked up is delivered first, e.g. a single loading door
+    "lifo": pywrapcp.RoutingModel.PICKUP_AND_DELIVERY_LIFO,
+    # first picked up is delivered first
+    "fifo": pywrapcp.RoutingModel.PICKUP_AND_DELIVERY_FIFO,
+    # any order as long as each pickup comes before its delivery
+    "free": pywrapcp.RoutingModel.PICKUP_AND_DELIVERY_NO_ORDER,
+}
+
+# default search params, shared so never mutated, see search_params for per request params
+SEARCH_PARAMS = search_params(DEFAULT_PRESET)
+
+
+class SolutionNotFound(Exception):
+    def __init__(self, timeout: bool = False) -> None:
+        super().__init__("Solution not found")
+        # whether the search ran out of time rather than proving no solution exists
+        self.timeout = timeout
+
+    def __reduce__(self):
+        # pickled with timeout so it survives being raised in a solver process
+        return SolutionNotFound, (self.timeout,)
 
 
 class Router:
     def __init__(
-        self, params: pywrapcp.DefaultRoutingSearchParameters = SEARCH_PARAMS
+        self,
+        params: pywrapcp.DefaultRoutingSearchParameters = SEARCH_PARAMS,
+        transit_matrix: bool = True,
+        improvement_window: Optional[float] = None,
+        nearest_neighbors: Optional[int] = None,
+        on_solution: Optional[
+            Callable[[List[List[int]], List[List[int]], int], None]
+        ] = None,
+        precedence: Optional[str] = None,
     ) -> None:
+        """
+        Args:
+            params (pywrapcp.DefaultRoutingSearchParameters): search parameters passed to the solver
+            transit_matrix (bool): register travel times as a precomputed matrix evaluated natively by the solver, if False a python callback is called for every arc evaluation
+            improvement_window (Optional[float]): stop the search once the objective has not improved for this many seconds. Checked from python at every search step so slows the search down a little
+            nearest_neighbors (Optional[int]): penalise travel from each location to anything but its k nearest successors or the end of a route, local search operators also only consider these neighbours. Other arcs stay allowed so every instance solvable without pruning remains solvable, the penalty of any used is included in the objective
+            on_solution (Optional[Callable[[List[List[int]], List[List[int]], int], None]]): called with the routes, route times and objective of each improving solution while the search runs
+            precedence (Optional[str]): one of PRECEDENCE_POLICIES, pairs are modelled with the solvers pickup and delivery machinery alone following this policy. If None each pickup goes straight to its delivery enforced by extra constraints on every pair
+        """
+        if precedence is not None and precedence not in PRECEDENCE_POLICIES:
+            raise Exception(
+                f"Unknown precedence {precedence}, use one of {list(PRECEDENCE_POLICIES)}"
+            )
         self.params = params
+        self.transit_matrix = transit_matrix
+        self.improvement_window = improvement_window
+        self.nearest_neighbors = nearest_neighbors
+        self.on_solution = on_solution
+        self.precedence = precedence
+        # seconds spent in each phase of the last solve
+        self.timings: Dict[str, float] = {}
 
     def solve(
         self,
-        time_matrix: List[List[int]],
+        time_matrix: Union[np.ndarray, List[List[int]]],
         driver_indicies: List[int],
         delivery_pairs: List[Tuple[int]],
         delivery_weights: Optional[List[int]] = None,
@@ -29,20 +91,42 @@ class Router:
         site_eta: Optional[List[int]] = None,
         time_worked: Optional[List[int]] = None,
         max_time: int = 28800,
+        capacity_dimensions: Optional[Dict[str, Tuple[List[int], List[int]]]] = None,
+        initial_routes: Optional[List[List[int]]] = None,
+        drop_penalties: Optional[List[int]] = None,
     ) -> None:
-        """Attempt to find a solution within the given constraints, will raise exception if fails"""
-        n_locations, n_vehicles = len(time_matrix), len(driver_indicies)
+        """Attempt to find a solution within the given constraints, will raise exception if fails
 
-        # ensure all inputs correct
-        _check_inputs(
-            n_locations,
-            n_vehicles,
+        capacity_dimensions maps a dimension name (e.g. "Volume") to its (delivery weights, vehicle capacities),
+        these are constrained alongside delivery_weights and vehicle_capacities
+
+        drop_penalties make every delivery pair optional, a pair may be left unserved at the cost of its penalty
+        added to the objective rather than the whole solve failing. Locations in no pair must still be visited
+
+        initial_routes are the locations visited by each driver in a previous solution (as returned by get_route_list),
+        search starts from these with any locations missing from them inserted at their cheapest position
+
+        time_matrix may be the packed upper triangle of a symmetric matrix as a 1d numpy array (see pack_triangle)
+        """
+        n_locations, n_vehicles = matrix_order(time_matrix), len(driver_indicies)
+        self.timings = {}
+        start = time.perf_counter()
+
+        # ensure all inputs correct and not obviously infeasible
+        check_inputs(
+            time_matrix,
+            driver_indicies,
+            delivery_pairs,
+            delivery_weights,
             vehicle_capacities,
             site_eta,
-            delivery_weights,
-            delivery_pairs,
             time_worked,
+            max_time,
+            capacity_dimensions,
+            drop_penalties,
         )
+        self.timings["check_inputs"] = time.perf_counter() - start
+        start = time.perf_counter()
 
         # depot nodes act as start and end positions
         self.manager = pywrapcp.RoutingIndexManager(
@@ -51,7 +135,11 @@ class Router:
         self.routing = pywrapcp.RoutingModel(self.manager)
 
         self._add_time_dimension(time_matrix, max_time, site_eta, time_worked)
-        self._add_delivery_constraint(delivery_pairs)
+        self._add_delivery_constraint(
+            delivery_pairs, droppable=drop_penalties is not None
+        )
+        if drop_penalties is not None:
+            self._add_drop_penalties(delivery_pairs, drop_penalties)
 
         # only add capacity constraint if needed
         if delivery_weights and vehicle_capacities:
@@ -62,61 +150,228 @@ class Router:
                 vehicle_capacities,
                 driver_indicies,
             )
-
-        self.solution = self.routing.SolveWithParameters(self.params)
+        for name, (weights, capacities) in (capacity_dimensions or {}).items():
+            self._add_capacity_dimension(
+                n_locations,
+                weights,
+                delivery_pairs,
+                capacities,
+                driver_indicies,
+                name=name,
+            )
+        if self.improvement_window is not None:
+            self._add_improvement_limit()
+        if self.on_solution is not None:
+            self._add_solution_listener()
+        params = self.params
+        if self.nearest_neighbors is not None and self.nearest_neighbors < n_locations:
+            self._prune_arcs(
+                _build_transit_matrix(time_matrix, site_eta),
+                driver_indicies,
+                delivery_pairs,
+            )
+            params = _neighbor_params(self.params, self.nearest_neighbors, n_locations)
+        self.timings["build"] = time.perf_counter() - start
+        start = time.perf_counter()
+
+        self.solution = None
+        if initial_routes is not None:
+            self.solution = self._solve_from_routes(
+                _warm_start_routes(
+                    initial_routes,
+                    _build_transit_matrix(time_matrix, site_eta),
+                    driver_indicies,
+                    delivery_pairs,
+                ),
+                params,
+            )
+        # no usable initial solution so search from scratch
+        if self.solution is None:
+            self.solution = self.routing.SolveWithParameters(params)
+        self.timings["solve"] = time.perf_counter() - start
         if self.solution is None:
-            raise Exception("Solution not found")
+            raise SolutionNotFound(
+                timeout=self.routing.status()
+                == routing_enums_pb2.RoutingSearchStatus.ROUTING_FAIL_TIMEOUT
+            )
 
     def get_route_list(self):
         """Get list of routes for each driver, locations are given as indicies relating to their position in the time matrix"""
-        routes = []
-        for vehicle_id in range(self.manager.GetNumberOfVehicles()):
-            # starting index
-            index = self.routing.Start(vehicle_id)
-            # overall route for this specific vehicle
-            route = [self.manager.IndexToNode(index)]
-
-            # append to route while not at final indedx
-            while not self.routing.IsEnd(index):
-                # next index to visit
-                index = self.solution.Value(self.routing.NextVar(index))
-                route.append(self.manager.IndexToNode(index))
-            routes.append(route)
-        return routes
+        nodes, _, offsets = self.extract_routes()
+        return [route.tolist() for route in np.split(nodes, offsets[:-1])]
 
     def get_route_times(self):
         """Get expected duration of each route, value represents duration already incurred + current duration"""
+        _, times, offsets = self.extract_routes()
+        return [route.tolist() for route in np.split(times, offsets[:-1])]
+
+    def extract_routes(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Visited locations and cumulative times of every driver read from the solution in a single pass
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: visited locations of all drivers concatenated,
+                the cumulative time at each, and the end offset of each driver in both
+        """
+        n_vehicles = self.manager.GetNumberOfVehicles()
         time_dimension = self.routing.GetDimensionOrDie(TIME_DIMENSION)
-        times = []
-        for vehicle_id in range(self.manager.GetNumberOfVehicles()):
+        # bound once rather than looked up at every step
+        value, cumul_min = self.solution.Value, self.solution.Min
+        next_var, cumul_var = self.routing.NextVar, time_dimension.CumulVar
+        index_to_node, is_end = self.manager.IndexToNode, self.routing.IsEnd
+
+        # every location is visited at most once, plus a start and end per driver
+        size = self.routing.Size() + n_vehicles
+        nodes = np.empty(size, dtype=np.int32)
+        times = np.empty(size, dtype=np.int64)
+        offsets = np.empty(n_vehicles, dtype=np.int64)
+        i = 0
+        for vehicle_id in range(n_vehicles):
             index = self.routing.Start(vehicle_id)
-            vehicle_time = []
-            while not self.routing.IsEnd(index):
-                vehicle_time.append(self.solution.Min(time_dimension.CumulVar(index)))
-                index = self.solution.Value(self.routing.NextVar(index))
+            while True:
+                nodes[i] = index_to_node(index)
+                times[i] = cumul_min(cumul_var(index))
+                i += 1
+                if is_end(index):
+                    break
+                index = value(next_var(index))
+            offsets[vehicle_id] = i
+        return nodes[:i], times[:i], offsets
+
+    def _solve_from_routes(
+        self,
+        routes: List[List[int]],
+        params: pywrapcp.DefaultRoutingSearchParameters,
+    ) -> Optional[pywrapcp.Assignment]:
+        """Search starting from the given routes, None if they break any constraint"""
+        self.routing.CloseModelWithParameters(params)
+        assignment = self.routing.ReadAssignmentFromRoutes(
+            [[self.manager.NodeToIndex(node) for node in route] for route in routes],
+            True,  # ignore inactive nodes
+        )
+        if assignment is None:
+            return None
+        return self.routing.SolveFromAssignmentWithParameters(assignment, params)
+
+    def _add_improvement_limit(self) -> None:
+        """Stop the search improvement_window seconds after the last improving solution"""
+        # no limit until the first solution
+        deadline = [math.inf]
+        best = [math.inf]
+        monotonic = time.monotonic
+
+        def at_solution() -> None:
+            objective = self.routing.CostVar().Value()
+            if objective < best[0]:
+                best[0] = objective
+                deadline[0] = monotonic() + self.improvement_window
+
+        self.routing.AddAtSolutionCallback(at_solution)
+        # called at every search step so kept as cheap as possible
+        self.routing.AddSearchMonitor(
+            self.routing.solver().CustomLimit(lambda: monotonic() > deadline[0])
+        )
 
-            vehicle_time.append(self.solution.Min(time_dimension.CumulVar(index)))
-            times.append(vehicle_time)
-        return times
+    def _add_solution_listener(self) -> None:
+        """Pass the routes of each improving solution to on_solution while the search runs"""
+        time_dimension = self.routing.GetDimensionOrDie(TIME_DIMENSION)
+        best = [math.inf]
+
+        def at_solution() -> None:
+            objective = self.routing.CostVar().Value()
+            # metaheuristics also accept worse solutions to escape local optima
+            if objective >= best[0]:
+                return
+            best[0] = objective
+
+            routes, times = [], []
+            for vehicle_id in range(self.manager.GetNumberOfVehicles()):
+                index = self.routing.Start(vehicle_id)
+                route = [self.manager.IndexToNode(index)]
+                vehicle_time = [time_dimension.CumulVar(index).Min()]
+                while not self.routing.IsEnd(index):
+                    index = self.routing.NextVar(index).Value()
+                    route.append(self.manager.IndexToNode(index))
+                    vehicle_time.append(time_dimension.CumulVar(index).Min())
+                routes.append(route)
+                times.append(vehicle_time)
+            self.on_solution(routes, times, objective)
+
+        self.routing.AddAtSolutionCallback(at_solution)
+
+    def _prune_arcs(
+        self,
+        transit: np.ndarray,
+        driver_indicies: List[int],
+        delivery_pairs: List[Tuple[int, int]],
+    ) -> None:
+        """Penalise travel from each location to all but its nearest_neighbors nearest successors and route ends
+
+        Pruned arcs cost their travel time plus the longest travel time so the search only uses them
+        when the nearest successors leave no feasible route. Forbidding them outright leaves instances
+        where a vehicle must travel further than its neighbours without any solution.
+
+        When pickups go straight to their delivery, deliveries can only follow their pickup,
+        so pickups keep their one successor and deliveries are never kept as a successor
+        """
+        direct = self.precedence in [None, "direct"]
+        pickups = [p for p, d in delivery_pairs if p != d and direct]
+        deliveries = [d for p, d in delivery_pairs if p != d and direct]
+
+        visits = np.ones(len(transit), dtype=bool)
+        visits[driver_indicies] = False
+        sources = visits.copy()
+        sources[pickups] = False
+        targets = visits.copy()
+        targets[deliveries] = False
+        sources, targets = np.flatnonzero(sources), np.flatnonzero(targets)
+
+        successors = _nearest_successors(
+            transit, sources, targets, self.nearest_neighbors
+        )
+        pruned = np.zeros(transit.shape, dtype=bool)
+        pruned[sources] = True
+        pruned[sources[:, np.newaxis], successors] = False
+        # route ends are depots
+        pruned[:, driver_indicies] = False
+        cost = transit.astype(np.int64) + np.where(pruned, transit.max(), 0)
+        # the time dimension keeps the true travel times
+        self.routing.SetArcCostEvaluatorOfAllVehicles(
+            self.routing.RegisterTransitMatrix(cost.tolist())
+        )
 
     def _add_time_dimension(
         self,
-        time_matrix: List[List[int]],
+        time_matrix: Union[np.ndarray, List[List[int]]],
         max_time: int,
         site_eta: Optional[List[int]] = None,
         time_worked: Optional[List[int]] = None,
     ) -> None:
-        def time_callback(from_index: int, to_index: int) -> float:
-            """Calculates time between two indicies"""
-            from_node = self.manager.IndexToNode(from_index)
-            to_node = self.manager.IndexToNode(to_index)
-
-            travel_time = time_matrix[from_node][to_node]
-            if site_eta:
-                travel_time += site_eta[from_node]
-            return travel_time
-
-        transit_callback_index = self.routing.RegisterTransitCallback(time_callback)
+        if self.transit_matrix:
+            # evaluated in C++ without crossing back into python for every arc
+            transit_callback_index = self.routing.RegisterTransitMatrix(
+                _build_transit_matrix(time_matrix, site_eta).tolist()
+            )
+        else:
+            n_locations = matrix_order(time_matrix)
+            triangle = is_triangle(time_matrix)
+
+            def time_callback(from_index: int, to_index: int) -> float:
+                """Calculates time between two indicies"""
+                from_node = self.manager.IndexToNode(from_index)
+                to_node = self.manager.IndexToNode(to_index)
+
+                if triangle:
+                    # read from the packed triangle rather than expanding it
+                    travel_time = int(
+                        time_matrix[triangle_index(n_locations, from_node, to_node)]
+                    )
+                else:
+                    travel_time = time_matrix[from_node][to_node]
+                if site_eta:
+                    travel_time += site_eta[from_node]
+                return travel_time
+
+            transit_callback_index = self.routing.RegisterTransitCallback(time_callback)
 
         # setting cost as time (routing will attempt to minimise this cost)
         self.routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
@@ -139,14 +394,18 @@ class Router:
             time_dimension.CumulVar(index).SetValue(starting_value)
 
         # minimises: coefficient * (Max(dimension end value) - Min(dimension start value)).
-        time_dimension.SetGlobalSpanCostCoefficient(100)
+        time_dimension.SetGlobalSpanCostCoefficient(SPAN_COST_COEFFICIENT)
 
         return time_dimension
 
     def _add_delivery_constraint(
         self,
         pickup_delivery_data: List[List[int]],
+        droppable: bool = False,
     ) -> None:
+        if self.precedence is not None:
+            self._add_pickup_and_delivery(pickup_delivery_data)
+            return
         time_dimension = self.routing.GetDimensionOrDie(TIME_DIMENSION)
 
         # set rules for pickup and delivery relationships
@@ -174,9 +433,48 @@ class Router:
                 )
 
                 # constraint pickup vehicle must go straight to delivery
-                self.routing.solver().Add(
-                    self.routing.NextVar(pickup_index) == delivery_index
-                )
+                if droppable:
+                    # or be its own successor when the pair is dropped
+                    self.routing.NextVar(pickup_index).SetValues(
+                        [pickup_index, delivery_index]
+                    )
+                else:
+                    self.routing.solver().Add(
+                        self.routing.NextVar(pickup_index) == delivery_index
+                    )
+
+    def _add_pickup_and_delivery(self, delivery_pairs: List[List[int]]) -> None:
+        """Pairs modelled natively, AddPickupAndDelivery already keeps a pair on one vehicle with the pickup first"""
+        for pickup_node, delivery_node in delivery_pairs:
+            if pickup_node != delivery_node:
+                pickup_index = self.manager.NodeToIndex(pickup_node)
+                delivery_index = self.manager.NodeToIndex(delivery_node)
+                self.routing.AddPickupAndDelivery(pickup_index, delivery_index)
+                if self.precedence == "direct":
+                    # domain reduced up front rather than an equality propagated during search
+                    self.routing.NextVar(pickup_index).SetValues(
+                        [pickup_index, delivery_index]
+                    )
+        self.routing.SetPickupAndDeliveryPolicyOfAllVehicles(
+            PRECEDENCE_POLICIES[self.precedence]
+        )
+
+    def _add_drop_penalties(
+        self, delivery_pairs: List[List[int]], drop_penalties: List[int]
+    ) -> None:
+        """Let each pair go unserved at the cost of its penalty
+
+        AddPickupAndDelivery keeps a pickup and its delivery both served or both dropped,
+        so the penalty is put on the pickup alone and paid once per dropped pair
+        """
+        for (pickup_node, delivery_node), penalty in zip(
+            delivery_pairs, drop_penalties
+        ):
+            pickup_index = self.manager.NodeToIndex(pickup_node)
+            self.routing.AddDisjunction([pickup_index], penalty)
+            if pickup_node != delivery_node:
+                delivery_index = self.manager.NodeToIndex(delivery_node)
+                self.routing.AddDisjunction([delivery_index], 0)
 
     def _add_capacity_dimension(
         self,
@@ -185,83 +483,355 @@ class Router:
         delivery_pairs: List[int],
         capacities: List[int],
         driver_indicies: List[int],
+        name: str = CAPACITY_DIMENSION,
     ) -> None:
-        def demand_callback(from_index):
-            """Returns the demand of the node."""
-
-            def get_flat_requirements():
-                """Flat list of weight requirements for each node"""
-                reqs = [0] * n_locations
-                for req, (pickup, delivery) in zip(requirements, delivery_pairs):
-                    if pickup != delivery:
-                        reqs[pickup] = req
-                        reqs[delivery] = -req
-                return reqs
-
-            from_node = self.manager.IndexToNode(from_index)
-            if from_node in driver_indicies:
-                # nothing is carried from depots
-                return 0
-            return get_flat_requirements()[from_node]
-
-        demand_callback_index = self.routing.RegisterUnaryTransitCallback(
-            demand_callback
+        demands = _build_demand_vector(
+            n_locations, requirements, delivery_pairs, driver_indicies
         )
+        demand_callback_index = self.routing.RegisterUnaryTransitVector(demands)
 
         self.routing.AddDimensionWithVehicleCapacity(
             demand_callback_index,
             0,  # null capacity slack
             capacities,  # vehicle maximum capacities
             True,  # start cumul to zero
-            CAPACITY_DIMENSION,
+            name,
         )
 
 
-def _check_inputs(
-    n_locations,
-    n_vehicles,
-    vehicle_capacities,
-    site_eta,
-    delivery_weights,
-    delivery_pairs,
-    time_worked,
+def _build_transit_matrix(
+    time_matrix: Union[np.ndarray, List[List[int]]],
+    site_eta: Optional[List[int]] = None,
+) -> np.ndarray:
+    """Time to travel from node i to node j, including the time spent at node i
+
+    Args:
+        time_matrix (Union[np.ndarray, List[List[int]]]): matrix representation of the distances between each location, or its packed upper triangle
+        site_eta (Optional[List[int]]): estimated time at each location
+
+    Returns:
+        np.ndarray: int32 matrix where i, j refers to the transit time between location i and location j
+    """
+    if is_triangle(time_matrix):
+        transit = unpack_triangle(time_matrix)
+    else:
+        transit = np.array(time_matrix, dtype=np.int32)
+    if site_eta:
+        # time at a site is incurred when leaving it
+        transit += np.asarray(site_eta, dtype=np.int32)[:, np.newaxis]
+    return transit
+
+
+def _nearest_successors(
+    transit: np.ndarray, sources: np.ndarray, targets: np.ndarray, k: int
+) -> np.ndarray:
+    """The k targets with the shortest transit from each source, a source is never its own successor
+
+    Args:
+        transit (np.ndarray): transit time between each location
+        sources (np.ndarray): locations travelled from
+        targets (np.ndarray): locations that may be travelled to
+        k (int): successors kept per source
+
+    Returns:
+        np.ndarray: (len(sources), min(k, len(targets))) locations, not ordered by transit
+    """
+    costs = transit[np.ix_(sources, targets)].astype(np.float64)
+    costs[sources[:, np.newaxis] == targets[np.newaxis, :]] = np.inf
+    k = min(k, len(targets))
+    if k == len(targets):
+        return np.broadcast_to(targets, (len(sources), k))
+    return targets[np.argpartition(costs, k - 1, axis=1)[:, :k]]
+
+
+def _neighbor_params(
+    params: pywrapcp.DefaultRoutingSearchParameters, k: int, n_locations: int
+) -> pywrapcp.DefaultRoutingSearchParameters:
+    """Copy of params whose local search operators only consider the k nearest neighbours of each location"""
+    neighbor_params = pywrapcp.DefaultRoutingSearchParameters()
+    neighbor_params.CopyFrom(params)
+    neighbor_params.ls_operator_neighbors_ratio = k / n_locations
+    neighbor_params.ls_operator_min_neighbors = k
+    return neighbor_params
+
+
+def _build_demand_vector(
+    n_locations: int,
+    requirements: List[int],
+    delivery_pairs: List[Tuple[int, int]],
+    driver_indicies: List[int],
+) -> np.ndarray:
+    """Capacity change at each node, pickups load the delivery weight and deliveries unload it
+
+    Args:
+        n_locations (int): number of locations in the time matrix
+        requirements (List[int]): vehicle capacity required to fulfill each delivery
+        delivery_pairs (List[Tuple[int, int]]): (pickup index, delivery index) for each delivery
+        driver_indicies (List[int]): indicies where locations relate to a drivers location
+
+    Returns:
+        np.ndarray: int64 demand for each node
+    """
+    demands = np.zeros(n_locations, dtype=np.int64)
+    for req, (pickup, delivery) in zip(requirements, delivery_pairs):
+        if pickup != delivery:
+            demands[pickup] = req
+            demands[delivery] = -req
+    # nothing is carried from depots
+    demands[driver_indicies] = 0
+    return demands
+
+
+def _warm_start_routes(
+    initial_routes: List[List[int]],
+    transit: np.ndarray,
+    driver_indicies: List[int],
+    delivery_pairs: List[Tuple[int, int]],
+) -> List[List[int]]:
+    """Complete a previous solution so every location is visited once with each pickup directly followed by its delivery
+
+    Unknown or repeated locations are dropped, missing locations and pairs that are split are (re)inserted
+    at the position that adds the least transit time.
+
+    Args:
+        initial_routes (List[List[int]]): locations visited by each driver, depots are ignored
+        transit (np.ndarray): transit time between locations, see _build_transit_matrix
+        driver_indicies (List[int]): indicies where locations relate to a drivers location
+        delivery_pairs (List[Tuple[int, int]]): (pickup index, delivery index) for each delivery
+
+    Returns:
+        List[List[int]]: locations visited by each driver excluding depots
+    """
+    n_locations, n_vehicles = len(transit), len(driver_indicies)
+    depots = set(driver_indicies)
+
+    seen = set()
+    routes = []
+    for route in list(initial_routes[:n_vehicles]) + [[]] * (
+        n_vehicles - len(initial_routes)
+    ):
+        routes.append([])
+        for node in route:
+            if 0 <= node < n_locations and node not in depots and node not in seen:
+                seen.add(node)
+                routes[-1].append(node)
+
+    # sequences that must be inserted together
+    units = []
+    queued = set()
+    for pickup, delivery in delivery_pairs:
+        if pickup == delivery or pickup in queued or delivery in queued:
+            continue
+        placed = {
+            node: (vehicle, route.index(node))
+            for vehicle, route in enumerate(routes)
+            for node in (pickup, delivery)
+            if node in route
+        }
+        if (
+            len(placed) == 2
+            and placed[pickup][0] == placed[delivery][0]
+            and placed[pickup][1] + 1 == placed[delivery][1]
+        ):
+            continue
+        # split or missing pairs are taken out and reinserted as one
+        for node, (vehicle, _) in placed.items():
+            routes[vehicle].remove(node)
+        seen.update([pickup, delivery])
+        queued.update([pickup, delivery])
+        units.append([pickup, delivery])
+    units += [
+        [node] for node in range(n_locations) if node not in depots and node not in seen
+    ]
+
+    for unit in units:
+        unit_cost = sum(transit[a, b] for a, b in zip(unit, unit[1:]))
+        best = None
+        for vehicle, route in enumerate(routes):
+            depot = driver_indicies[vehicle]
+            stops = np.array([depot] + route + [depot])
+            # cost of inserting between each consecutive stop
+            costs = (
+                transit[stops[:-1], unit[0]]
+                + unit_cost
+                + transit[unit[-1], stops[1:]]
+                - transit[stops[:-1], stops[1:]]
+            )
+            position = int(np.argmin(costs))
+            if best is None or costs[position] < best[0]:
+                best = (costs[position], vehicle, position)
+        _, vehicle, position = best
+        routes[vehicle][position:position] = unit
+    return routes
+
+
+def check_inputs(
+    time_matrix: Union[np.ndarray, List[List[int]]],
+    driver_indicies: List[int],
+    delivery_pairs: List[Tuple[int, int]],
+    delivery_weights: Optional[List[int]] = None,
+    vehicle_capacities: Optional[List[int]] = None,
+    site_eta: Optional[List[int]] = None,
+    time_worked: Optional[List[int]] = None,
+    max_time: int = 28800,
+    capacity_dimensions: Optional[Dict[str, Tuple[List[int], List[int]]]] = None,
+    drop_penalties: Optional[List[int]] = None,
 ) -> None:
-    """Ensure all inputs correct"""
-    try:
-        assert n_vehicles > 0
-    except:
+    """Raise an exception listing the offending pairs or vehicles if the inputs are malformed or can never be solved
+
+    Checked with numpy in milliseconds rather than the search using its whole time limit to find there is no solution.
+    Travel times are taken to obey the triangle inequality, so the quickest way to serve a pair is to leave a drivers
+    location for the pickup, go straight to the delivery and return. Locations in no pair are served as a pair
+    of the same pickup and delivery. With drop_penalties pairs no driver can serve are left to be dropped.
+    Takes the args of Router.solve, lists or numpy arrays.
+    """
+    n_vehicles = len(driver_indicies)
+    if n_vehicles == 0:
         raise Exception("Must have at least 1 depot node")
-    try:
-        assert n_locations > 1
-    except:
+    if not is_triangle(time_matrix):
+        if isinstance(time_matrix, np.ndarray):
+            square = time_matrix.ndim == 2 and len(time_matrix) == time_matrix.shape[1]
+        else:
+            square = all(len(row) == len(time_matrix) for row in time_matrix)
+        if not square:
+            raise Exception("Time matrix must be square")
+    n_locations = matrix_order(time_matrix)
+    if n_locations < 2:
         raise Exception("Must have at least 2 locations")
-    if vehicle_capacities:
-        try:
-            assert n_vehicles == len(vehicle_capacities)
-        except:
+
+    if _given(vehicle_capacities) and len(vehicle_capacities) != n_vehicles:
+        raise Exception(
+            "len(vehicle_capacities) != len(depot_nodes), require capacity for each vehicle"
+        )
+    if _given(site_eta) and len(site_eta) != n_locations:
+        raise Exception(
+            "len(time_matrix) != len(site_eta), require site eta for all locations"
+        )
+    if _given(delivery_weights) and len(delivery_weights) != len(delivery_pairs):
+        raise Exception(
+            "len(delivery_weights) != len(delivery_pairs), require delivery weights for all delivery pairs"
+        )
+    if _given(time_worked) and len(time_worked) != n_vehicles:
+        raise Exception(
+            "len(time_worked) != len(depot_nodes), require time worked for all vehicles"
+        )
+    if drop_penalties is not None:
+        if len(drop_penalties) != len(delivery_pairs):
             raise Exception(
-                "len(vehicle_capacities) != len(depot_nodes), require capacity for each vehicle"
+                "len(drop_penalties) != len(delivery_pairs), require a drop penalty for all delivery pairs"
             )
-    if site_eta:
-        try:
-            assert n_locations == len(site_eta)
-        except:
+        if np.any(np.asarray(drop_penalties) < 0):
+            raise Exception("drop_penalties must not be negative")
+    for name, (weights, capacities) in (capacity_dimensions or {}).items():
+        if name in [TIME_DIMENSION, CAPACITY_DIMENSION]:
+            raise Exception(f"capacity dimension name {name} is reserved")
+        if len(weights) != len(delivery_pairs) or len(capacities) != n_vehicles:
             raise Exception(
-                "len(time_matrix) != len(site_eta), require site eta for all locations"
+                f"capacity dimension {name} requires a weight for all delivery pairs and a capacity for each vehicle"
             )
 
-    if delivery_weights:
-        try:
-            assert len(delivery_weights) == len(delivery_pairs)
-        except:
-            raise Exception(
-                "len(delivery_weights) != len(delivery_pairs), require delivery weights for all delivery pairs"
-            )
+    drivers = np.asarray(driver_indicies, dtype=np.int64)
+    pairs = np.asarray(delivery_pairs, dtype=np.int64).reshape(-1, 2)
+    outside = (drivers < 0) | (drivers >= n_locations)
+    if outside.any():
+        raise Exception(
+            f"Drivers {np.flatnonzero(outside).tolist()} start outside the time matrix"
+        )
+    outside = ((pairs < 0) | (pairs >= n_locations)).any(axis=1)
+    if outside.any():
+        raise Exception(
+            f"Delivery pairs {_pair_list(pairs[outside])} are outside the time matrix"
+        )
+    is_depot = np.zeros(n_locations, dtype=bool)
+    is_depot[drivers] = True
+    delivering = pairs[:, 0] != pairs[:, 1]
+    at_depot = delivering & is_depot[pairs].any(axis=1)
+    if at_depot.any():
+        raise Exception(
+            f"Delivery pairs {_pair_list(pairs[at_depot])} pick up or deliver at a drivers location"
+        )
 
-    if time_worked:
-        try:
-            assert len(time_worked) == n_vehicles
-        except:
-            raise Exception(
-                "len(time_worked) != len(depot_nodes), require time worked for all vehicles"
-            )
+    worked = (
+        np.asarray(time_worked, dtype=np.int64)
+        if _given(time_worked)
+        else np.zeros(n_vehicles, dtype=np.int64)
+    )
+    overworked = worked > max_time
+    if overworked.any():
+        raise Exception(
+            f"Drivers {np.flatnonzero(overworked).tolist()} have already worked more than max_time"
+        )
+
+    # every other location is visited too, as a pair of itself
+    unpaired = ~is_depot
+    unpaired[pairs] = False
+    loose = np.flatnonzero(unpaired)
+    visits = np.concatenate([pairs, np.stack([loose, loose], axis=1)])
+    pickups, deliveries = visits[:, 0], visits[:, 1]
+    single = pickups == deliveries
+
+    # (vehicle, visit) time of the round trip from each drivers location
+    matrix = time_matrix if is_triangle(time_matrix) else np.asarray(time_matrix)
+    eta = (
+        np.asarray(site_eta, dtype=np.int64)
+        if _given(site_eta)
+        else np.zeros(n_locations, dtype=np.int64)
+    )
+
+    def transit(origins: np.ndarray, destinations: np.ndarray) -> np.ndarray:
+        if is_triangle(matrix):
+            times = matrix[triangle_positions(n_locations, origins, destinations)]
+        else:
+            times = matrix[origins, destinations]
+        return times.astype(np.int64) + eta[origins]
+
+    round_trip = (
+        transit(drivers[:, np.newaxis], pickups[np.newaxis, :])
+        + np.where(single, 0, transit(pickups, deliveries))
+        + transit(deliveries[np.newaxis, :], drivers[:, np.newaxis])
+    )
+    in_time = worked[:, np.newaxis] + round_trip <= max_time
+
+    # (vehicle, visit) whether the vehicle can carry the delivery
+    fits = np.ones_like(in_time)
+    capacities = list((capacity_dimensions or {}).values())
+    if _given(delivery_weights) and _given(vehicle_capacities):
+        capacities.append((delivery_weights, vehicle_capacities))
+    for weights, vehicle_capacity in capacities:
+        # only pairs picking up and delivering load a vehicle
+        load = np.zeros(len(visits), dtype=np.int64)
+        load[: len(pairs)] = np.where(delivering, weights, 0)
+        fits &= load[np.newaxis, :] <= np.asarray(vehicle_capacity)[:, np.newaxis]
+
+    # dropped pairs need no driver, only locations in no pair must be served
+    if drop_penalties is not None:
+        in_time[:, : len(pairs)] = True
+        fits[:, : len(pairs)] = True
+
+    problems = []
+    too_long = ~in_time.any(axis=0)
+    if too_long.any():
+        problems.append(
+            f"delivery pairs {_pair_list(visits[too_long])} take longer than max_time for every driver"
+        )
+    too_heavy = ~fits.any(axis=0)
+    if too_heavy.any():
+        problems.append(
+            f"delivery pairs {_pair_list(visits[too_heavy])} exceed the capacity of every vehicle"
+        )
+    no_driver = ~(in_time & fits).any(axis=0) & ~too_long & ~too_heavy
+    if no_driver.any():
+        problems.append(
+            f"delivery pairs {_pair_list(visits[no_driver])} have no driver with both the time and capacity for them"
+        )
+    if problems:
+        raise Exception("No solution possible, " + "; ".join(problems))
+
+
+def _given(values: Optional[List[int]]) -> bool:
+    """Whether an optional list or array was given with values, empty lists count as not given"""
+    return values is not None and len(values) > 0
+
+
+def _pair_list(pairs: np.ndarray) -> List[Tuple[int, int]]:
+    return [tuple(pair) for pair in pairs.tolist()]
@@ -0,0 +1,172 @@
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple, Union
+import numpy as np
+
+from src.models.columnar_schedule import ColumnarSchedules, DriverColumns
+from src.models.schedule import Schedule
+from src.tasks.routing import Router
+
+
+def solve_routes(
+    routing_model: Router,
+    time_matrix: Union[np.ndarray, List[List[int]]],
+    driver_indicies: List[int],
+    delivery_pairs: List[Tuple[int, int]],
+    delivery_weights: Optional[List[int]] = None,
+    vehicle_capacities: Optional[List[int]] = None,
+    site_eta: Optional[List[int]] = None,
+    time_worked: Optional[List[int]] = None,
+    max_time: int = 28800,
+    capacity_dimensions: Optional[Dict[str, Tuple[List[int], List[int]]]] = None,
+    initial_routes: Optional[List[List[int]]] = None,
+    drop_penalties: Optional[List[int]] = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Solve the routing problem, will raise exception if no solution found
+
+    Args:
+        routing_model (Router): router used to solve
+        see Router.solve for remaining args
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: visited locations and cumulative times of all drivers, see Router.extract_routes
+    """
+    routing_model.solve(
+        time_matrix=time_matrix,
+        driver_indicies=driver_indicies,
+        delivery_pairs=delivery_pairs,
+        delivery_weights=delivery_weights,
+        vehicle_capacities=vehicle_capacities,
+        site_eta=site_eta,
+        time_worked=time_worked,
+        max_time=max_time,
+        capacity_dimensions=capacity_dimensions,
+        initial_routes=initial_routes,
+        drop_penalties=drop_penalties,
+    )
+    start = time.perf_counter()
+    nodes, times, offsets = routing_model.extract_routes()
+    routing_model.timings["extract"] = time.perf_counter() - start
+    return nodes, times, offsets
+
+
+def build_schedules(
+    routes: List[List[int]],
+    times: List[List[int]],
+    location_names: Optional[List[str]] = None,
+    reference_time: Optional[datetime] = None,
+) -> List[Schedule]:
+    """Schedule for each driver from their solved route and times
+
+    Args:
+        routes (List[List[int]]): location indicies visited by each driver
+        times (List[List[int]]): cumulative time at each visited location
+        location_names (Optional[List[str]]): Names of locations in the time matrix
+        reference_time (Optional[datetime]): time every driver starts from, now if not given
+
+    Returns:
+        List[Schedule]: Schedule for each driver
+    """
+    if reference_time is None:
+        reference_time = datetime.now()
+    return [
+        Schedule.from_raw(
+            driver_id=i,
+            route=route,
+            time=time,
+            locations=location_names,
+            reference_time=reference_time,
+        )
+        for i, (route, time) in enumerate(zip(routes, times))
+    ]
+
+
+def build_columns(
+    nodes: np.ndarray,
+    times: np.ndarray,
+    offsets: np.ndarray,
+    reference_time: Optional[datetime] = None,
+) -> ColumnarSchedules:
+    """Columnar schedules computed from the flat arrays of a solution without building a model per leg
+
+    Args:
+        nodes (np.ndarray): visited locations of all drivers concatenated, see Router.extract_routes
+        times (np.ndarray): cumulative time at each visited location
+        offsets (np.ndarray): end offset of each driver in nodes and times
+        reference_time (Optional[datetime]): time every driver starts from, now if not given
+
+    Returns:
+        ColumnarSchedules: nodes, leg durations and arrival offsets of each driver
+    """
+    if reference_time is None:
+        reference_time = datetime.now()
+    starts = np.concatenate([[0], offsets[:-1]]).astype(np.int64)
+    # time already worked before the request is not counted, as in Schedule.from_raw
+    arrival_offsets = times - np.repeat(times[starts], offsets - starts)
+    durations = np.diff(times)
+    return ColumnarSchedules.construct(
+        reference_time=reference_time,
+        drivers=[
+            DriverColumns.construct(
+                driver=i,
+                nodes=nodes[start:end].tolist(),
+                # legs crossing into the next driver are dropped
+                durations=durations[start : end - 1].tolist(),
+                arrival_offsets=arrival_offsets[start:end].tolist(),
+            )
+            for i, (start, end) in enumerate(zip(starts, offsets))
+        ],
+    )
+
+
+def dropped_pairs(
+    nodes: np.ndarray, delivery_pairs: List[Tuple[int, int]]
+) -> List[Tuple[int, int]]:
+    """Delivery pairs left unserved by a solution solved with drop_penalties
+
+    Args:
+        nodes (np.ndarray): visited locations of all drivers concatenated, see Router.extract_routes
+        delivery_pairs (List[Tuple[int, int]]): (pickup index, delivery index) for each delivery
+
+    Returns:
+        List[Tuple[int, int]]: pairs whose pickup no driver visits, in the order they were given
+    """
+    pairs = np.asarray(delivery_pairs, dtype=np.int64).reshape(-1, 2)
+    # a pickup and its delivery are always dropped together
+    dropped = ~np.isin(pairs[:, 0], nodes)
+    return [tuple(pair) for pair in pairs[dropped].tolist()]
+
+
+def routes_from_schedules(
+    schedules: List[Schedule], location_names: Optional[List[str]] = None
+) -> List[List[int]]:
+    """Locations visited by each driver in previously returned schedules, the inverse of build_schedules
+
+    Locations are matched by name so indicies may change between requests, names no longer in location_names are dropped
+
+    Args:
+        schedules (List[Schedule]): Schedule for each driver
+        location_names (Optional[List[str]]): Names of locations in the time matrix, if not given names are the location indicies
+
+    Returns:
+        List[List[int]]: location indicies visited by each driver ordered by driver id
+    """
+    if location_names:
+        indicies = {}
+        for i, name in enumerate(location_names):
+            indicies.setdefault(name, i)
+    else:
+        indicies = None
+
+    def index(name: str) -> Optional[int]:
+        if indicies is not None:
+            return indicies.get(name)
+        return int(name) if name.isdigit() else None
+
+    routes = []
+    for schedule in sorted(schedules, key=lambda schedule: schedule.driver.id):
+        names = [leg.start.name for leg in schedule.route[:1]] + [
+            leg.end.name for leg in schedule.route
+        ]
+        routes.append([i for i in map(index, names) if i is not None])
+    return routes
@@ -0,0 +1,70 @@
+from typing import Any, Dict, Optional
+from ortools.constraint_solver import pywrapcp, routing_enums_pb2
+
+FirstSolutionStrategy = routing_enums_pb2.FirstSolutionStrategy
+LocalSearchMetaheuristic = routing_enums_pb2.LocalSearchMetaheuristic
+
+# trade offs between latency and solution quality
+SEARCH_PRESETS: Dict[str, Dict[str, Any]] = {
+    # interactive dispatch, greedy descent to the first local optimum
+    "fast": dict(
+        first_solution_strategy=FirstSolutionStrategy.PATH_CHEAPEST_ARC,
+        local_search_metaheuristic=LocalSearchMetaheuristic.GREEDY_DESCENT,
+        time_limit=1,
+    ),
+    # same as SEARCH_PARAMS
+    "balanced": dict(
+        first_solution_strategy=FirstSolutionStrategy.PATH_CHEAPEST_ARC,
+        local_search_metaheuristic=LocalSearchMetaheuristic.AUTOMATIC,
+        time_limit=10,
+    ),
+    # planning runs, keeps escaping local optima until the time limit
+    "quality": dict(
+        first_solution_strategy=FirstSolutionStrategy.PARALLEL_CHEAPEST_INSERTION,
+        local_search_metaheuristic=LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH,
+        time_limit=300,
+    ),
+}
+DEFAULT_PRESET = "balanced"
+
+
+def search_params(
+    preset: str = DEFAULT_PRESET,
+    time_limit: Optional[float] = None,
+    solution_limit: Optional[int] = None,
+    metaheuristic: Optional[str] = None,
+    lns_time_limit: Optional[float] = None,
+) -> pywrapcp.DefaultRoutingSearchParameters:
+    """New search parameters from a preset with any given fields overriding it
+
+    Args:
+        preset (str): key of SEARCH_PRESETS
+        time_limit (Optional[float]): seconds the search may run for
+        solution_limit (Optional[int]): stop after this many solutions
+        metaheuristic (Optional[str]): name of the local search metaheuristic e.g. GUIDED_LOCAL_SEARCH
+        lns_time_limit (Optional[float]): seconds each large neighbourhood search completion may take
+
+    Returns:
+        pywrapcp.DefaultRoutingSearchParameters: parameters owned by the caller
+    """
+    if preset not in SEARCH_PRESETS:
+        raise Exception(
+            f"Unknown search preset {preset}, expected one of {list(SEARCH_PRESETS)}"
+        )
+    values = SEARCH_PRESETS[preset]
+
+    params = pywrapcp.DefaultRoutingSearchParameters()
+    params.first_solution_strategy = values["first_solution_strategy"]
+    params.local_search_metaheuristic = values["local_search_metaheuristic"]
+    params.time_limit.FromMilliseconds(
+        int((values["time_limit"] if time_limit is None else time_limit) * 1000)
+    )
+    if solution_limit is not None:
+        params.solution_limit = solution_limit
+    if metaheuristic is not None:
+        params.local_search_metaheuristic = LocalSearchMetaheuristic.Value.Value(
+            metaheuristic.upper()
+        )
+    if lns_time_limit is not None:
+        params.lns_time_limit.FromMilliseconds(int(lns_time_limit * 1000))
+    return params
@@ -0,0 +1,67 @@
+import asyncio
+import queue
+from concurrent.futures import Future
+from typing import AsyncIterator, List, Optional, Tuple
+
+from src.models.solution_event import SolutionEvent
+from src.tasks.pool import PackedRoutes, unpack_routes
+from src.tasks.schedule import build_schedules, dropped_pairs
+
+# seconds between checks for improving solutions
+POLL_INTERVAL = 0.05
+
+
+async def stream_solutions(
+    future: Future,
+    progress: queue.Queue,
+    location_names: Optional[List[str]] = None,
+    droppable: Optional[List[Tuple[int, int]]] = None,
+) -> AsyncIterator[Tuple[bool, SolutionEvent]]:
+    """Schedules of each improving solution while a solve submitted with progress runs, then of the final solution
+
+    Solutions found between checks are skipped in favour of the latest so slow readers are not left behind.
+    Raises the error of the solve if it fails.
+
+    Args:
+        future (Future): solve submitted to SolverPool.submit with progress
+        progress (queue.Queue): the progress queue the solve was submitted with
+        location_names (Optional[List[str]]): Names of locations in the time matrix
+        droppable (Optional[List[Tuple[int, int]]]): delivery pairs of a solve with drop_penalties, each event lists those left unserved
+
+    Returns:
+        AsyncIterator[Tuple[bool, SolutionEvent]]: whether the solution is final, and its schedules and objective
+    """
+    try:
+        while True:
+            # checked before draining so nothing put before the solve finished is missed
+            done = future.done()
+            latest = None
+            while True:
+                try:
+                    latest = progress.get_nowait()
+                except queue.Empty:
+                    break
+            # the final solution is the latest improvement
+            if done:
+                break
+            if latest is not None:
+                yield False, _event(latest, location_names, droppable)
+            await asyncio.sleep(POLL_INTERVAL)
+        yield True, _event(future.result(), location_names, droppable)
+    finally:
+        # reader stopped e.g. the client disconnected, a solve not started yet is dropped
+        future.cancel()
+
+
+def _event(
+    packed: PackedRoutes,
+    location_names: Optional[List[str]],
+    droppable: Optional[List[Tuple[int, int]]],
+) -> SolutionEvent:
+    return SolutionEvent(
+        objective=packed.objective,
+        schedules=build_schedules(*unpack_routes(packed), location_names),
+        dropped_pairs=None
+        if droppable is None
+        else dropped_pairs(packed.nodes, droppable),
+    )
@@ -1,47 +1,88 @@
-from typing import Any, List
-import requests
+import asyncio
+import math
+import random
+from typing import Any, List, Optional, Union
+import httpx
 import numpy as np
 
-from src.core.config import API_KEY, API_ADDRESS
+from src.core.config import (
+    API_KEY,
+    API_ADDRESS,
+    MATRIX_CONCURRENCY,
+    MATRIX_TIMEOUT,
+    MATRIX_RETRIES,
+    MATRIX_BACKOFF,
+)
+from src.tasks.matrix_codec import triangle_index, unpack_triangle
 
 
 # Distance Matrix API only accepts 100 elements per request.
 MAX_ELEMENTS = 100
+# response statuses worth retrying after backing off
+RETRY_STATUSES = ["OVER_QUERY_LIMIT", "UNKNOWN_ERROR"]
 
 
-def get_time_matrix(
-    locations: List[str], driver_indicies: List[int], return_home: bool = True
+def create_client() -> httpx.AsyncClient:
+    """Client with a connection pool sized to the number of concurrent requests"""
+    return httpx.AsyncClient(
+        timeout=MATRIX_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=MATRIX_CONCURRENCY,
+            max_keepalive_connections=MATRIX_CONCURRENCY,
+        ),
+    )
+
+
+async def get_time_matrix(
+    locations: List[Any],
+    driver_indicies: List[int],
+    return_home: bool = True,
+    client: Optional[httpx.AsyncClient] = None,
+    coordinates: bool = False,
+    symmetric: bool = False,
 ) -> List[List[int]]:
     """Create a time matrix to represent distance between locations
 
     Args:
-        locations (List[str]): Names of locations of interest
+        locations (List[Any]): Names of locations of interest, or (lat, long) tuples if coordinates
         driver_indicies (List[int]): indicies of locations that relate to a driver
         return_home (bool, optional): Whether or not to include returning to home as a distance. Defaults to True.
+        client (Optional[httpx.AsyncClient]): client requests are sent with, a new one is created if not given
+        coordinates (bool): flags whether lat long tuples passed or address strings
+        symmetric (bool): treat travel times as the same in both directions, only the upper triangle is requested and mirrored, see get_time_triangle
 
     Returns:
         List[List[int]]: Time matrix
     """
-    n_locations = len(locations)
-    # max rows per request such that max elements not exceeded
-    max_rows = MAX_ELEMENTS // n_locations
+    if client is None:
+        async with create_client() as client:
+            return await get_time_matrix(
+                locations,
+                driver_indicies,
+                return_home,
+                client,
+                coordinates,
+                symmetric,
+            )
 
-    # n full requests (MAX ELEMENTS achieved)
-    n_full, n_remaining = divmod(n_locations, max_rows)
-    distance_matrix = []
-
-    for i in range(n_full):
-        origin_addresses = locations[i * max_rows : (i + 1) * max_rows]
-        response = _send_request(origin_addresses, locations)
-        distance_matrix += _build_distance_matrix(response)
+    if symmetric:
+        if not return_home:
+            raise Exception(
+                "Symmetric time matrices include returning home, zeroing the times to drivers would make them asymmetric"
+            )
+        return unpack_triangle(
+            await get_time_triangle(locations, client, coordinates)
+        ).tolist()
 
-    # Get the remaining remaining n_remaining rows, if necessary.
-    if n_remaining > 0:
-        origin_addresses = locations[
-            n_full * max_rows : n_full * max_rows + n_remaining
-        ]
-        response = _send_request(origin_addresses, locations)
-        distance_matrix += _build_distance_matrix(response)
+    distance_matrix = (
+        await _request_matrix(
+            client,
+            asyncio.Semaphore(MATRIX_CONCURRENCY),
+            locations,
+            locations,
+            coordinates,
+        )
+    ).tolist()
 
     if not return_home:
         distance_matrix = np.array(distance_matrix)
@@ -52,12 +93,175 @@ def get_time_matrix(
     return distance_matrix
 
 
-def _send_request(
-    origin_addresses: List[Any], dest_addresses: List[Any], coordinates: bool = False
+async def get_time_triangle(
+    locations: List[Any],
+    client: Optional[httpx.AsyncClient] = None,
+    coordinates: bool = False,
+) -> np.ndarray:
+    """Packed upper triangle of the time matrix between locations, for travel times close enough to symmetric
+
+    Locations are requested in square blocks of at most MAX_ELEMENTS, only blocks on or above the
+    diagonal are sent so about half the elements of the full matrix are paid for.
+
+    Args:
+        locations (List[Any]): Names of locations of interest, or (lat, long) tuples if coordinates
+        client (Optional[httpx.AsyncClient]): client requests are sent with, a new one is created if not given
+        coordinates (bool): flags whether lat long tuples passed or address strings
+
+    Returns:
+        np.ndarray: int32 upper triangle including the diagonal, see pack_triangle
+    """
+    if client is None:
+        async with create_client() as client:
+            return await get_time_triangle(locations, client, coordinates)
+
+    n = len(locations)
+    side = math.isqrt(MAX_ELEMENTS)
+    semaphore = asyncio.Semaphore(MATRIX_CONCURRENCY)
+
+    async def get_block(i: int, j: int) -> List[List[int]]:
+        async with semaphore:
+            response = await _send_request(
+                client, locations[i : i + side], locations[j : j + side], coordinates
+            )
+        return _build_distance_matrix(response)
+
+    starts = [(i, j) for i in range(0, n, side) for j in range(i, n, side)]
+    blocks = await asyncio.gather(*[get_block(i, j) for i, j in starts])
+
+    packed = np.empty(n * (n + 1) // 2, dtype=np.int32)
+    for (i, j), block in zip(starts, blocks):
+        block = np.asarray(block, dtype=np.int32)
+        for row, times in enumerate(block, start=i):
+            # diagonal blocks only hold the row from the diagonal onwards
+            first = max(row, j)
+            start = triangle_index(n, row, first)
+            packed[start : start + j + len(times) - first] = times[first - j :]
+    return packed
+
+
+async def extend_time_matrix(
+    matrix: Union[np.ndarray, List[List[int]]],
+    locations: List[Any],
+    new_locations: List[Any],
+    driver_indicies: List[int],
+    return_home: bool = True,
+    client: Optional[httpx.AsyncClient] = None,
+    coordinates: bool = False,
+) -> np.ndarray:
+    """Add locations to a time matrix, only the rows and columns of the new locations are requested
+
+    Args:
+        matrix (Union[np.ndarray, List[List[int]]]): time matrix between locations
+        locations (List[Any]): locations of the rows and columns of matrix, as given to get_time_matrix
+        new_locations (List[Any]): locations added after the existing ones
+        driver_indicies (List[int]): indicies of locations that relate to a driver, unchanged by the new locations
+        return_home (bool, optional): Whether or not the matrix includes returning to home, as given to get_time_matrix
+        client (Optional[httpx.AsyncClient]): client requests are sent with, a new one is created if not given
+        coordinates (bool): flags whether lat long tuples passed or address strings
+
+    Returns:
+        np.ndarray: int32 time matrix of locations followed by new_locations
+    """
+    if client is None:
+        async with create_client() as client:
+            return await extend_time_matrix(
+                matrix,
+                locations,
+                new_locations,
+                driver_indicies,
+                return_home,
+                client,
+                coordinates,
+            )
+
+    matrix = np.asarray(matrix, dtype=np.int32)
+    n_old = len(locations)
+    if matrix.shape != (n_old, n_old):
+        raise Exception(
+            f"Time matrix of shape {matrix.shape} does not match {n_old} locations"
+        )
+    all_locations = list(locations) + list(new_locations)
+
+    semaphore = asyncio.Semaphore(MATRIX_CONCURRENCY)
+    new_rows, new_columns = await asyncio.gather(
+        _request_matrix(client, semaphore, new_locations, all_locations, coordinates),
+        _request_matrix(client, semaphore, locations, new_locations, coordinates),
+    )
+    extended = np.empty((len(all_locations), len(all_locations)), dtype=np.int32)
+    extended[:n_old, :n_old] = matrix
+    extended[:n_old, n_old:] = new_columns
+    extended[n_old:] = new_rows
+
+    if not return_home:
+        # as in get_time_matrix, the new rows also travel home for free
+        extended[:, driver_indicies] = 0
+    return extended
+
+
+async def _request_matrix(
+    client: httpx.AsyncClient,
+    semaphore: asyncio.Semaphore,
+    origins: List[Any],
+    destinations: List[Any],
+    coordinates: bool = False,
+) -> np.ndarray:
+    """Times from each origin to each destination, requested in blocks of at most MAX_ELEMENTS
+
+    Args:
+        client (httpx.AsyncClient): client requests are sent with
+        semaphore (asyncio.Semaphore): limits the requests sent at once
+        origins (List[Any]): rows of the matrix
+        destinations (List[Any]): columns of the matrix
+        coordinates (bool): flags whether lat long tuples passed or address strings
+
+    Returns:
+        np.ndarray: int32 matrix of len(origins) rows and len(destinations) columns
+    """
+    if not origins or not destinations:
+        return np.zeros((len(origins), len(destinations)), dtype=np.int32)
+
+    # whole rows per request where they fit, otherwise rows split into columns blocks
+    max_cols = min(len(destinations), MAX_ELEMENTS)
+    max_rows = MAX_ELEMENTS // max_cols
+
+    async def get_block(i: int, j: int) -> List[List[int]]:
+        async with semaphore:
+            response = await _send_request(
+                client,
+                origins[i : i + max_rows],
+                destinations[j : j + max_cols],
+                coordinates,
+            )
+        return _build_distance_matrix(response)
+
+    starts = [
+        (i, j)
+        for i in range(0, len(origins), max_rows)
+        for j in range(0, len(destinations), max_cols)
+    ]
+    blocks = await asyncio.gather(*[get_block(i, j) for i, j in starts])
+
+    matrix = np.empty((len(origins), len(destinations)), dtype=np.int32)
+    for (i, j), block in zip(starts, blocks):
+        block = np.asarray(block, dtype=np.int32)
+        matrix[i : i + len(block), j : j + block.shape[1]] = block
+    return matrix
+
+
+async def _send_request(
+    client: httpx.AsyncClient,
+    origin_addresses: List[Any],
+    dest_addresses: List[Any],
+    coordinates: bool = False,
 ) -> dict:
     """Build and send request for the given origin and destination addresses.
 
+    Requests failing due to rate limits or network errors are retried MATRIX_RETRIES times,
+    waiting an exponentially growing random time in between.
+
     Args:
+        client (httpx.AsyncClient): client the request is sent with
         origin_addresses (List[Any]): Can be str addresses or tuples of coordinates
         dest_addresses (List[Any]): Can be str addresses or tuples of coordinates
         coordinates (bool): flags whether lat long tuples passed or address strings
@@ -84,17 +288,37 @@ def _send_request(
         else build_address_str(dest_addresses)
     )
 
-    # API request
-    res = requests.get(
-        API_ADDRESS,
-        params={
-            "units": "imperial",  # response in english
-            "origins": origin_address_str,
-            "destinations": dest_address_str,
-            "key": API_KEY,
-        },
-    )
-    return res.json()
+    for attempt in range(MATRIX_RETRIES + 1):
+        try:
+            # API request
+            res = await client.get(
+                API_ADDRESS,
+                params={
+                    "units": "imperial",  # response in english
+                    "origins": origin_address_str,
+                    "destinations": dest_address_str,
+                    "key": API_KEY,
+                },
+            )
+            res.raise_for_status()
+        except httpx.HTTPError as e:
+            # timeouts, connection and server errors may be transient
+            error = f"{type(e).__name__} {e}".strip()
+        else:
+            res_json = res.json()
+            status = res_json.get("status", "OK")
+            if status == "OK":
+                return res_json
+            error = f"{status} {res_json.get('error_message', '')}".strip()
+            if status not in RETRY_STATUSES:
+                # request itself is invalid so retrying won't help
+                raise Exception(f"Distance Matrix request failed: {error}")
+
+        if attempt < MATRIX_RETRIES:
+            # full jitter so concurrent requests don't retry in lockstep
+            await asyncio.sleep(random.uniform(0, MATRIX_BACKOFF * 2**attempt))
+
+    raise Exception(f"Distance Matrix request failed: {error}")
 
 
 def _build_distance_matrix(
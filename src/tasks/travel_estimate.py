@@ -0,0 +1,94 @@
+from typing import List, Optional, Tuple
+import numpy as np
+
+
+# mean earth radius in metres
+EARTH_RADIUS = 6371008.8
+# average travel speed of each profile in metres per second
+SPEED_PROFILES = {
+    "car": 50 / 3.6,
+    "van": 45 / 3.6,
+    "truck": 40 / 3.6,
+    "bicycle": 15 / 3.6,
+    "walking": 5 / 3.6,
+}
+# ratio of road distance to straight line distance
+DETOUR_FACTOR = 1.3
+
+
+def haversine_matrix(coordinates: List[Tuple[float, float]]) -> np.ndarray:
+    """Great circle distance in metres between every pair of (lat, long) coordinates"""
+    lat, lon = np.radians(np.asarray(coordinates, dtype=np.float64)).T
+    dlat = lat[np.newaxis, :] - lat[:, np.newaxis]
+    dlon = lon[np.newaxis, :] - lon[:, np.newaxis]
+    a = (
+        np.sin(dlat / 2) ** 2
+        + np.cos(lat)[:, np.newaxis]
+        * np.cos(lat)[np.newaxis, :]
+        * np.sin(dlon / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def calibrate(
+    coordinates: List[Tuple[float, float]], time_matrix: List[List[int]]
+) -> Tuple[float, float]:
+    """Fit durations fetched for the coordinates as seconds per metre of straight line distance plus a fixed overhead
+
+    Args:
+        coordinates (List[Tuple[float, float]]): (lat, long) of each location
+        time_matrix (List[List[int]]): durations between the locations e.g. from the Distance Matrix API
+
+    Returns:
+        Tuple[float, float]: seconds per metre and seconds added to every trip
+    """
+    distances = haversine_matrix(coordinates)
+    durations = np.asarray(time_matrix, dtype=np.float64)
+    # trips to the same location carry no information
+    off_diagonal = ~np.eye(len(distances), dtype=bool)
+    x, y = distances[off_diagonal], durations[off_diagonal]
+    seconds_per_metre, overhead = np.linalg.lstsq(
+        np.stack([x, np.ones_like(x)], axis=1), y, rcond=None
+    )[0]
+    return float(seconds_per_metre), float(max(overhead, 0))
+
+
+def estimate_time_matrix(
+    coordinates: List[Tuple[float, float]],
+    driver_indicies: List[int],
+    return_home: bool = True,
+    speed_profile: str = "car",
+    detour_factor: float = DETOUR_FACTOR,
+    calibration: Optional[Tuple[float, float]] = None,
+) -> np.ndarray:
+    """Estimate travel times between coordinates without calling an external API
+
+    Args:
+        coordinates (List[Tuple[float, float]]): (lat, long) of each location
+        driver_indicies (List[int]): indicies of locations that relate to a driver
+        return_home (bool, optional): Whether or not to include returning to home as a distance. Defaults to True.
+        speed_profile (str): key of SPEED_PROFILES giving the average speed
+        detour_factor (float): ratio of road distance to straight line distance
+        calibration (Optional[Tuple[float, float]]): (seconds per metre, overhead) from calibrate, replaces the speed profile and detour factor
+
+    Returns:
+        np.ndarray: int32 time matrix in seconds
+    """
+    if speed_profile not in SPEED_PROFILES:
+        raise Exception(
+            f"Unknown speed profile {speed_profile}, expected one of {list(SPEED_PROFILES)}"
+        )
+
+    distances = haversine_matrix(coordinates)
+    if calibration:
+        seconds_per_metre, overhead = calibration
+    else:
+        seconds_per_metre, overhead = detour_factor / SPEED_PROFILES[speed_profile], 0
+    durations = distances * seconds_per_metre + overhead
+
+    time_matrix = np.rint(durations).astype(np.int32)
+    np.fill_diagonal(time_matrix, 0)
+    if not return_home:
+        # all routes to starting driver locations given time of 0 so that not counted
+        time_matrix[:, driver_indicies] = 0
+    return time_matrix
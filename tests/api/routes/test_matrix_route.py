@@ -0,0 +1,167 @@
+import json
+import numpy as np
+import pytest
+from httpx import AsyncClient
+from fastapi import FastAPI
+from starlette.status import (
+    HTTP_200_OK,
+    HTTP_404_NOT_FOUND,
+    HTTP_409_CONFLICT,
+    HTTP_422_UNPROCESSABLE_ENTITY,
+    HTTP_503_SERVICE_UNAVAILABLE,
+)
+
+from src.api.routes.matrix_route import matrix_store
+from src.api.routes.time_route import http_client
+from src.tasks.matrix_store import MatrixStore
+from tests.tasks.test_time_matrix import FakeClient
+
+
+class TestMatrixRoute:
+    @pytest.mark.asyncio
+    async def test_put_and_schedule(
+        self,
+        app: FastAPI,
+        client: AsyncClient,
+        tmp_path,
+        mv_distance_matrix,
+        pickup_deliver,
+    ) -> None:
+        store = MatrixStore(str(tmp_path))
+        app.dependency_overrides[matrix_store] = lambda: store
+        try:
+            # catalog holds the locations in reverse
+            site_ids = [f"site-{i}" for i in range(len(mv_distance_matrix))]
+            reversed_matrix = [row[::-1] for row in mv_distance_matrix[::-1]]
+            res = await client.put(
+                app.url_path_for("matrices:put", matrix_id="sites"),
+                data=json.dumps(
+                    {
+                        "location_ids": site_ids[::-1],
+                        "time_matrix": reversed_matrix,
+                    }
+                ),
+            )
+            assert res.status_code == HTTP_200_OK
+            assert res.json() == {"id": "sites", "locations": len(site_ids)}
+
+            res = await client.get(app.url_path_for("matrices:get", matrix_id="sites"))
+            assert res.json()["locations"] == len(site_ids)
+            res = await client.get(app.url_path_for("matrices:get", matrix_id="other"))
+            assert res.status_code == HTTP_404_NOT_FOUND
+
+            data = {
+                "delivery_pairs": pickup_deliver,
+                "driver_indicies": [0] * 4,
+            }
+            params = {"preset": "fast", "time_limit": 1}
+            res = await client.post(
+                app.url_path_for("schedule:create"),
+                params=params,
+                data=json.dumps({**data, "time_matrix": mv_distance_matrix}),
+            )
+            expected = res.json()
+            res = await client.post(
+                app.url_path_for("schedule:create"),
+                params=params,
+                data=json.dumps(
+                    {**data, "matrix_id": "sites", "location_ids": site_ids}
+                ),
+            )
+            assert res.status_code == HTTP_200_OK
+            # same matrix so answered from the cache, stops named by location id
+            assert res.headers["X-Solver-Cache"] == "hit"
+            for schedule, expected_schedule in zip(res.json(), expected):
+                assert [leg["end"]["name"] for leg in schedule["route"]] == [
+                    f"site-{leg['end']['name']}" for leg in expected_schedule["route"]
+                ]
+
+            res = await client.post(
+                app.url_path_for("schedule:create"),
+                data=json.dumps(
+                    {**data, "matrix_id": "sites", "location_ids": ["unknown"]}
+                ),
+            )
+            assert res.status_code == HTTP_422_UNPROCESSABLE_ENTITY
+        finally:
+            app.dependency_overrides.clear()
+
+    @pytest.mark.asyncio
+    async def test_extend(self, app: FastAPI, client: AsyncClient, tmp_path) -> None:
+        store = MatrixStore(str(tmp_path))
+        fake_client = FakeClient()
+        app.dependency_overrides[matrix_store] = lambda: store
+        app.dependency_overrides[http_client] = lambda: fake_client
+        try:
+            expected = np.arange(6)[:, np.newaxis] * 100 + np.arange(6)
+            store.put("sites", ["a", "b", "c", "d"], expected[:4, :4])
+            addresses = ["0", "1", "2", "3", "4", "5"]
+
+            url = app.url_path_for("matrices:extend", matrix_id="sites")
+            # location ids are not addresses
+            res = await client.post(url, data=json.dumps({"location_ids": ["e", "f"]}))
+            assert res.status_code == HTTP_422_UNPROCESSABLE_ENTITY
+            res = await client.post(
+                url,
+                data=json.dumps({"location_ids": ["e", "f"], "addresses": ["4", "5"]}),
+            )
+            assert res.status_code == HTTP_422_UNPROCESSABLE_ENTITY
+            assert fake_client.requests == 0
+
+            res = await client.post(
+                url,
+                data=json.dumps({"location_ids": ["e", "f"], "addresses": addresses}),
+            )
+            assert res.status_code == HTTP_200_OK
+            assert res.json() == {"id": "sites", "locations": 6}
+            np.testing.assert_array_equal(store.get("sites").matrix, expected)
+            np.testing.assert_array_equal(
+                store.subset("sites", ["f", "a"]), [[505, 500], [5, 0]]
+            )
+            assert fake_client.requests == 2
+
+            res = await client.post(
+                url,
+                data=json.dumps(
+                    {"location_ids": ["f", "g"], "addresses": addresses + ["6"]}
+                ),
+            )
+            assert res.status_code == HTTP_422_UNPROCESSABLE_ENTITY
+        finally:
+            app.dependency_overrides.clear()
+
+    @pytest.mark.asyncio
+    async def test_extend_store_errors(
+        self, app: FastAPI, client: AsyncClient, tmp_path, monkeypatch
+    ) -> None:
+        store = MatrixStore(str(tmp_path))
+        fake_client = FakeClient()
+        app.dependency_overrides[matrix_store] = lambda: store
+        app.dependency_overrides[http_client] = lambda: fake_client
+        try:
+            store.put("sites", ["a", "b"], [[0, 1], [100, 0]])
+            url = app.url_path_for("matrices:extend", matrix_id="sites")
+            data = json.dumps({"location_ids": ["c"], "addresses": ["0", "1", "2"]})
+
+            # replaced by another upload while the new times were requested
+            get = store.get
+
+            def replaced(matrix_id):
+                stored = get(matrix_id)
+                MatrixStore(store.path).put("sites", ["a", "b"], [[0, 2], [200, 0]])
+                return stored
+
+            monkeypatch.setattr(store, "get", replaced)
+            res = await client.post(url, data=data)
+            assert res.status_code == HTTP_409_CONFLICT
+            monkeypatch.undo()
+            np.testing.assert_array_equal(store.get("sites").matrix, [[0, 2], [200, 0]])
+
+            def unwritable(*args, **kwargs):
+                raise OSError("No space left on device")
+
+            monkeypatch.setattr(np, "save", unwritable)
+            res = await client.post(url, data=data)
+            assert res.status_code == HTTP_503_SERVICE_UNAVAILABLE
+        finally:
+            app.dependency_overrides.clear()
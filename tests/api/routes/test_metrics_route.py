@@ -0,0 +1,44 @@
+import pytest
+from httpx import AsyncClient
+from fastapi import FastAPI
+from starlette.status import HTTP_200_OK
+import json
+
+
+class TestMetricsRoute:
+    @pytest.mark.asyncio
+    async def test_get_metrics(
+        self, app: FastAPI, client: AsyncClient, mv_distance_matrix, pickup_deliver
+    ) -> None:
+        res = await client.post(
+            app.url_path_for("schedule:create"),
+            # max_time makes the request unique so it is not answered from the cache
+            params={"max_time": 28801},
+            data=json.dumps(
+                {
+                    "time_matrix": mv_distance_matrix,
+                    "delivery_pairs": pickup_deliver,
+                    "driver_indicies": [0] * 4,
+                }
+            ),
+        )
+        assert res.status_code == HTTP_200_OK
+
+        res = await client.get(app.url_path_for("metrics:get"))
+        assert res.status_code == HTTP_200_OK
+        assert res.headers["content-type"].startswith("text/plain")
+
+        metrics = res.text
+        assert "# TYPE schedule_phase_seconds histogram" in metrics
+        for phase in [
+            "validate",
+            "check_inputs",
+            "build",
+            "solve",
+            "extract",
+            "schedules",
+            "serialize",
+        ]:
+            sample = f'schedule_phase_seconds_count{{phase="{phase}",size="11-25"}}'
+            assert sample in metrics
+        assert 'schedule_solve_outcomes_total{outcome="found",size="11-25"}' in metrics
@@ -4,17 +4,32 @@ from fastapi import FastAPI
 from starlette.status import (
     HTTP_404_NOT_FOUND,
     HTTP_200_OK,
+    HTTP_202_ACCEPTED,
+    HTTP_413_REQUEST_ENTITY_TOO_LARGE,
     HTTP_422_UNPROCESSABLE_ENTITY,
+    HTTP_429_TOO_MANY_REQUESTS,
 )
+import asyncio
+import gzip
 import json
+import threading
 import numpy as np
 
+from src.api import gzip as gzip_route
+from src.api.routes import schedule_route
+from src.api.routes.schedule_route import solution_cache, solver_pool
+from src.tasks.cache import SolutionCache
+from src.tasks.matrix_codec import encode_matrix, pack_triangle
+from src.tasks.pool import SolverPool, pack_inputs
+
 
 class TestScheduleRoute:
     @pytest.mark.asyncio
     async def test_routes_exist(self, app: FastAPI, client: AsyncClient) -> None:
         res = await client.post(app.url_path_for("schedule:create"))
         assert res.status_code != HTTP_404_NOT_FOUND
+        res = await client.post(app.url_path_for("schedule:create_job"))
+        assert res.status_code != HTTP_404_NOT_FOUND
 
     @pytest.mark.asyncio
     async def test_create_schedule(
@@ -47,3 +62,560 @@ class TestScheduleRoute:
             data=data,
         )
         assert res.status_code == HTTP_422_UNPROCESSABLE_ENTITY
+        # rejected before solving, naming the pairs no driver can serve
+        assert res.json()["detail"].startswith(
+            "No solution possible, delivery pairs [(1, 6), (2, 10), (4, 3)"
+        )
+
+    @pytest.mark.asyncio
+    async def test_create_schedule_with_capacity_dimensions(
+        self, app: FastAPI, client: AsyncClient, mv_distance_matrix
+    ) -> None:
+        data = json.dumps(
+            {
+                "time_matrix": np.array(mv_distance_matrix)[:7, :7].tolist(),
+                "delivery_pairs": [(1, 2), (3, 4), (5, 6)],
+                "driver_indicies": [0] * 3,
+                "capacity_dimensions": {
+                    "Volume": {
+                        "delivery_weights": [1, 2, 2],
+                        "vehicle_capacities": [0, 1, 2],
+                    }
+                },
+            }
+        )
+        res = await client.post(app.url_path_for("schedule:create"), data=data)
+        assert res.status_code == HTTP_200_OK
+        # vehicle 0 has no volume so never leaves the depot
+        assert len(res.json()[0]["route"]) == 1
+
+    @pytest.mark.asyncio
+    async def test_schedule_job(
+        self, app: FastAPI, client: AsyncClient, mv_distance_matrix, pickup_deliver
+    ) -> None:
+        data = json.dumps(
+            {
+                "time_matrix": mv_distance_matrix,
+                "delivery_pairs": pickup_deliver,
+                "driver_indicies": [0] * 4,
+            }
+        )
+        res = await client.post(app.url_path_for("schedule:create_job"), data=data)
+        assert res.status_code == HTTP_202_ACCEPTED
+        job_id = res.json()["id"]
+
+        # poll until solved
+        for _ in range(600):
+            res = await client.get(app.url_path_for("schedule:get_job", job_id=job_id))
+            assert res.status_code == HTTP_200_OK
+            if res.json()["status"] == "completed":
+                break
+            await asyncio.sleep(0.1)
+        assert len(res.json()["result"]) == 4
+
+        # finished jobs cannot be cancelled
+        res = await client.delete(
+            app.url_path_for("schedule:cancel_job", job_id=job_id)
+        )
+        assert res.json()["status"] == "completed"
+
+        res = await client.get(app.url_path_for("schedule:get_job", job_id="unknown"))
+        assert res.status_code == HTTP_404_NOT_FOUND
+        res = await client.delete(
+            app.url_path_for("schedule:cancel_job", job_id="unknown")
+        )
+        assert res.status_code == HTTP_404_NOT_FOUND
+
+    @pytest.mark.asyncio
+    async def test_create_schedule_too_many_requests(
+        self, app: FastAPI, client: AsyncClient, mv_distance_matrix, pickup_deliver
+    ) -> None:
+        data = {
+            "time_matrix": mv_distance_matrix,
+            "delivery_pairs": pickup_deliver,
+            "driver_indicies": [0] * 4,
+        }
+        # single worker already busy and nothing can queue
+        pool = SolverPool(max_workers=1, max_queue=0, solve_time=10)
+        pool.submit(pack_inputs(**data))
+        app.dependency_overrides[solver_pool] = lambda: pool
+        app.dependency_overrides[solution_cache] = lambda: SolutionCache(1, ttl=60)
+        try:
+            res = await client.post(
+                app.url_path_for("schedule:create"), data=json.dumps(data)
+            )
+        finally:
+            app.dependency_overrides.clear()
+        assert res.status_code == HTTP_429_TOO_MANY_REQUESTS
+        assert res.headers["Retry-After"] == "10"
+
+    @pytest.mark.asyncio
+    async def test_create_schedule_portfolio(
+        self, app: FastAPI, client: AsyncClient, mv_distance_matrix, pickup_deliver
+    ) -> None:
+        data = json.dumps(
+            {
+                "time_matrix": mv_distance_matrix,
+                "delivery_pairs": pickup_deliver,
+                "driver_indicies": [0] * 4,
+            }
+        )
+        res = await client.post(
+            app.url_path_for("schedule:create"),
+            params={"portfolio": True, "first_feasible": True},
+            data=data,
+        )
+        assert res.status_code == HTTP_200_OK
+        assert len(res.json()) == 4
+        assert "/" in res.headers["X-Solver-Strategy"]
+        assert int(res.headers["X-Solver-Objective"]) > 0
+
+    @pytest.mark.asyncio
+    async def test_create_schedule_from_previous(
+        self, app: FastAPI, client: AsyncClient, mv_distance_matrix, pickup_deliver
+    ) -> None:
+        data = {
+            "time_matrix": mv_distance_matrix,
+            "delivery_pairs": pickup_deliver[:-1],
+            "driver_indicies": [0] * 4,
+            "location_names": [f"location {i}" for i in range(17)],
+        }
+        res = await client.post(
+            app.url_path_for("schedule:create"), data=json.dumps(data)
+        )
+        assert res.status_code == HTTP_200_OK
+
+        # add a delivery to the previous schedule
+        data["delivery_pairs"] = pickup_deliver
+        data["previous_schedule"] = res.json()
+        res = await client.post(
+            app.url_path_for("schedule:create"), data=json.dumps(data)
+        )
+        assert res.status_code == HTTP_200_OK
+        visited = {
+            leg["end"]["name"] for schedule in res.json() for leg in schedule["route"]
+        }
+        assert visited == set(data["location_names"])
+
+    @pytest.mark.asyncio
+    async def test_create_schedule_cached(
+        self, app: FastAPI, client: AsyncClient, mv_distance_matrix, pickup_deliver
+    ) -> None:
+        data = {
+            "time_matrix": mv_distance_matrix,
+            "delivery_pairs": pickup_deliver,
+            "driver_indicies": [0] * 4,
+        }
+        cache = SolutionCache(10, ttl=60)
+        app.dependency_overrides[solution_cache] = lambda: cache
+        try:
+            headers = {"Idempotency-Key": "create-1"}
+            res = await client.post(
+                app.url_path_for("schedule:create"),
+                data=json.dumps(data),
+                headers=headers,
+            )
+            assert res.headers["X-Solver-Cache"] == "miss"
+
+            # retries are answered from the cache
+            retry = await client.post(
+                app.url_path_for("schedule:create"),
+                data=json.dumps(data),
+                headers=headers,
+            )
+            assert retry.headers["X-Solver-Cache"] == "hit"
+            assert [s["route"][0]["end"] for s in retry.json()] == [
+                s["route"][0]["end"] for s in res.json()
+            ]
+
+            # key cannot be reused for another request
+            res = await client.post(
+                app.url_path_for("schedule:create"),
+                params={"max_time": 28000},
+                data=json.dumps(data),
+                headers=headers,
+            )
+            assert res.status_code == HTTP_422_UNPROCESSABLE_ENTITY
+            assert "already used with a different request" in res.json()["detail"]
+        finally:
+            app.dependency_overrides.clear()
+
+    @pytest.mark.asyncio
+    async def test_create_schedule_binary_matrix(
+        self,
+        app: FastAPI,
+        client: AsyncClient,
+        mv_distance_matrix,
+        pickup_deliver,
+        monkeypatch,
+    ) -> None:
+        data = {
+            "time_matrix": mv_distance_matrix,
+            "delivery_pairs": pickup_deliver,
+            "driver_indicies": [0] * 4,
+        }
+        cache = SolutionCache(10, ttl=60)
+        app.dependency_overrides[solution_cache] = lambda: cache
+        try:
+            res = await client.post(
+                app.url_path_for("schedule:create"), data=json.dumps(data)
+            )
+            assert res.status_code == HTTP_200_OK
+
+            # same matrix sent as npy or raw int32, gzip compressed
+            for npy in [True, False]:
+                binary = dict(
+                    data, time_matrix_base64=encode_matrix(mv_distance_matrix, npy)
+                )
+                del binary["time_matrix"]
+                binary_res = await client.post(
+                    app.url_path_for("schedule:create"),
+                    content=gzip.compress(json.dumps(binary).encode()),
+                    headers={"Content-Encoding": "gzip"},
+                )
+                assert binary_res.status_code == HTTP_200_OK
+                # identical inputs so answered from the cache
+                assert binary_res.headers["X-Solver-Cache"] == "hit"
+                assert [
+                    [leg["end"] for leg in s["route"]] for s in binary_res.json()
+                ] == [[leg["end"] for leg in s["route"]] for s in res.json()]
+
+            # symmetric matrix sent as its packed upper triangle
+            triangle = dict(
+                data, time_matrix_triangle=pack_triangle(mv_distance_matrix).tolist()
+            )
+            del triangle["time_matrix"]
+            triangle_res = await client.post(
+                app.url_path_for("schedule:create"), data=json.dumps(triangle)
+            )
+            assert triangle_res.status_code == HTTP_200_OK
+            assert (
+                triangle_res.headers["X-Solver-Objective"]
+                == res.headers["X-Solver-Objective"]
+            )
+
+            # both matrices given
+            res = await client.post(
+                app.url_path_for("schedule:create"),
+                data=json.dumps(
+                    dict(data, time_matrix_base64=encode_matrix(mv_distance_matrix))
+                ),
+            )
+            assert res.status_code == HTTP_422_UNPROCESSABLE_ENTITY
+
+            # gzip bodies inflating past the limit are rejected
+            body = json.dumps(data).encode()
+            monkeypatch.setattr(gzip_route, "GZIP_MAX_SIZE", len(body) - 1)
+            res = await client.post(
+                app.url_path_for("schedule:create"),
+                content=gzip.compress(body),
+                headers={"Content-Encoding": "gzip"},
+            )
+            assert res.status_code == HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        finally:
+            app.dependency_overrides.clear()
+
+    @pytest.mark.asyncio
+    async def test_create_schedule_off_event_loop(
+        self,
+        app: FastAPI,
+        client: AsyncClient,
+        mv_distance_matrix,
+        pickup_deliver,
+        monkeypatch,
+    ) -> None:
+        threads = []
+
+        def record(function):
+            def wrapper(*args, **kwargs):
+                threads.append(threading.current_thread())
+                return function(*args, **kwargs)
+
+            return wrapper
+
+        for name in ["pack_inputs", "build_schedules"]:
+            monkeypatch.setattr(
+                schedule_route, name, record(getattr(schedule_route, name))
+            )
+        res = await client.post(
+            app.url_path_for("schedule:create"),
+            data=json.dumps(
+                {
+                    "time_matrix": mv_distance_matrix,
+                    "delivery_pairs": pickup_deliver,
+                    "driver_indicies": [0] * 4,
+                }
+            ),
+        )
+        assert res.status_code == HTTP_200_OK
+        # packing inputs and building schedules do not block the event loop
+        assert len(threads) == 2
+        assert threading.current_thread() not in threads
+
+    @pytest.mark.asyncio
+    async def test_create_schedule_search_params(
+        self, app: FastAPI, client: AsyncClient, mv_distance_matrix, pickup_deliver
+    ) -> None:
+        data = json.dumps(
+            {
+                "time_matrix": mv_distance_matrix,
+                "delivery_pairs": pickup_deliver,
+                "driver_indicies": [0] * 4,
+            }
+        )
+        res = await client.post(
+            app.url_path_for("schedule:create"),
+            params={
+                "preset": "quality",
+                "time_limit": 1,
+                "metaheuristic": "guided_local_search",
+                "improvement_window": 0.5,
+                "nearest_neighbors": 4,
+            },
+            data=data,
+        )
+        assert res.status_code == HTTP_200_OK
+        res = await client.post(
+            app.url_path_for("schedule:create"),
+            params={"preset": "fast", "precedence": "lifo"},
+            data=data,
+        )
+        assert res.status_code == HTTP_200_OK
+
+        for params in [
+            {"preset": "thorough"},
+            {"time_limit": 0},
+            {"nearest_neighbors": 0},
+            {"precedence": "random"},
+        ]:
+            res = await client.post(
+                app.url_path_for("schedule:create"), params=params, data=data
+            )
+            assert res.status_code == HTTP_422_UNPROCESSABLE_ENTITY
+
+    @pytest.mark.asyncio
+    async def test_create_schedule_decomposed(
+        self, app: FastAPI, client: AsyncClient, mv_distance_matrix, pickup_deliver
+    ) -> None:
+        data = json.dumps(
+            {
+                "time_matrix": mv_distance_matrix,
+                "delivery_pairs": pickup_deliver,
+                "driver_indicies": [0] * 4,
+            }
+        )
+        res = await client.post(
+            app.url_path_for("schedule:create"),
+            params={"decompose": True, "clusters": 2, "preset": "fast"},
+            data=data,
+        )
+        assert res.status_code == HTTP_200_OK
+        assert len(res.json()) == 4
+        visited = [leg["end"]["name"] for s in res.json() for leg in s["route"][:-1]]
+        assert sorted(map(int, visited)) == list(range(1, len(mv_distance_matrix)))
+
+        res = await client.post(
+            app.url_path_for("schedule:create"),
+            params={"decompose": True, "portfolio": True},
+            data=data,
+        )
+        assert res.status_code == HTTP_422_UNPROCESSABLE_ENTITY
+
+    @pytest.mark.asyncio
+    async def test_create_schedule_batch(
+        self, app: FastAPI, client: AsyncClient, mv_distance_matrix, pickup_deliver
+    ) -> None:
+        instance = {
+            "time_matrix": mv_distance_matrix,
+            "delivery_pairs": pickup_deliver,
+            "driver_indicies": [0] * 4,
+            "preset": "fast",
+        }
+        res = await client.post(
+            app.url_path_for("schedule:batch"),
+            data=json.dumps(
+                [
+                    {"id": "a", **instance},
+                    {"id": "b", **instance, "max_time": 0},
+                    {"id": "c", **instance},
+                ]
+            ),
+        )
+        assert res.status_code == HTTP_200_OK
+        assert res.headers["content-type"] == "application/x-ndjson"
+        results = {
+            result["id"]: result for result in map(json.loads, res.text.splitlines())
+        }
+        assert sorted(results) == ["a", "b", "c"]
+        assert len(results["a"]["result"]) == 4
+        assert len(results["c"]["result"]) == 4
+        # failures are reported inline
+        assert results["b"]["status"] == "failed"
+        assert results["b"]["error"].startswith("No solution possible")
+
+        res = await client.post(
+            app.url_path_for("schedule:batch"),
+            data=json.dumps([{"id": "a", **instance}, {"id": "a", **instance}]),
+        )
+        assert res.status_code == HTTP_422_UNPROCESSABLE_ENTITY
+
+    @pytest.mark.asyncio
+    async def test_create_schedule_stream(
+        self, app: FastAPI, client: AsyncClient, mv_distance_matrix, pickup_deliver
+    ) -> None:
+        request = {
+            "time_matrix": mv_distance_matrix,
+            "delivery_pairs": pickup_deliver,
+            "driver_indicies": [0] * 4,
+            "preset": "fast",
+        }
+        res = await client.post(
+            app.url_path_for("schedule:stream"), data=json.dumps(request)
+        )
+        assert res.status_code == HTTP_200_OK
+        assert res.headers["content-type"].startswith("text/event-stream")
+        events = []
+        for event in res.text.strip().split("\n\n"):
+            event_line, data_line = event.splitlines()
+            events.append(
+                (event_line[len("event: ") :], json.loads(data_line[len("data: ") :]))
+            )
+        assert {event_type for event_type, _ in events[:-1]} <= {"solution"}
+        event_type, result = events[-1]
+        assert event_type == "result"
+        assert len(result["schedules"]) == 4
+        assert result["objective"] > 0
+
+        # the search failing is the last event, each pair fits one driver but not all of them
+        res = await client.post(
+            app.url_path_for("schedule:stream"),
+            data=json.dumps({**request, "driver_indicies": [0], "max_time": 1780}),
+        )
+        assert res.text == 'event: error\ndata: {"detail": "Solution not found"}\n\n'
+
+        res = await client.post(
+            app.url_path_for("schedule:stream"),
+            data=json.dumps({**request, "decompose": True}),
+        )
+        assert res.status_code == HTTP_422_UNPROCESSABLE_ENTITY
+
+    @pytest.mark.asyncio
+    async def test_create_schedule_fast_json(
+        self,
+        app: FastAPI,
+        client: AsyncClient,
+        monkeypatch,
+        mv_distance_matrix,
+        pickup_deliver,
+    ) -> None:
+        data = json.dumps(
+            {
+                "time_matrix": mv_distance_matrix,
+                "delivery_pairs": pickup_deliver,
+                "driver_indicies": [0] * 4,
+            }
+        )
+        params = {"preset": "fast", "time_limit": 1}
+        res = await client.post(
+            app.url_path_for("schedule:create"), params=params, data=data
+        )
+        monkeypatch.setattr(schedule_route, "FAST_JSON", True)
+        fast_res = await client.post(
+            app.url_path_for("schedule:create"), params=params, data=data
+        )
+
+        assert fast_res.status_code == HTTP_200_OK
+        assert fast_res.headers["X-Solver-Cache"] == "hit"
+        assert (
+            fast_res.headers["X-Solver-Objective"] == res.headers["X-Solver-Objective"]
+        )
+        # same schedules apart from the arrival times
+        schedules, fast_schedules = res.json(), fast_res.json()
+        for schedule in [*schedules, *fast_schedules]:
+            for leg in schedule["route"]:
+                del leg["arrival_time"]
+        assert fast_schedules == schedules
+
+    @pytest.mark.asyncio
+    async def test_create_schedule_columnar(
+        self, app: FastAPI, client: AsyncClient, mv_distance_matrix, pickup_deliver
+    ) -> None:
+        data = json.dumps(
+            {
+                "time_matrix": mv_distance_matrix,
+                "delivery_pairs": pickup_deliver,
+                "driver_indicies": [0] * 4,
+            }
+        )
+        params = {"preset": "fast", "time_limit": 1}
+        res = await client.post(
+            app.url_path_for("schedule:create"), params=params, data=data
+        )
+        legs = res.json()
+        res = await client.post(
+            app.url_path_for("schedule:create"),
+            params={**params, "format": "columnar"},
+            data=data,
+        )
+        assert res.status_code == HTTP_200_OK
+        assert res.headers["X-Solver-Cache"] == "hit"
+        assert "X-Solver-Objective" in res.headers
+
+        # same solution as the legs format
+        drivers = res.json()["drivers"]
+        assert len(drivers) == len(legs) == 4
+        for driver, schedule in zip(drivers, legs):
+            route = schedule["route"]
+            assert driver["nodes"][1:] == [int(leg["end"]["name"]) for leg in route]
+            assert driver["durations"] == [leg["duration"] for leg in route]
+            assert len(driver["arrival_offsets"]) == len(driver["nodes"])
+
+    @pytest.mark.asyncio
+    async def test_create_schedule_drop_penalties(
+        self, app: FastAPI, client: AsyncClient, mv_distance_matrix, pickup_deliver
+    ) -> None:
+        request = {
+            "time_matrix": mv_distance_matrix,
+            "delivery_pairs": pickup_deliver,
+            "driver_indicies": [0],
+        }
+        params = {"preset": "fast", "max_time": 1780}
+        # every pair fits within max time but not all of them for a single driver
+        res = await client.post(
+            app.url_path_for("schedule:create"),
+            params=params,
+            data=json.dumps(request),
+        )
+        assert res.status_code == HTTP_422_UNPROCESSABLE_ENTITY
+
+        request["drop_penalties"] = [100000] * len(pickup_deliver)
+        res = await client.post(
+            app.url_path_for("schedule:create"),
+            params=params,
+            data=json.dumps(request),
+        )
+        assert res.status_code == HTTP_200_OK
+        assert "X-Solver-Objective" in res.headers
+        result = res.json()
+        (schedule,) = result["schedules"]
+        dropped = {tuple(pair) for pair in result["dropped_pairs"]}
+        served = {int(leg["end"]["name"]) for leg in schedule["route"]}
+        assert dropped and len(dropped) < len(pickup_deliver)
+        for pickup, delivery in pickup_deliver:
+            assert ((pickup, delivery) in dropped) != (pickup in served)
+
+        res = await client.post(
+            app.url_path_for("schedule:create"),
+            params={**params, "format": "columnar"},
+            data=json.dumps(request),
+        )
+        assert res.status_code == HTTP_200_OK
+        assert res.json()["dropped_pairs"] == result["dropped_pairs"]
+
+        # penalties are needed for every pair
+        res = await client.post(
+            app.url_path_for("schedule:create"),
+            params=params,
+            data=json.dumps({**request, "drop_penalties": [100000]}),
+        )
+        assert res.status_code == HTTP_422_UNPROCESSABLE_ENTITY
@@ -4,6 +4,8 @@ from fastapi import FastAPI
 from starlette.status import HTTP_404_NOT_FOUND, HTTP_200_OK
 import json
 
+from src.api.routes import time_route
+
 
 class TestTimeRoute:
     @pytest.mark.asyncio
@@ -35,3 +37,58 @@ class TestTimeRoute:
         assert isinstance(res.json()["matrix"], list)
         # from anywhere to depot should be 0 due to return home false
         assert res.json()["matrix"][1][0] == 0
+
+    @pytest.mark.asyncio
+    async def test_create_estimated_time_matrix(
+        self, app: FastAPI, client: AsyncClient, monkeypatch
+    ) -> None:
+        data = {
+            "locations": ["Dublin", "Cork"],
+            "driver_indicies": [0],
+            "coordinates": [[53.3498, -6.2603], [51.8985, -8.4756]],
+        }
+
+        res = await client.post(
+            app.url_path_for("time_matrix:create"),
+            params={"return_home": False, "provider": "estimate"},
+            data=json.dumps(data),
+        )
+
+        assert res.status_code == HTTP_200_OK
+        assert res.json()["locations"] == data["locations"]
+        assert res.json()["matrix"][1][0] == 0
+        assert res.json()["matrix"][0][1] > 0
+
+        res = await client.post(
+            app.url_path_for("time_matrix:create"),
+            params={"return_home": True, "provider": "estimate", "symmetric": True},
+            data=json.dumps(data),
+        )
+        assert res.json()["matrix"] is None
+        assert res.json()["triangle"][0] == res.json()["triangle"][2] == 0
+        assert res.json()["triangle"][1] > 0
+
+        # encoded straight from the estimated matrix
+        monkeypatch.setattr(time_route, "FAST_JSON", True)
+        fast_res = await client.post(
+            app.url_path_for("time_matrix:create"),
+            params={"return_home": True, "provider": "estimate", "symmetric": True},
+            data=json.dumps(data),
+        )
+        assert fast_res.json() == res.json()
+        monkeypatch.undo()
+        res = await client.post(
+            app.url_path_for("time_matrix:create"),
+            params={"return_home": False, "provider": "estimate", "symmetric": True},
+            data=json.dumps(data),
+        )
+        assert res.status_code == 422
+
+        # estimate needs coordinates
+        del data["coordinates"]
+        res = await client.post(
+            app.url_path_for("time_matrix:create"),
+            params={"return_home": False, "provider": "estimate"},
+            data=json.dumps(data),
+        )
+        assert res.status_code == 422
@@ -0,0 +1,39 @@
+import json
+from datetime import time
+
+import numpy as np
+import pytest
+
+from src.api import fast_json
+from src.models.driver import Driver
+from src.models.location import Location
+from src.models.route import Route
+from src.models.schedule import Schedule
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_dumps(monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(fast_json, "orjson", None)
+    schedule = Schedule(
+        driver=Driver(id=0),
+        route=[
+            Route(
+                id=0,
+                start=Location(name="a"),
+                end=Location(name="b"),
+                duration=60,
+                arrival_time=time(8, 1),
+            )
+        ],
+    )
+    matrix = np.arange(6, dtype=np.int32).reshape(2, 3)
+
+    content = json.loads(fast_json.dumps({"matrix": matrix, "schedules": [schedule]}))
+
+    assert content["matrix"] == matrix.tolist()
+    # encoded as the response_model would have
+    assert content["schedules"] == [json.loads(schedule.json())]
+
+    with pytest.raises(TypeError):
+        fast_json.dumps(object())
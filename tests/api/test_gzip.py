@@ -0,0 +1,30 @@
+import gzip
+
+import pytest
+from fastapi import HTTPException
+from starlette.status import HTTP_413_REQUEST_ENTITY_TOO_LARGE
+
+from src.api.gzip import decompress
+
+
+def test_decompress():
+    data = b"0123456789" * 1000
+    assert decompress(gzip.compress(data), len(data)) == data
+    assert decompress(b"", 0) == b""
+    # concatenated members as gzip.decompress
+    assert decompress(gzip.compress(data) * 2, 2 * len(data)) == data * 2
+
+
+def test_decompress_limit():
+    data = b"0" * 2**20
+    for body in [gzip.compress(data), gzip.compress(b"0") + gzip.compress(data)]:
+        with pytest.raises(HTTPException) as e:
+            decompress(body, 2**10)
+        assert e.value.status_code == HTTP_413_REQUEST_ENTITY_TOO_LARGE
+
+
+def test_decompress_invalid():
+    with pytest.raises(EOFError):
+        decompress(gzip.compress(b"0123456789")[:-4], 100)
+    with pytest.raises(Exception):
+        decompress(b"not gzip", 100)
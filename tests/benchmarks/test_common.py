@@ -0,0 +1,8 @@
+from benchmarks.common import run_case
+
+
+def test_run_case():
+    result = run_case(21, "nearest_neighbors", 5, time_limit=1, seed=1)
+    assert result["value"] == 5
+    assert result["objective"] > 0
+    assert result["first_solution_seconds"] is not None
@@ -0,0 +1,40 @@
+import pytest
+
+from benchmarks.instances import generate_instance
+from benchmarks.solver import compare
+from src.tasks.routing import Router
+
+
+@pytest.mark.parametrize("layout", ["uniform", "clustered"])
+def test_generate_instance(layout):
+    instance = generate_instance(21, 3, layout=layout, seed=1)
+
+    # seeded so always identical
+    assert instance == generate_instance(21, 3, layout=layout, seed=1)
+    assert instance != generate_instance(21, 3, layout=layout, seed=2)
+
+    assert instance["driver_indicies"] == [0, 1, 2]
+    assert len(instance["delivery_pairs"]) == 9
+    paired = [node for pair in instance["delivery_pairs"] for node in pair]
+    assert len(set(paired)) == len(paired)
+    assert not set(paired) & set(instance["driver_indicies"])
+
+    router = Router()
+    router.solve(**instance)
+    assert router.solution is not None
+
+
+def test_compare():
+    baseline = [
+        dict(
+            name="a",
+            build_seconds=1.0,
+            first_solution_seconds=1.0,
+            objective=100,
+            peak_rss_mb=100,
+        )
+    ]
+    results = [dict(baseline[0], build_seconds=1.1, objective=200)]
+
+    assert compare(results, baseline) == ["a: objective 100 -> 200"]
+    assert compare(baseline, baseline) == []
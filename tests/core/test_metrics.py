@@ -0,0 +1,38 @@
+import pytest
+
+from src.core.metrics import Counter, Histogram, size_bucket
+
+
+@pytest.mark.parametrize(
+    "n_locations,bucket", [(1, "0-10"), (10, "0-10"), (11, "11-25"), (1001, "1001+")]
+)
+def test_size_bucket(n_locations, bucket):
+    assert size_bucket(n_locations) == bucket
+
+
+def test_histogram():
+    histogram = Histogram("latency", "doc", labels=("phase",), buckets=[1, 5])
+    for value in [0.5, 1, 3, 10]:
+        histogram.observe(value, phase="solve")
+
+    samples = {
+        (name, labels.get("le")): value for name, labels, value in histogram.samples()
+    }
+    # buckets are cumulative
+    assert samples[("latency_bucket", "1")] == 2
+    assert samples[("latency_bucket", "5")] == 3
+    assert samples[("latency_bucket", "+Inf")] == 4
+    assert samples[("latency_count", None)] == 4
+    assert samples[("latency_sum", None)] == 14.5
+
+
+def test_counter():
+    counter = Counter("outcomes", "doc", labels=("outcome",))
+    counter.inc(outcome="found")
+    counter.inc(outcome="found")
+    counter.inc(outcome="timeout")
+
+    assert counter.samples() == [
+        ("outcomes", {"outcome": "found"}, 2),
+        ("outcomes", {"outcome": "timeout"}, 1),
+    ]
@@ -0,0 +1,39 @@
+import pytest
+
+from src.models.batch import BatchInstance
+from src.models.job import JobStatus
+from src.tasks.batch import solve_batch
+from src.tasks.pool import SolverPool
+
+
+@pytest.mark.asyncio
+async def test_solve_batch(mv_distance_matrix, pickup_deliver):
+    instance = dict(
+        time_matrix=mv_distance_matrix,
+        driver_indicies=[0] * 4,
+        delivery_pairs=pickup_deliver,
+        preset="fast",
+    )
+    instances = [
+        BatchInstance(id="a", **instance),
+        # impossible to solve within max time
+        BatchInstance(id="b", **{**instance, "max_time": 0}),
+        # rejected before reaching the pool
+        BatchInstance(id="c", **{**instance, "time_matrix": None}),
+        BatchInstance(id="d", **instance),
+    ]
+    # no queue so every instance waits for the one before it
+    solver_pool = SolverPool(max_workers=1, max_queue=0)
+    results = {
+        result.id: result
+        async for result in solve_batch(solver_pool, instances, concurrency=2)
+    }
+
+    assert sorted(results) == ["a", "b", "c", "d"]
+    for instance_id in ["a", "d"]:
+        assert results[instance_id].status == JobStatus.completed
+        assert len(results[instance_id].result) == 4
+    assert results["b"].status == JobStatus.failed
+    assert results["b"].error.startswith("No solution possible")
+    assert results["c"].status == JobStatus.failed
+    assert results["c"].result is None
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+import numpy as np
+
+from src.tasks.schedule import (
+    build_columns,
+    build_schedules,
+    dropped_pairs,
+    routes_from_schedules,
+)
+
+
+def test_routes_from_schedules():
+    routes = [[0, 2, 1, 0], [3, 3]]
+    times = [[0, 10, 20, 30], [0, 0]]
+    schedules = build_schedules(routes, times)
+    # inverse of build schedules, ordered by driver
+    assert routes_from_schedules(schedules[::-1]) == routes
+
+    # matched by name when locations are reordered, unknown names dropped
+    names = ["depot", "a", "b", "other depot"]
+    schedules = build_schedules(routes, times, names)
+    assert routes_from_schedules(schedules, ["b", "depot", "other depot"]) == [
+        [1, 0, 1],
+        [2, 2],
+    ]
+
+
+def test_build_columns():
+    reference_time = datetime(2024, 1, 1, 9)
+    columns = build_columns(
+        nodes=np.array([0, 2, 1, 0, 3, 3]),
+        # second driver had already worked 100 seconds
+        times=np.array([0, 10, 25, 30, 100, 100]),
+        offsets=np.array([4, 6]),
+        reference_time=reference_time,
+    )
+    assert columns.reference_time == reference_time
+    assert [driver.dict() for driver in columns.drivers] == [
+        dict(
+            driver=0,
+            nodes=[0, 2, 1, 0],
+            durations=[10, 15, 5],
+            arrival_offsets=[0, 10, 25, 30],
+        ),
+        dict(driver=1, nodes=[3, 3], durations=[0], arrival_offsets=[0, 0]),
+    ]
+
+    # same arrivals and durations as the schedule of each leg
+    schedules = build_schedules(
+        [[0, 2, 1, 0], [3, 3]],
+        [[0, 10, 25, 30], [100, 100]],
+        reference_time=reference_time,
+    )
+    for schedule, driver in zip(schedules, columns.drivers):
+        assert [leg.duration for leg in schedule.route] == driver.durations
+        assert [leg.arrival_time for leg in schedule.route] == [
+            (reference_time + timedelta(seconds=offset)).time()
+            for offset in driver.arrival_offsets[1:]
+        ]
+
+
+def test_dropped_pairs():
+    nodes = np.array([0, 3, 4, 0, 5, 5, 5])
+    assert dropped_pairs(nodes, [(1, 2), (3, 4), (6, 6), (5, 5)]) == [(1, 2), (6, 6)]
+    assert dropped_pairs(nodes, []) == []
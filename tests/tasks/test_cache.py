@@ -0,0 +1,97 @@
+import time
+import pytest
+import numpy as np
+from concurrent.futures import Future
+
+from src.tasks.cache import IdempotencyKeyReused, SolutionCache, solution_key
+from src.tasks.pool import pack_inputs
+
+
+def test_solution_key():
+    inputs = pack_inputs(
+        time_matrix=[[0, 1], [1, 0]], driver_indicies=[0], delivery_pairs=[(1, 1)]
+    )
+    # same inputs however they were sent
+    same = pack_inputs(
+        time_matrix=np.array([[0, 1], [1, 0]]),
+        driver_indicies=np.array([0]),
+        delivery_pairs=[[1, 1]],
+    )
+    assert solution_key(inputs) == solution_key(same)
+
+    assert solution_key(inputs) != solution_key(inputs, portfolio=True)
+    assert solution_key(inputs) != solution_key(dict(inputs, max_time=1))
+    assert solution_key(inputs) != solution_key(
+        dict(inputs, time_matrix=inputs["time_matrix"].T.copy() + 1)
+    )
+
+
+class TestSolutionCache:
+    def test_eviction(self):
+        cache = SolutionCache(max_entries=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        # a is most recently used so b is evicted
+        assert cache.get("a") == 1
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1 and cache.get("c") == 3
+
+        cache = SolutionCache(max_entries=2, ttl=0.01)
+        cache.set("a", 1)
+        time.sleep(0.02)
+        assert cache.get("a") is None
+
+    def test_sqlite(self, tmp_path):
+        path = str(tmp_path / "solutions.sqlite")
+        SolutionCache(max_entries=1, ttl=60, path=path).set("a", np.arange(3))
+
+        # shared by caches using the same file
+        cache = SolutionCache(max_entries=1, ttl=60, path=path)
+        np.testing.assert_array_equal(cache.get("a"), np.arange(3))
+        assert cache.get("b") is None
+
+        # expired entries are ignored
+        assert SolutionCache(max_entries=1, ttl=0, path=path).get("a") is None
+
+    def test_get_or_submit(self):
+        cache = SolutionCache(max_entries=2, ttl=60)
+        submitted = []
+
+        def submit():
+            submitted.append(Future())
+            return submitted[-1]
+
+        first, cached = cache.get_or_submit("a", submit)
+        assert not cached
+        # identical request while solving shares the solve
+        second, _ = cache.get_or_submit("a", submit)
+        assert first is second and len(submitted) == 1
+
+        submitted[0].set_result(1)
+        future, cached = cache.get_or_submit("a", submit)
+        assert cached and future.result() == 1
+
+        # failures are not cached
+        failed, _ = cache.get_or_submit("b", submit)
+        failed.set_exception(Exception("Solution not found"))
+        assert cache.get_or_submit("b", submit)[0] is not failed
+
+    def test_claim(self):
+        cache = SolutionCache(max_entries=2, ttl=60)
+        cache.claim("retry", "a")
+        cache.claim("retry", "a")
+        with pytest.raises(IdempotencyKeyReused):
+            cache.claim("retry", "b")
+
+    def test_claim_sqlite(self, tmp_path):
+        path = str(tmp_path / "solutions.sqlite")
+        SolutionCache(max_entries=2, ttl=60, path=path).claim("retry", "a")
+        # another worker sharing the database sees the key
+        cache = SolutionCache(max_entries=2, ttl=60, path=path)
+        cache.claim("retry", "a")
+        with pytest.raises(IdempotencyKeyReused, match="retry"):
+            cache.claim("retry", "b")
+        # expired keys may be reused
+        cache = SolutionCache(max_entries=2, ttl=0, path=path)
+        cache.claim("retry", "b")
@@ -0,0 +1,182 @@
+import numpy as np
+import pytest
+from concurrent.futures import Future
+
+from src.tasks.decompose import (
+    Cluster,
+    apply_repairs,
+    cluster_inputs,
+    partition,
+    solution_cost,
+    solve_decomposed,
+)
+from src.tasks.pool import (
+    PackedRoutes,
+    SolverPool,
+    pack_inputs,
+    solve_packed,
+    unpack_routes,
+)
+from src.tasks.search import search_params
+
+
+def test_partition(mv_distance_matrix, pickup_deliver):
+    inputs = pack_inputs(
+        time_matrix=mv_distance_matrix,
+        driver_indicies=[0] * 4,
+        delivery_pairs=pickup_deliver,
+    )
+    clusters = partition(
+        inputs["time_matrix"], inputs["driver_indicies"], inputs["delivery_pairs"], 2
+    )
+
+    assert len(clusters) == 2
+    # every driver serves exactly one cluster
+    assert sorted(np.concatenate([c.vehicles for c in clusters])) == [0, 1, 2, 3]
+    assert all(len(c.vehicles) for c in clusters)
+    # every location visited in exactly one cluster and pairs kept together
+    visits = [set(c.nodes.tolist()) - {0} for c in clusters]
+    assert sorted(set.union(*visits)) == list(range(1, len(mv_distance_matrix)))
+    assert not set.intersection(*visits)
+    for pickup, delivery in pickup_deliver:
+        assert any(pickup in v and delivery in v for v in visits)
+
+    # never more clusters than drivers
+    single_driver = partition(
+        inputs["time_matrix"], np.array([0]), inputs["delivery_pairs"], 3
+    )
+    assert len(single_driver) == 1
+
+
+def test_cluster_inputs(mv_distance_matrix, pickup_deliver):
+    inputs = pack_inputs(
+        time_matrix=mv_distance_matrix,
+        driver_indicies=[0] * 4,
+        delivery_pairs=pickup_deliver,
+        delivery_weights=list(range(len(pickup_deliver))),
+        vehicle_capacities=[10, 11, 12, 13],
+        site_eta=list(range(len(mv_distance_matrix))),
+    )
+    cluster = partition(
+        inputs["time_matrix"], inputs["driver_indicies"], inputs["delivery_pairs"], 2
+    )[0]
+    sub = cluster_inputs(inputs, cluster)
+
+    nodes = cluster.nodes
+    assert np.array_equal(
+        sub["time_matrix"], np.asarray(mv_distance_matrix)[np.ix_(nodes, nodes)]
+    )
+    assert nodes[sub["driver_indicies"]].tolist() == [0] * len(cluster.vehicles)
+    assert sub["vehicle_capacities"].tolist() == (10 + cluster.vehicles).tolist()
+    assert sub["site_eta"].tolist() == nodes.tolist()
+    # weights follow their pairs
+    for (pickup, delivery), weight in zip(
+        sub["delivery_pairs"], sub["delivery_weights"]
+    ):
+        assert pickup_deliver[weight] == [nodes[pickup], nodes[delivery]]
+
+
+def test_solve_decomposed(mv_distance_matrix, pickup_deliver):
+    pool = SolverPool(max_workers=2, max_queue=2)
+    inputs = pack_inputs(
+        time_matrix=mv_distance_matrix,
+        driver_indicies=[0] * 4,
+        delivery_pairs=pickup_deliver,
+    )
+    for boundary_repair in [False, True]:
+        packed = solve_decomposed(
+            pool,
+            inputs,
+            n_clusters=2,
+            params=search_params("fast"),
+            boundary_repair=boundary_repair,
+        ).result()
+        routes, times = unpack_routes(packed)
+
+        assert len(routes) == 4
+        visited = sorted(sum([route[1:-1] for route in routes], []))
+        assert visited == list(range(1, len(mv_distance_matrix)))
+        # pickups before their delivery on the same route
+        for pickup, delivery in pickup_deliver:
+            route = next(route for route in routes if pickup in route)
+            assert route.index(pickup) < route.index(delivery)
+        assert [len(t) for t in times] == [len(route) for route in routes]
+
+
+def test_solve_decomposed_failure(mv_distance_matrix, pickup_deliver):
+    class FailingPool:
+        """Completes the first cluster and fails the others"""
+
+        def submit_each(self, inputs, params, router_options=None):
+            futures = [Future() for _ in inputs]
+            futures[0].set_result(None)
+            for future in futures[1:]:
+                future.set_exception(Exception("No solution found"))
+            return futures
+
+    inputs = pack_inputs(
+        time_matrix=mv_distance_matrix,
+        driver_indicies=[0] * 4,
+        delivery_pairs=pickup_deliver,
+    )
+    future = solve_decomposed(FailingPool(), inputs, n_clusters=2)
+    with pytest.raises(Exception, match="No solution found"):
+        future.result(timeout=5)
+
+
+def test_solution_cost(mv_distance_matrix, pickup_deliver):
+    for drop_penalties in [None, [1000] * len(pickup_deliver)]:
+        inputs = pack_inputs(
+            time_matrix=mv_distance_matrix,
+            driver_indicies=[0] * 4,
+            delivery_pairs=pickup_deliver,
+            drop_penalties=drop_penalties,
+        )
+        packed = solve_packed(search_params("fast", time_limit=1), inputs)
+        cost = solution_cost(inputs, packed.nodes, packed.times, packed.offsets)
+        assert cost == packed.objective
+
+
+def test_apply_repairs():
+    inputs = dict(
+        driver_indicies=np.array([0, 1]),
+        delivery_pairs=np.array([[2, 3], [4, 5]]),
+        drop_penalties=None,
+    )
+    clusters = [
+        Cluster(medoid=0, nodes=np.array([0, 2, 3]), vehicles=np.array([0])),
+        Cluster(medoid=1, nodes=np.array([1, 4, 5]), vehicles=np.array([1])),
+    ]
+    merged = Cluster(
+        medoid=0, nodes=np.array([0, 1, 2, 3, 4, 5]), vehicles=np.array([0, 1])
+    )
+
+    def packed(routes, times, objective):
+        return PackedRoutes(
+            nodes=np.concatenate(routes),
+            times=np.concatenate(times),
+            offsets=np.cumsum([len(route) for route in routes]),
+            objective=objective,
+        )
+
+    # each cluster objective counts its own span, 30 + 100 * 30
+    results = [packed([[0, 1, 2, 0]], [[0, 10, 20, 30]], 3030)] * 2
+
+    # both routes lengthened, one span is still less than the two cluster spans summed
+    longer = packed(
+        [[0, 2, 3, 0], [1, 4, 5, 1]], [[0, 10, 20, 31], [0, 10, 20, 31]], 3162
+    )
+    stitched = apply_repairs(inputs, clusters, results, [(0, 1)], [merged], [longer])
+    assert stitched.objective == 60 + 100 * 30
+    assert stitched.times.tolist() == [0, 10, 20, 30] * 2
+
+    shorter = packed(
+        [[0, 2, 3, 0], [1, 4, 5, 1]], [[0, 10, 20, 29], [0, 10, 20, 29]], 2958
+    )
+    stitched = apply_repairs(inputs, clusters, results, [(0, 1)], [merged], [shorter])
+    assert stitched.objective == 2958
+    assert stitched.nodes.tolist() == [0, 2, 3, 0, 1, 4, 5, 1]
+
+    # a failed repair keeps the clusters routes
+    stitched = apply_repairs(inputs, clusters, results, [(0, 1)], [merged], [None])
+    assert stitched.objective == 60 + 100 * 30
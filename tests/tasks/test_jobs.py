@@ -0,0 +1,79 @@
+import time
+import pytest
+import numpy as np
+
+from src.models.job import JobStatus
+from src.models.schedule_request import ScheduleRequest
+from src.tasks.jobs import JobQueue
+from src.tasks.pool import SolverPool, SolverPoolFull
+
+
+def wait_for(job_queue: JobQueue, job_id: str, timeout: float = 60):
+    """Poll until the job is no longer pending or running"""
+    end = time.time() + timeout
+    while time.time() < end:
+        job = job_queue.get(job_id)
+        if job.status not in [JobStatus.pending, JobStatus.running]:
+            return job
+        time.sleep(0.05)
+    raise TimeoutError(job_id)
+
+
+class TestJobQueue:
+    def test_submit(self, mv_distance_matrix, pickup_deliver):
+        job_queue = JobQueue(SolverPool(max_workers=1, max_queue=1), max_finished=1)
+        request = ScheduleRequest(
+            time_matrix=mv_distance_matrix,
+            driver_indicies=[0] * 4,
+            delivery_pairs=pickup_deliver,
+        )
+        job = job_queue.submit(request)
+        assert job.status == JobStatus.pending
+
+        job = wait_for(job_queue, job.id)
+        assert job.status == JobStatus.completed
+        assert len(job.result) == 4
+
+        # every pair fits within max time but not all of them for a single driver
+        infeasible = request.copy(update={"driver_indicies": [0], "max_time": 1780})
+        failed = wait_for(job_queue, job_queue.submit(infeasible).id)
+        assert failed.status == JobStatus.failed
+        assert failed.error == "Solution not found"
+
+        # or solved in part when pairs may be dropped
+        partial = wait_for(
+            job_queue,
+            job_queue.submit(
+                infeasible.copy(
+                    update={"drop_penalties": [100000] * len(pickup_deliver)}
+                )
+            ).id,
+        )
+        assert partial.status == JobStatus.completed
+        assert 0 < len(partial.dropped_pairs) < len(pickup_deliver)
+        assert job.dropped_pairs is None
+
+        # only the latest finished job is retained
+        assert job_queue.get(job.id) is None
+        assert job_queue.get("unknown") is None
+
+    def test_full_and_cancel(self, mv_distance_matrix, pickup_deliver):
+        job_queue = JobQueue(SolverPool(max_workers=1, max_queue=1), max_finished=10)
+        request = ScheduleRequest(
+            time_matrix=(np.array(mv_distance_matrix) * 10).tolist(),
+            driver_indicies=[0] * 4,
+            delivery_pairs=pickup_deliver,
+            location_names=[str(i) for i in range(len(mv_distance_matrix))],
+            max_time=10**6,
+        )
+        running = job_queue.submit(request)
+        pending = job_queue.submit(request)
+        with pytest.raises(SolverPoolFull):
+            job_queue.submit(request)
+
+        # cancelled jobs keep the cancelled status and free their slot once done
+        assert job_queue.cancel(pending.id).status == JobStatus.cancelled
+        assert job_queue.cancel(running.id).status == JobStatus.cancelled
+        assert wait_for(job_queue, running.id).status == JobStatus.cancelled
+        assert wait_for(job_queue, pending.id).result is None
+        assert job_queue.cancel("unknown") is None
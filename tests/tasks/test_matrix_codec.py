@@ -0,0 +1,91 @@
+import base64
+import io
+
+import numpy as np
+import pytest
+
+from src.tasks.matrix_codec import (
+    decode_matrix,
+    encode_matrix,
+    matrix_order,
+    pack_triangle,
+    resolve_time_matrix,
+    triangle_index,
+    triangle_order,
+    unpack_triangle,
+)
+
+
+@pytest.mark.parametrize("npy", [True, False])
+def test_decode_matrix(mv_distance_matrix, npy):
+    matrix = decode_matrix(encode_matrix(mv_distance_matrix, npy))
+
+    assert matrix.dtype == np.int32
+    assert matrix.tolist() == mv_distance_matrix
+    # viewed in the decoded buffer rather than copied
+    assert not matrix.flags.owndata
+
+
+def test_decode_matrix_converts_dtype():
+    matrix = decode_matrix(encode_npy(np.arange(4, dtype=">i8").reshape(2, 2)))
+    assert matrix.dtype == np.int32
+    assert matrix.tolist() == [[0, 1], [2, 3]]
+
+
+def test_decode_matrix_invalid():
+    # not square
+    with pytest.raises(Exception):
+        decode_matrix(encode_npy(np.zeros((2, 3), dtype=np.int32)))
+    # not integers
+    with pytest.raises(Exception):
+        decode_matrix(encode_npy(np.zeros((2, 2), dtype=np.float64)))
+    # truncated buffer
+    data = base64.b64decode(encode_matrix([[0, 1], [1, 0]]))
+    with pytest.raises(Exception):
+        decode_matrix(base64.b64encode(data[:-4]).decode())
+
+
+def test_resolve_time_matrix():
+    assert resolve_time_matrix([[0]], None) == [[0]]
+    assert resolve_time_matrix(None, encode_matrix([[0]])).tolist() == [[0]]
+    with pytest.raises(Exception):
+        resolve_time_matrix(None, None)
+    with pytest.raises(Exception):
+        resolve_time_matrix([[0]], encode_matrix([[0]]))
+
+    packed = resolve_time_matrix(None, None, [0, 5, 0])
+    assert packed.dtype == np.int32 and matrix_order(packed) == 2
+    # not a triangle
+    with pytest.raises(Exception):
+        resolve_time_matrix(None, None, [0, 5])
+    with pytest.raises(Exception):
+        resolve_time_matrix([[0]], None, [0])
+
+
+def test_pack_triangle():
+    upper = np.triu(np.arange(25, dtype=np.int32).reshape(5, 5))
+    symmetric = upper + np.triu(upper, 1).T
+
+    packed = pack_triangle(symmetric)
+
+    assert len(packed) == 15
+    np.testing.assert_array_equal(unpack_triangle(packed), symmetric)
+    for i in range(5):
+        for j in range(5):
+            assert packed[triangle_index(5, i, j)] == symmetric[i, j]
+    assert matrix_order(packed) == matrix_order(symmetric) == 5
+
+
+def test_triangle_order():
+    for n in [0, 1, 2, 5, 1000, 94906265, 10**12]:
+        assert triangle_order(n * (n + 1) // 2) == n
+    # one element either side of a triangle, past where float square roots round
+    for size in [14, 16, 10**12 * (10**12 + 1) // 2 + 1]:
+        with pytest.raises(Exception, match="not a packed upper triangle"):
+            triangle_order(size)
+
+
+def encode_npy(matrix: np.ndarray) -> str:
+    buffer = io.BytesIO()
+    np.save(buffer, matrix)
+    return base64.b64encode(buffer.getvalue()).decode()
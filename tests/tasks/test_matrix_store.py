@@ -0,0 +1,89 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from src.tasks.matrix_store import MatrixStore, MatrixVersionConflict
+
+
+def test_put_and_subset(tmp_path):
+    store = MatrixStore(str(tmp_path / "matrices"))
+    assert store.get("sites") is None
+
+    matrix = np.arange(16, dtype=np.int32).reshape(4, 4)
+    store.put("sites", ["a", "b", "c", "d"], matrix)
+    stored = store.get("sites")
+    assert stored.location_ids == ["a", "b", "c", "d"]
+    assert isinstance(stored.matrix, np.memmap)
+
+    # rows and columns in the order asked for
+    np.testing.assert_array_equal(store.subset("sites", ["d", "b"]), [[15, 13], [7, 5]])
+
+    # another process replacing the matrix is picked up
+    MatrixStore(store.path).put("sites", ["a", "b"], [[0, 1], [2, 0]])
+    np.testing.assert_array_equal(store.subset("sites", ["b", "a"]), [[0, 2], [1, 0]])
+    assert len(list((tmp_path / "matrices").glob("sites.*.npy"))) == 1
+
+    with pytest.raises(Exception, match="not in matrix"):
+        store.subset("sites", ["a", "d"])
+    with pytest.raises(Exception, match="Unknown matrix"):
+        store.subset("other", ["a"])
+    with pytest.raises(Exception, match="Invalid matrix id"):
+        store.get("../sites")
+    with pytest.raises(Exception):
+        store.put("sites", ["a", "a"], [[0, 1], [1, 0]])
+
+
+def test_missing_version(tmp_path):
+    store = MatrixStore(str(tmp_path))
+    store.put("sites", ["a", "b"], [[0, 1], [2, 0]])
+    for path in tmp_path.glob("sites.*.npy"):
+        path.unlink()
+
+    # raised rather than looking up the missing version forever
+    with pytest.raises(Exception, match="upload the matrix again"):
+        MatrixStore(store.path).get("sites")
+
+
+def test_concurrent_put(tmp_path):
+    def put(i: int) -> None:
+        MatrixStore(str(tmp_path)).put("sites", ["a", "b"], [[0, i], [i, 0]])
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(put, range(32)))
+
+    # the version the index names is never removed by another upload
+    stored = MatrixStore(str(tmp_path)).get("sites")
+    assert stored.matrix[0, 1] == stored.matrix[1, 0]
+    assert len(list(tmp_path.glob("sites.*.npy"))) == 1
+
+
+def test_resolve(tmp_path):
+    store = MatrixStore(str(tmp_path))
+    store.put("sites", ["a", "b"], [[0, 1], [2, 0]])
+
+    np.testing.assert_array_equal(
+        store.resolve(None, None, "sites", ["b", "a"]), [[0, 2], [1, 0]]
+    )
+    assert store.resolve([[0]], None, None, None) == [[0]]
+
+    for args in [
+        ([[0]], None, "sites", ["a"]),
+        (None, None, "sites", None),
+        ([[0]], None, None, ["a"]),
+        (None, None, None, None),
+    ]:
+        with pytest.raises(Exception):
+            store.resolve(*args)
+
+
+def test_put_version(tmp_path):
+    store = MatrixStore(str(tmp_path))
+    with pytest.raises(MatrixVersionConflict):
+        store.put("sites", ["a"], [[0]], version="missing")
+    version = store.put("sites", ["a"], [[0]]).version
+
+    store.put("sites", ["a", "b"], [[0, 1], [2, 0]], version=version)
+    with pytest.raises(MatrixVersionConflict):
+        store.put("sites", ["a"], [[0]], version=version)
+    assert store.get("sites").location_ids == ["a", "b"]
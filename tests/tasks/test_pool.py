@@ -0,0 +1,71 @@
+import pytest
+import numpy as np
+
+from src.models.capacity import CapacityDimension
+from src.tasks.pool import (
+    PackedRoutes,
+    SolverPool,
+    SolverPoolFull,
+    pack_inputs,
+    unpack_routes,
+)
+
+
+def test_pack_inputs():
+    inputs = pack_inputs(
+        time_matrix=[[0, 1], [1, 0]],
+        driver_indicies=[0],
+        delivery_pairs=[],
+        site_eta=[0, 10],
+        capacity_dimensions={
+            "Volume": CapacityDimension(delivery_weights=[], vehicle_capacities=[5])
+        },
+    )
+    assert inputs["time_matrix"].dtype == np.int32
+    assert inputs["delivery_pairs"].shape == (0, 2)
+    assert inputs["delivery_weights"] is None
+    np.testing.assert_array_equal(inputs["site_eta"], [0, 10])
+    np.testing.assert_array_equal(inputs["capacity_dimensions"]["Volume"][1], [5])
+
+
+def test_unpack_routes():
+    routes, times = unpack_routes(
+        PackedRoutes(
+            nodes=np.array([0, 1, 0, 2, 2]),
+            times=np.array([0, 5, 9, 0, 0]),
+            offsets=np.array([3, 5]),
+            objective=0,
+        )
+    )
+    assert routes == [[0, 1, 0], [2, 2]]
+    assert times == [[0, 5, 9], [0, 0]]
+
+
+class TestSolverPool:
+    def test_submit(self, mv_distance_matrix, pickup_deliver):
+        pool = SolverPool(max_workers=1, max_queue=0, solve_time=10)
+        inputs = pack_inputs(
+            time_matrix=mv_distance_matrix,
+            driver_indicies=[0] * 4,
+            delivery_pairs=pickup_deliver,
+        )
+        future = pool.submit(inputs)
+
+        # single worker busy and nothing can queue
+        with pytest.raises(SolverPoolFull) as e:
+            pool.submit(inputs)
+        assert e.value.retry_after == 10
+
+        routes, times = unpack_routes(future.result())
+        assert len(routes) == len(times) == 4
+        assert all(route[0] == route[-1] == 0 for route in routes)
+        # every location visited once
+        assert sorted(np.concatenate([route[1:-1] for route in routes])) == list(
+            range(1, len(mv_distance_matrix))
+        )
+
+        # capacity is freed once solved
+        # each pair fits within max time but not all of them for a single driver
+        inputs.update(driver_indicies=np.zeros(1, dtype=np.int32), max_time=1780)
+        with pytest.raises(Exception, match="Solution not found"):
+            pool.submit(inputs).result()
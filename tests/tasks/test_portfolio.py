@@ -0,0 +1,86 @@
+import time
+
+import pytest
+
+from src.tasks.pool import SolverPool, SolverPoolFull, pack_inputs
+from src.tasks.portfolio import (
+    DEFAULT_STRATEGIES,
+    FirstSolutionStrategy,
+    LocalSearchMetaheuristic,
+    solve_portfolio,
+    strategy_name,
+    strategy_params,
+)
+from src.tasks.search import search_params
+
+
+def test_strategy_params():
+    strategy = (
+        FirstSolutionStrategy.SAVINGS,
+        LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH,
+    )
+    assert strategy_name(strategy) == "SAVINGS/GUIDED_LOCAL_SEARCH"
+
+    params = strategy_params(strategy)
+    assert params.first_solution_strategy == FirstSolutionStrategy.SAVINGS
+    assert (
+        params.local_search_metaheuristic
+        == LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
+    )
+    assert params.solution_limit != 1
+    assert strategy_params(strategy, first_feasible=True).solution_limit == 1
+
+
+class TestSolvePortfolio:
+    def test_best_objective(self, mv_distance_matrix, pickup_deliver):
+        pool = SolverPool(max_workers=len(DEFAULT_STRATEGIES), max_queue=0)
+        inputs = pack_inputs(
+            time_matrix=mv_distance_matrix,
+            driver_indicies=[0] * 4,
+            delivery_pairs=pickup_deliver,
+        )
+        # default search on its own
+        objective = pool.submit(inputs).result().objective
+
+        # some strategies fail (SAVINGS cannot build a first solution) but the best is kept
+        result = solve_portfolio(pool, inputs, time_limit=2).result()
+        assert result.strategy in map(strategy_name, DEFAULT_STRATEGIES)
+        assert result.routes.objective <= objective
+
+        result = solve_portfolio(pool, inputs, time_limit=2, first_feasible=True)
+        assert result.result().routes.objective > 0
+        # the other strategies stop at their first solution and free the pool
+        start = time.perf_counter()
+        while pool.idle_workers() < pool.max_workers:
+            assert time.perf_counter() - start < 2
+            time.sleep(0.01)
+
+    def test_single_worker(self, mv_distance_matrix, pickup_deliver):
+        # no queue so racing both strategies would be rejected
+        pool = SolverPool(max_workers=1, max_queue=0)
+        inputs = pack_inputs(
+            time_matrix=mv_distance_matrix,
+            driver_indicies=[0] * 4,
+            delivery_pairs=pickup_deliver,
+        )
+        strategies = DEFAULT_STRATEGIES[2:]
+        # only the first is raced rather than the second waiting for the deadline to pass
+        result = solve_portfolio(pool, inputs, strategies, time_limit=3).result()
+        assert result.strategy == strategy_name(strategies[0])
+        assert result.routes.objective > 0
+
+        # the first strategy still needs a process
+        pool.submit(inputs, search_params("fast", time_limit=1))
+        with pytest.raises(SolverPoolFull):
+            solve_portfolio(pool, inputs, strategies, time_limit=1)
+
+    def test_no_solution(self, mv_distance_matrix, pickup_deliver):
+        pool = SolverPool(max_workers=2, max_queue=0)
+        inputs = pack_inputs(
+            time_matrix=mv_distance_matrix,
+            driver_indicies=[0],
+            delivery_pairs=pickup_deliver,
+            max_time=1780,
+        )
+        with pytest.raises(Exception, match="Solution not found"):
+            solve_portfolio(pool, inputs, DEFAULT_STRATEGIES[:2], time_limit=1).result()
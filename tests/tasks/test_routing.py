@@ -2,7 +2,17 @@ import pytest
 import numpy as np
 from ortools.constraint_solver import pywrapcp, routing_enums_pb2
 
-from src.tasks.routing import Router
+from benchmarks.instances import generate_instance
+from src.tasks.matrix_codec import pack_triangle
+from src.tasks.routing import (
+    Router,
+    _build_demand_vector,
+    _build_transit_matrix,
+    _nearest_successors,
+    _warm_start_routes,
+    check_inputs,
+)
+from src.tasks.search import search_params
 
 
 class TestRouter:
@@ -114,3 +124,353 @@ class TestRouter:
         assert routes[0][0] == routes[0][1] == 0  # ensure never leaves depot
         assert len(times[0]) == 2  # two as start and end
         assert times[0][0] == times[0][1] == 20000
+
+    def test_solve_transit_matrix_matches_callback(self, mv_distance_matrix):
+        # make matrix smaller(9*9)
+        matrix = np.array(mv_distance_matrix)[:9, :9]
+        inputs = dict(
+            time_matrix=matrix,
+            driver_indicies=[0, 7, 8],
+            delivery_pairs=[(1, 2), (3, 4), (5, 6)],
+            site_eta=[0, 60, 60, 120, 120, 30, 30, 0, 0],
+        )
+
+        matrix_router = Router(transit_matrix=True)
+        matrix_router.solve(**inputs)
+        callback_router = Router(transit_matrix=False)
+        callback_router.solve(**inputs)
+
+        # both registrations describe the same transit times so search is identical
+        assert matrix_router.get_route_list() == callback_router.get_route_list()
+        assert matrix_router.get_route_times() == callback_router.get_route_times()
+
+    @pytest.mark.parametrize("transit_matrix", [True, False])
+    def test_solve_with_triangle(self, mv_distance_matrix, transit_matrix):
+        matrix = np.array(mv_distance_matrix)[:9, :9]
+        inputs = dict(
+            driver_indicies=[0, 7, 8],
+            delivery_pairs=[(1, 2), (3, 4), (5, 6)],
+            site_eta=[0, 60, 60, 120, 120, 30, 30, 0, 0],
+        )
+
+        square_router = Router(transit_matrix=transit_matrix)
+        square_router.solve(time_matrix=matrix, **inputs)
+        triangle_router = Router(transit_matrix=transit_matrix)
+        triangle_router.solve(time_matrix=pack_triangle(matrix), **inputs)
+
+        # sample matrix is symmetric so the packed triangle describes the same problem
+        assert square_router.get_route_list() == triangle_router.get_route_list()
+        assert square_router.get_route_times() == triangle_router.get_route_times()
+
+    def test_solve_with_multiple_capacity_dimensions(self, mv_distance_matrix):
+        # make matrix smaller(7*7)
+        matrix = np.array(mv_distance_matrix)[:7, :7]
+
+        router = Router()
+        router.solve(
+            time_matrix=matrix,
+            driver_indicies=[0] * 3,
+            delivery_pairs=[(1, 2), (3, 4), (5, 6)],
+            delivery_weights=[1, 1, 1],
+            vehicle_capacities=[3, 3, 3],
+            capacity_dimensions={"Volume": ([1, 2, 2], [0, 1, 2])},
+        )
+        routes = np.array(router.get_route_list())
+        # weight fits anywhere so volume alone decides the vehicle
+        assert np.isin(routes[0], [0]).all()
+        assert np.isin(routes[1], [0, 1, 2]).all()
+        assert np.isin(routes[2], [0, 3, 4, 5, 6]).all()
+
+        # every dimension requires a capacity for each vehicle
+        with pytest.raises(Exception):
+            router.solve(
+                time_matrix=matrix,
+                driver_indicies=[0] * 3,
+                delivery_pairs=[(1, 2), (3, 4), (5, 6)],
+                capacity_dimensions={"Volume": ([1, 2, 2], [0, 1])},
+            )
+
+    def test_solve_with_initial_routes(self, mv_distance_matrix, pickup_deliver):
+        router = Router()
+        router.solve(
+            time_matrix=mv_distance_matrix,
+            driver_indicies=[0] * 4,
+            delivery_pairs=pickup_deliver,
+        )
+        routes = router.get_route_list()
+        objective = router.solution.ObjectiveValue()
+
+        # starting from the solution keeps it
+        router.solve(
+            time_matrix=mv_distance_matrix,
+            driver_indicies=[0] * 4,
+            delivery_pairs=pickup_deliver,
+            initial_routes=routes,
+        )
+        assert router.get_route_list() == routes
+        assert router.solution.ObjectiveValue() == objective
+
+        # locations missing from the initial routes are still visited
+        router.solve(
+            time_matrix=mv_distance_matrix,
+            driver_indicies=[0] * 4,
+            delivery_pairs=pickup_deliver,
+            initial_routes=routes[:2],
+        )
+        visited = sorted(sum([route[1:-1] for route in router.get_route_list()], []))
+        assert visited == list(range(1, len(mv_distance_matrix)))
+
+        # initial routes breaking max time are ignored
+        with pytest.raises(Exception):
+            router.solve(
+                time_matrix=mv_distance_matrix,
+                driver_indicies=[0] * 4,
+                delivery_pairs=pickup_deliver,
+                max_time=0,
+                initial_routes=routes,
+            )
+
+    def test_solve_with_improvement_window(self, mv_distance_matrix, pickup_deliver):
+        # guided local search otherwise runs until the time limit
+        params = search_params(
+            "quality", time_limit=30, metaheuristic="GUIDED_LOCAL_SEARCH"
+        )
+        router = Router(params, improvement_window=0.5)
+        router.solve(
+            time_matrix=mv_distance_matrix,
+            driver_indicies=[0] * 4,
+            delivery_pairs=pickup_deliver,
+        )
+        assert router.solution is not None
+        assert router.timings["solve"] < 10
+
+    def test_solve_with_nearest_neighbors(self, mv_distance_matrix, pickup_deliver):
+        router = Router(search_params("fast", time_limit=5), nearest_neighbors=2)
+        router.solve(
+            time_matrix=mv_distance_matrix,
+            driver_indicies=[0] * 4,
+            delivery_pairs=pickup_deliver,
+        )
+        routes = router.get_route_list()
+        # every location still visited once with pickups straight before deliveries
+        visits = [node for route in routes for node in route[1:-1]]
+        assert sorted(visits) == list(range(1, len(mv_distance_matrix)))
+        for route in routes:
+            for pickup, delivery in pickup_deliver:
+                if pickup in route:
+                    assert route[route.index(pickup) + 1] == delivery
+
+    def test_solve_with_few_nearest_neighbors(self):
+        # vehicles must leave their cluster, which no location has among its nearest neighbours
+        instance = generate_instance(100, 4, layout="clustered")
+        for nearest_neighbors in [None, 5, 10]:
+            router = Router(
+                search_params("fast", time_limit=2),
+                nearest_neighbors=nearest_neighbors,
+            )
+            router.solve(**instance)
+            assert router.solution is not None
+
+    @pytest.mark.parametrize("precedence", ["direct", "lifo", "fifo", "free"])
+    def test_solve_with_precedence(
+        self, mv_distance_matrix, pickup_deliver, precedence
+    ):
+        router = Router(search_params("fast", time_limit=2), precedence=precedence)
+        router.solve(
+            time_matrix=mv_distance_matrix,
+            driver_indicies=[0],
+            delivery_pairs=pickup_deliver,
+        )
+        (route,) = router.get_route_list()
+        assert sorted(route[1:-1]) == list(range(1, len(mv_distance_matrix)))
+
+        # loaded pairs in the order they were picked up
+        loaded = []
+        pickups = dict(pickup_deliver)
+        for node in route[1:-1]:
+            if node in pickups:
+                loaded.append(node)
+                continue
+            pickup = next(p for p, d in pickup_deliver if d == node)
+            if precedence == "direct":
+                assert loaded == [pickup]
+            elif precedence == "lifo":
+                assert loaded[-1] == pickup
+            elif precedence == "fifo":
+                assert loaded[0] == pickup
+            loaded.remove(pickup)
+
+    @pytest.mark.parametrize("precedence", [None, "lifo"])
+    def test_solve_with_drop_penalties(
+        self, mv_distance_matrix, pickup_deliver, precedence
+    ):
+        router = Router(search_params("fast"), precedence=precedence)
+        # every pair fits within max time but not all of them for a single driver
+        router.solve(
+            time_matrix=mv_distance_matrix,
+            driver_indicies=[0],
+            delivery_pairs=pickup_deliver,
+            max_time=1780,
+            drop_penalties=[100000] * len(pickup_deliver),
+        )
+        (route,) = router.get_route_list()
+        served = [(p, d) for p, d in pickup_deliver if p in route]
+        assert 0 < len(served) < len(pickup_deliver)
+        # pairs are served or dropped whole
+        for pickup, delivery in pickup_deliver:
+            assert (pickup in route) == (delivery in route)
+            if pickup in route and precedence is None:
+                assert route.index(delivery) == route.index(pickup) + 1
+        dropped = len(pickup_deliver) - len(served)
+        assert router.solution.ObjectiveValue() > 100000 * dropped
+
+    def test_solve_with_unknown_precedence(self):
+        with pytest.raises(Exception):
+            Router(precedence="random")
+
+
+def test_check_inputs():
+    transit = [
+        [0, 1, 10, 10, 10],
+        [1, 0, 1, 10, 10],
+        [10, 1, 0, 1, 10],
+        [10, 10, 1, 0, 1],
+        [10, 10, 10, 1, 0],
+    ]
+    instance = dict(
+        time_matrix=transit,
+        driver_indicies=[0, 4],
+        delivery_pairs=[(1, 2), (2, 3)],
+        delivery_weights=[1, 5],
+        vehicle_capacities=[2, 5],
+        max_time=12,
+    )
+    check_inputs(**instance)
+    # packed triangles are checked the same
+    check_inputs(**{**instance, "time_matrix": pack_triangle(transit)})
+
+    with pytest.raises(Exception, match="square"):
+        check_inputs(**{**instance, "time_matrix": [row[:4] for row in transit]})
+    with pytest.raises(Exception, match=r"Drivers \[1\] start outside"):
+        check_inputs(**{**instance, "driver_indicies": [0, 5]})
+    with pytest.raises(Exception, match=r"Delivery pairs \[\(2, 7\)\] are outside"):
+        check_inputs(**{**instance, "delivery_pairs": [(1, 2), (2, 7)]})
+    with pytest.raises(Exception, match=r"Drivers \[0\] have already worked"):
+        check_inputs(**{**instance, "time_worked": [13, 0]})
+
+    # (1, 2) is 12 from driver 0 and 21 from driver 4, (2, 3) 21 and 12
+    with pytest.raises(
+        Exception,
+        match=r"\(2, 3\)\] have no driver with both the time and capacity",
+    ):
+        check_inputs(**{**instance, "vehicle_capacities": [5, 4]})
+    with pytest.raises(Exception, match=r"\(2, 3\)\] exceed the capacity"):
+        check_inputs(**{**instance, "vehicle_capacities": [4, 4]})
+    with pytest.raises(Exception, match=r"\[\(1, 2\), \(2, 3\)\] take longer"):
+        check_inputs(**{**instance, "max_time": 11})
+    # time on site counts towards the round trip
+    with pytest.raises(Exception, match=r"\[\(1, 2\)\] take longer"):
+        check_inputs(**{**instance, "site_eta": [0, 1, 0, 0, 0]})
+    # pairs no driver can serve may be dropped instead
+    check_inputs(**{**instance, "max_time": 11, "drop_penalties": [1, 1]})
+    with pytest.raises(Exception, match="drop penalty for all delivery pairs"):
+        check_inputs(**{**instance, "drop_penalties": [1]})
+    with pytest.raises(Exception, match="must not be negative"):
+        check_inputs(**{**instance, "drop_penalties": [1, -1]})
+    # locations in no pair are visits of their own
+    with pytest.raises(Exception, match=r"\[\(3, 3\), \(4, 4\)\] take longer"):
+        check_inputs(
+            time_matrix=transit,
+            driver_indicies=[0],
+            delivery_pairs=[(1, 2)],
+            max_time=19,
+        )
+
+
+def test_warm_start_routes():
+    transit = np.array(
+        [
+            [0, 1, 10, 10, 10],
+            [1, 0, 1, 10, 10],
+            [10, 1, 0, 1, 10],
+            [10, 10, 1, 0, 1],
+            [10, 10, 10, 1, 0],
+        ]
+    )
+    routes = _warm_start_routes(
+        # depots, unknown and repeated locations are dropped
+        initial_routes=[[0, 1, 5, 1, 0]],
+        transit=transit,
+        driver_indicies=[0, 4],
+        delivery_pairs=[(2, 3)],
+    )
+    # missing pair inserted together at the cheapest position
+    assert routes == [[1, 2, 3], []]
+
+    # split pairs are reinserted
+    routes = _warm_start_routes(
+        initial_routes=[[3], [2, 1]],
+        transit=transit,
+        driver_indicies=[0, 4],
+        delivery_pairs=[(2, 3)],
+    )
+    assert routes == [[], [1, 2, 3]]
+
+
+def test_build_demand_vector():
+    demands = _build_demand_vector(
+        n_locations=6,
+        requirements=[2, 3, 4],
+        delivery_pairs=[(1, 2), (3, 4), (5, 5)],
+        driver_indicies=[0],
+    )
+    # pickups load, deliveries unload and same node pairs carry nothing
+    np.testing.assert_array_equal(demands, [0, 2, -2, 3, -3, 0])
+
+    # nothing is carried from depots
+    demands = _build_demand_vector(
+        n_locations=3,
+        requirements=[2],
+        delivery_pairs=[(1, 2)],
+        driver_indicies=[0, 1],
+    )
+    np.testing.assert_array_equal(demands, [0, 0, -2])
+
+
+def test_build_transit_matrix():
+    time_matrix = [[0, 10], [20, 0]]
+
+    transit = _build_transit_matrix(time_matrix)
+    assert transit.dtype == np.int32
+    np.testing.assert_array_equal(transit, time_matrix)
+
+    # site eta is added to every arc leaving that site
+    transit = _build_transit_matrix(time_matrix, site_eta=[5, 100])
+    np.testing.assert_array_equal(transit, [[5, 15], [120, 100]])
+
+
+def test_nearest_successors():
+    transit = np.array(
+        [
+            [0, 1, 2, 3],
+            [5, 0, 4, 1],
+            [1, 9, 0, 9],
+            [2, 1, 3, 0],
+        ]
+    )
+    successors = _nearest_successors(
+        transit, sources=np.array([1, 2, 3]), targets=np.array([1, 2, 3]), k=1
+    )
+    # a location is never its own successor
+    np.testing.assert_array_equal(successors, [[3], [1], [1]])
+
+    successors = _nearest_successors(
+        transit, sources=np.array([1]), targets=np.array([0, 2, 3]), k=2
+    )
+    assert sorted(successors[0]) == [2, 3]
+
+    # k beyond the number of targets keeps them all
+    successors = _nearest_successors(
+        transit, sources=np.array([0, 1]), targets=np.array([2, 3]), k=5
+    )
+    np.testing.assert_array_equal(successors, [[2, 3], [2, 3]])
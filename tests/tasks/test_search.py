@@ -0,0 +1,41 @@
+import pytest
+
+from src.tasks.routing import SEARCH_PARAMS
+from src.tasks.search import (
+    LocalSearchMetaheuristic,
+    SEARCH_PRESETS,
+    search_params,
+)
+
+
+@pytest.mark.parametrize("preset", list(SEARCH_PRESETS))
+def test_search_params_presets(preset):
+    params = search_params(preset)
+    assert params.time_limit.seconds == SEARCH_PRESETS[preset]["time_limit"]
+    assert (
+        params.local_search_metaheuristic
+        == SEARCH_PRESETS[preset]["local_search_metaheuristic"]
+    )
+
+
+def test_search_params_overrides():
+    params = search_params(
+        "fast",
+        time_limit=0.25,
+        solution_limit=5,
+        metaheuristic="tabu_search",
+        lns_time_limit=0.1,
+    )
+    assert params.time_limit.ToMilliseconds() == 250
+    assert params.solution_limit == 5
+    assert params.local_search_metaheuristic == LocalSearchMetaheuristic.TABU_SEARCH
+    assert params.lns_time_limit.ToMilliseconds() == 100
+
+    # new params every call so the shared default is never changed
+    assert SEARCH_PARAMS.time_limit.seconds == 10
+    assert search_params() is not search_params()
+
+
+def test_search_params_unknown_preset():
+    with pytest.raises(Exception):
+        search_params("thorough")
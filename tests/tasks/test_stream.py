@@ -0,0 +1,41 @@
+import pytest
+
+from benchmarks.instances import generate_instance
+from src.models.schedule_request import ScheduleRequest
+from src.tasks.jobs import submit_request
+from src.tasks.pool import SolverPool
+from src.tasks.routing import SolutionNotFound
+from src.tasks.stream import stream_solutions
+
+
+@pytest.mark.asyncio
+async def test_stream_solutions(mv_distance_matrix, pickup_deliver):
+    solver_pool = SolverPool(max_workers=1, max_queue=0)
+    request = ScheduleRequest(**generate_instance(60, 3), preset="fast", time_limit=2)
+    progress = solver_pool.progress_queue()
+    future, location_names = submit_request(solver_pool, request, progress)
+
+    events = [event async for event in stream_solutions(future, progress)]
+    *improving, (final, result) = events
+    assert final
+    assert not any(final for final, _ in improving)
+    assert improving
+    # each solution improves on the last and the result is the best
+    objectives = [event.objective for _, event in improving] + [result.objective]
+    assert objectives == sorted(objectives, reverse=True)
+    assert result.objective == future.result().objective
+    assert len(result.schedules) == 3
+
+    # errors of the solve are raised once streamed
+    progress = solver_pool.progress_queue()
+    # every pair fits within max time but not all of them for a single driver
+    infeasible = ScheduleRequest(
+        time_matrix=mv_distance_matrix,
+        driver_indicies=[0],
+        delivery_pairs=pickup_deliver,
+        max_time=1780,
+    )
+    future, _ = submit_request(solver_pool, infeasible, progress)
+    with pytest.raises(SolutionNotFound):
+        async for _ in stream_solutions(future, progress):
+            pass
@@ -1,15 +1,171 @@
+import asyncio
 import pytest
+import httpx
 import numpy as np
 
+from src.tasks import time_matrix
+from src.tasks.matrix_codec import pack_triangle, unpack_triangle
 from src.tasks.time_matrix import (
+    create_client,
+    extend_time_matrix,
     get_time_matrix,
+    get_time_triangle,
     _build_distance_matrix,
     _send_request,
 )
 
 
+class FakeResponse:
+    def __init__(self, json: dict) -> None:
+        self._json = json
+
+    def raise_for_status(self) -> None:
+        pass
+
+    def json(self) -> dict:
+        return self._json
+
+
+class FakeClient:
+    """Answers with the row and column index of each element, rate limiting the first failures requests"""
+
+    def __init__(self, failures: int = 0) -> None:
+        self.failures = failures
+        self.requests = 0
+        self.concurrent = 0
+        self.max_concurrent = 0
+
+    async def get(self, url: str, params: dict) -> FakeResponse:
+        self.requests += 1
+        self.concurrent += 1
+        self.max_concurrent = max(self.max_concurrent, self.concurrent)
+        await asyncio.sleep(0.01)
+        self.concurrent -= 1
+
+        if self.failures > 0:
+            self.failures -= 1
+            return FakeResponse({"status": "OVER_QUERY_LIMIT"})
+
+        origins = params["origins"].split("|")
+        destinations = params["destinations"].split("|")
+        return FakeResponse(
+            {
+                "status": "OK",
+                "rows": [
+                    {
+                        "elements": [
+                            {"duration": {"value": int(o) * 100 + int(d)}}
+                            for d in destinations
+                        ]
+                    }
+                    for o in origins
+                ],
+            }
+        )
+
+
+@pytest.mark.asyncio
+async def test_get_time_matrix_concurrent(monkeypatch):
+    monkeypatch.setattr(time_matrix, "MATRIX_CONCURRENCY", 3)
+    monkeypatch.setattr(time_matrix, "MATRIX_BACKOFF", 0)
+    locations = [str(i) for i in range(30)]
+    client = FakeClient(failures=2)
+
+    matrix = np.array(await get_time_matrix(locations, [0], client=client))
+
+    # rows requested in blocks of 3, rate limited requests retried
+    assert client.requests == 10 + 2
+    assert client.max_concurrent == 3
+    expected = np.arange(30)[:, np.newaxis] * 100 + np.arange(30)
+    np.testing.assert_array_equal(matrix, expected)
+
+    matrix = np.array(
+        await get_time_matrix(locations, [0, 2], return_home=False, client=client)
+    )
+    assert np.all(matrix[:, [0, 2]] == 0)
+
+
+@pytest.mark.asyncio
+async def test_get_time_triangle():
+    locations = [str(i) for i in range(25)]
+    expected = np.arange(25)[:, np.newaxis] * 100 + np.arange(25)
+    client = FakeClient()
+
+    packed = await get_time_triangle(locations, client=client)
+
+    np.testing.assert_array_equal(packed, pack_triangle(expected))
+    # 10 x 10 blocks on or above the diagonal rather than all 9 blocks
+    assert client.requests == 6
+
+    matrix = await get_time_matrix(locations, [0], client=client, symmetric=True)
+    np.testing.assert_array_equal(matrix, unpack_triangle(packed))
+    with pytest.raises(Exception):
+        await get_time_matrix(locations, [0], False, client=client, symmetric=True)
+
+
+@pytest.mark.asyncio
+async def test_extend_time_matrix(monkeypatch):
+    monkeypatch.setattr(time_matrix, "MAX_ELEMENTS", 10)
+    locations = [str(i) for i in range(20)]
+    new_locations = [str(i) for i in range(20, 23)]
+    expected = np.arange(23)[:, np.newaxis] * 100 + np.arange(23)
+    client = FakeClient()
+
+    matrix = await extend_time_matrix(
+        expected[:20, :20], locations, new_locations, [0], client=client
+    )
+
+    np.testing.assert_array_equal(matrix, expected)
+    # 3 new rows of 23 and 20 old rows to the 3 new columns, in blocks of 10 elements
+    assert client.requests == 3 * 3 + 7
+
+    matrix = await extend_time_matrix(
+        expected[:20, :20], locations, new_locations, [0, 21], False, client=client
+    )
+    assert np.all(matrix[:, [0, 21]] == 0)
+    np.testing.assert_array_equal(matrix[:, 1:21], expected[:, 1:21])
+
+    with pytest.raises(Exception):
+        await extend_time_matrix(expected, locations, new_locations, [0], client=client)
+
+
+@pytest.mark.asyncio
+async def test_send_request_retries(monkeypatch):
+    monkeypatch.setattr(time_matrix, "MATRIX_RETRIES", 2)
+    monkeypatch.setattr(time_matrix, "MATRIX_BACKOFF", 0)
+
+    client = FakeClient(failures=3)
+    with pytest.raises(Exception, match="OVER_QUERY_LIMIT"):
+        await _send_request(client, ["0"], ["0"])
+    assert client.requests == 3
+
+    class DeniedClient(FakeClient):
+        async def get(self, url: str, params: dict) -> FakeResponse:
+            self.requests += 1
+            return FakeResponse(
+                {"status": "REQUEST_DENIED", "error_message": "invalid key"}
+            )
+
+    # invalid requests are not retried
+    client = DeniedClient()
+    with pytest.raises(Exception, match="REQUEST_DENIED invalid key"):
+        await _send_request(client, ["0"], ["0"])
+    assert client.requests == 1
+
+    class TimeoutClient(FakeClient):
+        async def get(self, url: str, params: dict) -> FakeResponse:
+            self.requests += 1
+            raise httpx.ConnectTimeout("timed out")
+
+    client = TimeoutClient()
+    with pytest.raises(Exception, match="ConnectTimeout"):
+        await _send_request(client, ["0"], ["0"])
+    assert client.requests == 3
+
+
 @pytest.mark.expensive
-def test_get_time_matrix():
+@pytest.mark.asyncio
+async def test_get_time_matrix():
     # 11 locations to ensure multiple requests must be sent
     locations = [
         "GAFFNEY CAR SALES, DELVIN, CO. WESTMEATH",
@@ -24,8 +180,8 @@ def test_get_time_matrix():
         "122 Castlecurragh Vale, Buzzardstown, Dublin 15, Ireland",
         "47 Castleknock Rise, Blanchardstown, Dublin 15, Ireland",
     ]
-    full_matrix = np.array(get_time_matrix(locations, [0]))
-    sub_matrix = np.array(get_time_matrix(locations[:3], [0]))
+    full_matrix = np.array(await get_time_matrix(locations, [0]))
+    sub_matrix = np.array(await get_time_matrix(locations[:3], [0]))
 
     # ensure full matrix has matching sub matrix
     np.testing.assert_array_equal(full_matrix[:3, :3], sub_matrix)
@@ -38,29 +194,35 @@ def test_get_time_matrix():
 
 
 @pytest.mark.expensive
-def test_get_time_exclude_home():
+@pytest.mark.asyncio
+async def test_get_time_exclude_home():
     locations = [
         "GAFFNEY CAR SALES, DELVIN, CO. WESTMEATH",
         "Marrowbone Lane, Saint Catherine's, Dublin, Ireland",
         "Cartow Vehicle Serivce, Finglas North, Dublin, Ireland",
     ]
     driver_locs = [0, 2]
-    matrix = np.array(get_time_matrix(locations, driver_locs, return_home=False))
+    matrix = np.array(await get_time_matrix(locations, driver_locs, return_home=False))
     assert np.all(matrix[:, driver_locs] == 0)
 
 
 @pytest.mark.expensive
-def test_send_request():
+@pytest.mark.asyncio
+async def test_send_request():
     str_locations = [
         "Cartow Vehicle Serivce, Finglas North, Dublin, Ireland",
         "Island Upper, County Wexford, Y25 A344, Ireland",
     ]
     coord_locations = [(53.39868, -6.29710), (52.67862, -6.39381)]
 
-    location_response = _send_request(str_locations, str_locations, coordinates=False)
+    async with create_client() as client:
+        location_response = await _send_request(
+            client, str_locations, str_locations, coordinates=False
+        )
+        coord_response = await _send_request(
+            client, coord_locations, coord_locations, coordinates=True
+        )
     location_response = _build_distance_matrix(location_response, measure="duration")
-
-    coord_response = _send_request(coord_locations, coord_locations, coordinates=True)
     coord_response = _build_distance_matrix(coord_response, measure="duration")
 
     # coord and location not exactly equal so ensure ~equal
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from src.tasks.travel_estimate import (
+    SPEED_PROFILES,
+    calibrate,
+    estimate_time_matrix,
+    haversine_matrix,
+)
+
+# Dublin, Cork, Galway
+COORDINATES = [(53.3498, -6.2603), (51.8985, -8.4756), (53.2707, -9.0568)]
+
+
+def test_haversine_matrix():
+    distances = haversine_matrix(COORDINATES)
+
+    assert distances.shape == (3, 3)
+    assert np.allclose(distances, distances.T)
+    assert np.all(np.diag(distances) == 0)
+    # Dublin to Cork roughly 220km as the crow flies
+    assert distances[0, 1] == pytest.approx(220_000, rel=0.02)
+
+
+def test_estimate_time_matrix():
+    matrix = estimate_time_matrix(COORDINATES, [0], speed_profile="car")
+    distances = haversine_matrix(COORDINATES)
+
+    assert matrix.dtype == np.int32
+    assert np.all(np.diag(matrix) == 0)
+    assert matrix[0, 1] == pytest.approx(
+        distances[0, 1] * 1.3 / SPEED_PROFILES["car"], abs=1
+    )
+    # slower profile takes longer
+    assert np.all(
+        estimate_time_matrix(COORDINATES, [0], speed_profile="bicycle") >= matrix
+    )
+
+
+def test_estimate_time_matrix_return_home():
+    matrix = estimate_time_matrix(COORDINATES, [0], return_home=False)
+
+    assert np.all(matrix[:, 0] == 0)
+    assert np.all(matrix[0, 1:] > 0)
+
+
+def test_estimate_time_matrix_unknown_profile():
+    with pytest.raises(Exception):
+        estimate_time_matrix(COORDINATES, [0], speed_profile="rocket")
+
+
+def test_calibrate():
+    distances = haversine_matrix(COORDINATES)
+    # synthetic durations of 0.05 seconds per metre plus 120 seconds
+    durations = np.rint(distances * 0.05 + 120)
+    np.fill_diagonal(durations, 0)
+
+    seconds_per_metre, overhead = calibrate(COORDINATES, durations.tolist())
+
+    assert seconds_per_metre == pytest.approx(0.05, rel=1e-3)
+    assert overhead == pytest.approx(120, abs=5)
+
+    matrix = estimate_time_matrix(
+        COORDINATES, [0], calibration=(seconds_per_metre, overhead)
+    )
+    assert np.allclose(matrix, durations, atol=2)